@@ -0,0 +1,166 @@
+import asyncio
+import logging
+from typing import Protocol
+
+import aiohttp
+
+from backend.config.settings import settings
+from backend.metrics import alert_digests
+from backend.schemas import AlertDigest, IncidentEvent, alert_digest_adapter
+
+logger = logging.getLogger(__name__)
+
+
+class AlertSink(Protocol):
+    name: str
+
+    async def send(self, digest: AlertDigest) -> None: ...
+
+
+class LogSink:
+    """Writes each digest to the log, listing at most `max_domains` domains."""
+
+    name = "log"
+
+    def __init__(self, max_domains: int = 20):
+        self.max_domains = max_domains
+
+    async def send(self, digest: AlertDigest) -> None:
+        for event in ("opened", "resolved"):
+            domains = [e["domain"] for e in digest["events"] if e["event"] == event]
+            if not domains:
+                continue
+            listed = ", ".join(domains[: self.max_domains])
+            if len(domains) > self.max_domains:
+                listed += f" and {len(domains) - self.max_domains} more"
+            logger.warning("%d incidents %s: %s", len(domains), event, listed)
+
+
+class WebhookSink:
+    """POSTs each digest as JSON to `url`."""
+
+    name = "webhook"
+
+    def __init__(self, url: str, timeout: float = 10):
+        self.url = url
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session: aiohttp.ClientSession | None = None
+
+    async def send(self, digest: AlertDigest) -> None:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=self.timeout)
+        async with self._session.post(
+            self.url,
+            data=alert_digest_adapter.dump_json(digest),
+            headers={"Content-Type": "application/json"},
+        ) as response:
+            response.raise_for_status()
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class AlertDispatcher:
+    """
+    Sends incident events to the sinks as digests. Publishing only queues
+    an event; the dispatcher waits `delay` seconds after the first one to
+    let an outage spreading over many domains collect into one digest, and
+    sends at most one digest per `min_interval` seconds, so events that
+    arrive in between are merged into the next one. A failing sink is
+    logged and does not hold up the others.
+    """
+
+    def __init__(
+        self,
+        sinks: list[AlertSink],
+        delay: float = 10,
+        min_interval: float = 60,
+    ):
+        self.sinks = sinks
+        self.delay = delay
+        self.min_interval = min_interval
+        self._pending: list[IncidentEvent] = []
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def publish(self, events: list[IncidentEvent]) -> None:
+        if not events:
+            return
+        self._pending.extend(events)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def close(self) -> None:
+        """Stop, sending what is still pending right away."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
+        await self.flush()
+        for sink in self.sinks:
+            close = getattr(sink, "close", None)
+            if close is not None:
+                await close()
+
+    async def flush(self) -> None:
+        events, self._pending = self._pending, []
+        if not events:
+            return
+        digest: AlertDigest = {
+            "opened": sum(event["event"] == "opened" for event in events),
+            "resolved": sum(event["event"] == "resolved" for event in events),
+            "events": events,
+        }
+        results = await asyncio.gather(
+            *(sink.send(digest) for sink in self.sinks), return_exceptions=True
+        )
+        for sink, result in zip(self.sinks, results):
+            if isinstance(result, Exception):
+                logger.error("Alert sink %s failed: %r", sink.name, result)
+            alert_digests.labels(
+                sink=sink.name,
+                result="error" if isinstance(result, Exception) else "sent",
+            ).inc()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        sent_at = -self.min_interval
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(
+                max(self.delay, sent_at + self.min_interval - loop.time())
+            )
+            self._wakeup.clear()
+            sent_at = loop.time()
+            await self.flush()
+
+
+def default_sinks() -> list[AlertSink]:
+    sinks: list[AlertSink] = [LogSink()]
+    if settings.ALERT_WEBHOOK_URL:
+        sinks.append(
+            WebhookSink(settings.ALERT_WEBHOOK_URL, settings.ALERT_WEBHOOK_TIMEOUT)
+        )
+    return sinks
+
+
+alert_dispatcher = AlertDispatcher(
+    sinks=default_sinks(),
+    delay=settings.ALERT_DIGEST_DELAY,
+    min_interval=settings.ALERT_MIN_INTERVAL,
+)
@@ -0,0 +1,58 @@
+"""
+Compare the latest benchmark run with the previous run of the same
+configuration (database, domain count and parameters):
+
+    python -m backend.benchmarks.compare [results.jsonl]
+"""
+
+import json
+import os
+import sys
+
+# metrics where a lower value is better; for the rest higher is better
+LOWER_IS_BETTER = ("_s", "_ms", "failed_probes")
+
+
+def load(path: str) -> list[dict]:
+    with open(path) as results:
+        return [json.loads(line) for line in results if line.strip()]
+
+
+def configuration(record: dict) -> str:
+    return json.dumps(
+        [record["database"], record["domains"], record["parameters"]], sort_keys=True
+    )
+
+
+def main() -> None:
+    path = (
+        sys.argv[1]
+        if len(sys.argv) > 1
+        else os.path.join(os.path.dirname(__file__), "results.jsonl")
+    )
+    runs: dict[str, list[dict]] = {}
+    for record in load(path):
+        runs.setdefault(configuration(record), []).append(record)
+
+    for records in runs.values():
+        if len(records) < 2:
+            continue
+        before, after = records[-2], records[-1]
+        print(
+            f"{after['database']}, {after['domains']} domains: "
+            f"{before['commit']} -> {after['commit']}"
+        )
+        for name, value in after["metrics"].items():
+            previous = before["metrics"].get(name)
+            if not previous:
+                continue
+            change = (value - previous) / previous * 100
+            worse = change > 0 if name.endswith(LOWER_IS_BETTER) else change < 0
+            flag = "  worse" if worse and abs(change) >= 10 else ""
+            print(
+                f"  {name:>24}: {previous:10.2f} -> {value:10.2f} ({change:+.1f}%){flag}"
+            )
+
+
+if __name__ == "__main__":
+    main()
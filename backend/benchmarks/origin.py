@@ -0,0 +1,184 @@
+"""
+Local fake origins for benchmarks. They run in their own processes so that
+serving requests does not compete with the code being measured for the
+benchmark's event loop.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import random
+import socket
+import ssl
+import subprocess
+import tempfile
+from dataclasses import dataclass
+
+from aiohttp import web
+
+# every 127.x.y.z address reaches the loopback interface, which gives the
+# probes distinct hosts (and per-host limits) without any DNS setup
+MAX_HOSTS = 250
+
+
+def loopback_host(index: int) -> str:
+    return f"127.0.0.{index % MAX_HOSTS + 1}"
+
+
+def make_certificate(directory: str) -> tuple[str, str]:
+    """Self-signed certificate valid for all loopback hosts, made with openssl."""
+    certfile = os.path.join(directory, "origin.pem")
+    keyfile = os.path.join(directory, "origin.key")
+    names = ",".join(f"IP:{loopback_host(i)}" for i in range(MAX_HOSTS))
+    subprocess.run(
+        [
+            "openssl",
+            "req",
+            "-x509",
+            "-newkey",
+            "ec",
+            "-pkeyopt",
+            "ec_paramgen_curve:prime256v1",
+            "-nodes",
+            "-days",
+            "1",
+            "-subj",
+            "/CN=servicemonitor-benchmark",
+            "-addext",
+            f"subjectAltName={names}",
+            "-keyout",
+            keyfile,
+            "-out",
+            certfile,
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return certfile, keyfile
+
+
+@dataclass
+class OriginOptions:
+    """
+    How the origins behave. Rates are per-request probabilities: a hang
+    never answers, an error answers 503, a slow body trickles the body out
+    over `slow_body_time` seconds.
+    """
+
+    latency: float = 0.0
+    body_size: int = 2
+    error_rate: float = 0.0
+    hang_rate: float = 0.0
+    slow_body_rate: float = 0.0
+    slow_body_time: float = 1.0
+
+
+def _app(options: OriginOptions) -> web.Application:
+    body = b"x" * options.body_size
+
+    async def respond(request):
+        if random.random() < options.hang_rate:
+            await asyncio.sleep(3600)
+        if options.latency:
+            await asyncio.sleep(options.latency)
+        if random.random() < options.error_rate:
+            return web.Response(status=503, text="unavailable")
+        if random.random() < options.slow_body_rate:
+            response = web.StreamResponse()
+            response.content_length = len(body)
+            await response.prepare(request)
+            for byte in range(len(body)):
+                await asyncio.sleep(options.slow_body_time / len(body))
+                await response.write(body[byte : byte + 1])
+            await response.write_eof()
+            return response
+        return web.Response(body=body)
+
+    app = web.Application()
+    app.router.add_get("/{path:.*}", respond)
+    return app
+
+
+async def _serve(port: int, options: OriginOptions, certfile, keyfile, ready) -> None:
+    ssl_context = None
+    if certfile:
+        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_context.load_cert_chain(certfile, keyfile)
+    runner = web.AppRunner(_app(options), access_log=None)
+    await runner.setup()
+    # one site per loopback host rather than 0.0.0.0, which would expose
+    # the origins to the network
+    for index in range(MAX_HOSTS):
+        site = web.TCPSite(runner, loopback_host(index), port, ssl_context=ssl_context)
+        await site.start()
+    ready.set()
+    await asyncio.Event().wait()
+
+
+def _run(port: int, options: OriginOptions, certfile, keyfile, ready) -> None:
+    asyncio.run(_serve(port, options, certfile, keyfile, ready))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class OriginFarm:
+    """
+    Context manager running `processes` origin processes, one port each.
+    With `tls`, the origins serve HTTPS and SSL_CERT_FILE is pointed at
+    their certificate, so the default context of the probes (and of their
+    worker processes) trusts it.
+    """
+
+    def __init__(
+        self,
+        options: OriginOptions | None = None,
+        tls: bool = False,
+        processes: int = 1,
+    ):
+        self.options = options or OriginOptions()
+        self.tls = tls
+        self.ports = [free_port() for _ in range(processes)]
+        self._directory = None
+        self._processes = []
+
+    @property
+    def scheme(self) -> str:
+        return "https" if self.tls else "http"
+
+    def urls(self, count: int) -> list[str]:
+        return [
+            f"{self.scheme}://{loopback_host(i)}:{self.ports[i % len(self.ports)]}/{i}"
+            for i in range(count)
+        ]
+
+    def __enter__(self) -> "OriginFarm":
+        certfile = keyfile = None
+        if self.tls:
+            self._directory = tempfile.TemporaryDirectory()
+            certfile, keyfile = make_certificate(self._directory.name)
+            os.environ["SSL_CERT_FILE"] = certfile
+        context = multiprocessing.get_context("spawn")
+        for port in self.ports:
+            ready = context.Event()
+            process = context.Process(
+                target=_run,
+                args=(port, self.options, certfile, keyfile, ready),
+                daemon=True,
+            )
+            process.start()
+            self._processes.append(process)
+            if not ready.wait(timeout=30):
+                raise RuntimeError("Benchmark origin did not start")
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        for process in self._processes:
+            process.terminate()
+            process.join()
+        if self._directory is not None:
+            os.environ.pop("SSL_CERT_FILE", None)
+            self._directory.cleanup()
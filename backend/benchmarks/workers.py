@@ -0,0 +1,143 @@
+"""
+Sustained probe throughput of the scheduler, in-process and split over
+worker processes (PROBE_PROCESSES), against a local origin:
+
+    python -m backend.benchmarks.workers --domains 2000 --workers 1 2 4 --tls
+
+Every domain is due each --interval seconds, more than the probes can
+keep up with, so the rate measured is what the scheduler sustains.
+Without DATABASE_URL a throwaway SQLite database is used.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from contextlib import suppress
+
+from backend.benchmarks.origin import OriginFarm, OriginOptions
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--domains", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--interval", type=int, default=1, help="check interval")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds")
+    parser.add_argument("--seconds", type=float, default=10, help="measured")
+    parser.add_argument("--tls", action="store_true")
+    parser.add_argument("--json", help="append results as a JSON line to this file")
+    return parser.parse_args()
+
+
+async def load_domains(urls: list[str], interval: int) -> None:
+    from sqlalchemy import insert
+
+    from backend.db import Base, Domain, engine
+
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+        await connection.execute(
+            insert(Domain),
+            [{"domain": url, "check_interval": interval} for url in urls],
+        )
+
+
+async def sustained_rate(run_scheduler, scheduler, args: argparse.Namespace) -> float:
+    """Probes/s counted by `scheduler` between warmup and the end."""
+    task = asyncio.create_task(run_scheduler)
+    try:
+        # the worker processes need a few seconds to start
+        await asyncio.sleep(args.warmup)
+        probed, started = scheduler.meter.total, time.perf_counter()
+        await asyncio.sleep(args.seconds)
+        return (scheduler.meter.total - probed) / (time.perf_counter() - started)
+    finally:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+
+async def run(args: argparse.Namespace, urls: list[str]) -> dict[str, float]:
+    from backend.db import ExaminationWriter, async_session
+    from backend.probes import probe_engine
+    from backend.scheduler import ProbeScheduler
+    from backend.service import run_probe_scheduler
+    from backend.workers import run_probe_scheduler_in_processes
+
+    def new_scheduler() -> ProbeScheduler:
+        return ProbeScheduler(
+            concurrency=args.concurrency, per_host_limit=args.concurrency
+        )
+
+    await load_domains(urls, args.interval)
+    writer = ExaminationWriter(session_factory=async_session)
+    writer.start()
+    results = {}
+
+    scheduler = new_scheduler()
+    async with probe_engine:
+        results["in-process"] = await sustained_rate(
+            run_probe_scheduler(
+                https_session=probe_engine.session,
+                db_session_factory=async_session,
+                scheduler=scheduler,
+                writer=writer,
+            ),
+            scheduler,
+            args,
+        )
+
+    for workers in args.workers:
+        scheduler = new_scheduler()
+        results[f"{workers} workers"] = await sustained_rate(
+            run_probe_scheduler_in_processes(
+                db_session_factory=async_session,
+                workers=workers,
+                scheduler=scheduler,
+                writer=writer,
+            ),
+            scheduler,
+            args,
+        )
+    await writer.close()
+    return results
+
+
+def main() -> None:
+    args = parse_args()
+    directory = tempfile.TemporaryDirectory()
+    os.environ.setdefault(
+        "DATABASE_URL", f"sqlite+aiosqlite:///{directory.name}/benchmark.db"
+    )
+    # read by the settings of this process and of the worker processes
+    os.environ["PROBE_CONCURRENCY"] = str(args.concurrency)
+    os.environ["PROBE_PER_HOST_LIMIT"] = str(args.concurrency)
+    # every domain stays due each --interval seconds
+    os.environ["PROBE_ADAPTIVE"] = "false"
+
+    options = OriginOptions(latency=args.latency_ms / 1000)
+    with OriginFarm(options, tls=args.tls) as origin:
+        results = asyncio.run(run(args, origin.urls(args.domains)))
+
+    print(
+        f"{args.domains} domains due every {args.interval}s, "
+        f"{'https' if args.tls else 'http'}, "
+        f"{args.latency_ms:g} ms origin latency, {os.cpu_count()} CPUs"
+    )
+    for name, rate in results.items():
+        print(f"  {name:>12}: {rate:8.1f} probes/s")
+    if args.json:
+        with open(args.json, "a") as output:
+            record = {"benchmark": "workers", "args": vars(args), "results": results}
+            output.write(json.dumps(record) + "\n")
+    directory.cleanup()
+
+
+if __name__ == "__main__":
+    main()
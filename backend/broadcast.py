@@ -0,0 +1,83 @@
+import asyncio
+import logging
+from typing import AsyncIterator
+
+from backend.config.settings import settings
+from backend.schemas import Examination
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    def __init__(self, queue_size: int, domain_id: int | None = None):
+        self.queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize=queue_size)
+        self.domain_id = domain_id
+        self.dropped = False
+
+
+class StatusBroadcaster:
+    """
+    Fans new examinations out to live subscribers. Each message is encoded
+    once and pushed into a bounded per-subscriber queue; a subscriber whose
+    queue is full is dropped instead of slowing the probe pipeline down.
+    """
+
+    def __init__(self, queue_size: int = 100, heartbeat: float = 15.0):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self._subscriptions: set[Subscription] = set()
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    def subscribe(self, domain_id: int | None = None) -> Subscription:
+        subscription = Subscription(queue_size=self.queue_size, domain_id=domain_id)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscriptions.discard(subscription)
+
+    def publish(self, examination: Examination) -> None:
+        if not self._subscriptions:
+            return
+        message = (
+            b"event: examination\ndata: "
+            + examination.model_dump_json().encode()
+            + b"\n\n"
+        )
+        for subscription in list(self._subscriptions):
+            if subscription.domain_id not in (None, examination.domain_id):
+                continue
+            try:
+                subscription.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                logger.info("Dropping slow live status subscriber")
+                subscription.dropped = True
+                self._subscriptions.discard(subscription)
+
+    async def stream(self, domain_id: int | None = None) -> AsyncIterator[bytes]:
+        """Server-sent events for one client, with periodic keep-alive comments."""
+        subscription = self.subscribe(domain_id=domain_id)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(
+                        subscription.queue.get(), timeout=self.heartbeat
+                    )
+                except TimeoutError:
+                    if subscription.dropped:
+                        return
+                    yield b": keep-alive\n\n"
+                    continue
+                if subscription.dropped and subscription.queue.empty():
+                    # tell the client to reconnect and reload what it missed
+                    yield b"event: dropped\ndata: {}\n\n"
+                    return
+        finally:
+            self.unsubscribe(subscription)
+
+
+status_broadcaster = StatusBroadcaster(
+    queue_size=settings.STREAM_QUEUE_SIZE, heartbeat=settings.STREAM_HEARTBEAT
+)
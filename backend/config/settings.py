@@ -12,5 +12,122 @@ class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL")
 
+    # Request log sampling per path prefix, e.g. {"/domains": 0.1}
+    LOG_SAMPLE_RATES: dict[str, float] = {}
 
-settings = Settings()
\ No newline at end of file
+    # Probing
+    PROBE_INTERVAL: int = 60 * 5
+    PROBE_CONCURRENCY: int = 40
+    PROBE_PER_HOST_LIMIT: int = 2
+    PROBE_JITTER: float = 0.1
+    PROBE_DNS_TTL: int = 300
+    # Seconds idle connections are kept for the next probe of their host;
+    # 0 keeps them for the longest interval between two probes
+    # (PROBE_INTERVAL stretched by adaptive intervals, plus jitter), so
+    # every probe can reuse one at the cost of an idle socket per host.
+    # Origins closing them sooner just mean a new connection
+    PROBE_KEEPALIVE_TIMEOUT: float = 0
+    PROBE_CONNECT_TIMEOUT: float = 10
+    PROBE_READ_TIMEOUT: float = 10
+    PROBE_TIMEOUT: float = 30
+    # Bytes of a response body read per probe (and checked for a domain's
+    # keyword / hash); the connection is closed instead of reading more
+    PROBE_BODY_LIMIT: int = 64 * 1024
+    # Retries of probes that failed to connect or lost the connection,
+    # after RETRY_BACKOFF seconds, doubling up to RETRY_MAX_BACKOFF; DNS,
+    # TLS and timeout errors are recorded right away
+    PROBE_RETRIES: int = 1
+    PROBE_RETRY_BACKOFF: float = 0.5
+    PROBE_RETRY_MAX_BACKOFF: float = 4.0
+
+    # Adaptive intervals: a domain's check_interval is stretched up to
+    # MAX_FACTOR times while it stays healthy and shortened to
+    # RECHECK_FACTOR times on errors, status changes and latency jumps
+    PROBE_ADAPTIVE: bool = True
+    PROBE_ADAPTIVE_MAX_FACTOR: float = 4.0
+    PROBE_ADAPTIVE_STABLE_AFTER: int = 3
+    PROBE_ADAPTIVE_RECHECK_FACTOR: float = 0.25
+    PROBE_ADAPTIVE_LATENCY_JUMP: float = 3.0
+
+    # Worker processes probing the domains, each with its own scheduler
+    # (and PROBE_CONCURRENCY) for its share of the hosts; 0 probes in the
+    # app's event loop. Not used together with PROBE_SHARDS
+    PROBE_PROCESSES: int = 0
+
+    # Splitting the domains between replicas; 0 shards means every replica
+    # probes every domain (single instance)
+    PROBE_SHARDS: int = 0
+    PROBE_LEASE_TTL: float = 30
+    PROBE_LEASE_RENEW_INTERVAL: float = 10
+    # defaults to <hostname>-<pid>
+    PROBE_WORKER_ID: str = ""
+
+    # Examination writer
+    WRITER_BATCH_SIZE: int = 500
+    WRITER_FLUSH_INTERVAL: float = 1.0
+    WRITER_MAX_PENDING: int = 10_000
+    # attempts at a failing batch before it is dropped, the first retry
+    # after WRITER_RETRY_BACKOFF seconds, doubling
+    WRITER_ATTEMPTS: int = 4
+    WRITER_RETRY_BACKOFF: float = 0.5
+
+    # Bulk import / export of domains
+    IMPORT_CHUNK_SIZE: int = 1000
+    IMPORT_MAX_ROWS: int = 100_000
+    # Bytes of a row (a CSV row with quoted newlines counts as one)
+    IMPORT_MAX_LINE_LENGTH: int = 64 * 1024
+    EXPORT_BATCH_SIZE: int = 1000
+
+    # Seconds before GET /domains reloads the domain list from the database
+    DOMAINS_CACHE_TTL: float = 30
+    # Minimum seconds between two renders of it for new examinations (each
+    # render changes its ETag)
+    DOMAINS_MIN_RENDER_INTERVAL: float = 1
+
+    # Responses at least this big are compressed (brotli when the brotli
+    # package is installed and accepted, otherwise gzip)
+    COMPRESS_MIN_SIZE: int = 1024
+    GZIP_LEVEL: int = 6
+    BROTLI_QUALITY: int = 5
+
+    # Live status stream
+    STREAM_QUEUE_SIZE: int = 100
+    STREAM_HEARTBEAT: float = 15
+
+    # Examination history
+    ROLLUP_MAX_POINTS: int = 2500
+
+    # Incidents: a domain is down once DOWN_AFTER of its last WINDOW
+    # examinations failed, and up again after RECOVER_AFTER passing ones in
+    # a row
+    INCIDENT_WINDOW: int = 5
+    INCIDENT_DOWN_AFTER: int = 3
+    INCIDENT_RECOVER_AFTER: int = 2
+
+    # Alerts: incident events are collected for ALERT_DIGEST_DELAY seconds
+    # and sent as one digest, at most one digest per ALERT_MIN_INTERVAL
+    # seconds; the webhook is only used when a URL is set
+    ALERT_DIGEST_DELAY: float = 10
+    ALERT_MIN_INTERVAL: float = 60
+    ALERT_WEBHOOK_URL: str = ""
+    ALERT_WEBHOOK_TIMEOUT: float = 10
+
+    # Uptime stats: availability objective (percent) the error budget is
+    # measured against, and the window used without from/to
+    SLO_TARGET: float = 99.9
+    STATS_DEFAULT_WINDOW: int = 24 * 60 * 60
+
+    # Retention, in days (0 keeps data forever). Off by default: history
+    # is only deleted once a tier is given a number of days, see readme.md
+    RETENTION_RAW_DAYS: int = 0
+    RETENTION_1M_DAYS: int = 0
+    RETENTION_1H_DAYS: int = 0
+    RETENTION_1D_DAYS: int = 0
+    RETENTION_BATCH_SIZE: int = 5000
+    RETENTION_INTERVAL: int = 60 * 60
+    # PostgreSQL only: partition examinations by day and drop old partitions
+    EXAMINATIONS_PARTITIONED: bool = False
+    RETENTION_PARTITIONS_AHEAD: int = 3
+
+
+settings = Settings()
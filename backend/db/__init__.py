@@ -1,8 +1,36 @@
-from .models import Domain, Examination, Base
+from .models import (
+    Domain,
+    Examination,
+    ExaminationRollup,
+    Incident,
+    ProbeLease,
+    ProbeWorker,
+    Base,
+)
 from .database import engine, get_db_connection, async_session
 from .crud import (
     get_all_domains_from_db,
+    get_domains_in_shards_from_db,
+    get_latest_examinations_from_db,
     get_domain_and_examination_from_db,
+    get_domain_by_name_from_db,
+    search_domains_in_db,
+    get_examinations_page_from_db,
+    stream_examinations_from_db,
+    get_rollups_page_from_db,
+    get_rollup_totals_from_db,
+    get_rollup_histograms_from_db,
+    get_status_changes_from_db,
+    update_rollups_in_database,
     add_domain_to_database,
+    add_domains_to_database,
+    stream_domains_from_db,
+    delete_domain_from_database,
     add_examination_to_database,
+    add_examinations_to_database,
+    add_incidents_to_database,
+    resolve_incident_in_database,
+    get_open_incidents_from_db,
+    get_incidents_from_db,
 )
+from .writer import ExaminationWriter, examination_writer
@@ -1,18 +1,45 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from .models import Domain, Examination as ExaminationModel
+from .models import Domain, Examination as ExaminationModel, ExaminationRollup
+from .models import Incident
 from backend.exceptions import (
     DomainAlreadyExistsError,
     ExaminationCreateDBError,
     NoDomainFoundError,
 )
 from sqlalchemy.exc import IntegrityError, ArgumentError
+from backend.metrics import db_query_seconds
 from backend.schemas import Examination
-from sqlalchemy import select, Result
-from sqlalchemy.orm import joinedload
+from backend.rollups import RollupBucket, aggregate_examinations
+from backend.utils import escape_like, normalize_host
+import datetime
+import math
 
+from sqlalchemy import Integer, case, cast, or_, true
+from sqlalchemy import select, delete, func, insert, tuple_, update
+from sqlalchemy import Result
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import aliased, joinedload
 
-async def add_domain_to_database(domain: str, session: AsyncSession):
-    new_domain = Domain(domain=domain)
+
+async def add_domain_to_database(
+    domain: str,
+    session: AsyncSession,
+    check_interval: int | None = None,
+    probe_method: str | None = None,
+    expect_keyword: str | None = None,
+    expect_hash: str | None = None,
+    probe_type: str | None = None,
+):
+    new_domain = Domain(
+        domain=domain, expect_keyword=expect_keyword, expect_hash=expect_hash
+    )
+    if check_interval is not None:
+        new_domain.check_interval = check_interval
+    if probe_method is not None:
+        new_domain.probe_method = probe_method
+    if probe_type is not None:
+        new_domain.probe_type = probe_type
     session.add(new_domain)
     try:
         await session.commit()
@@ -22,6 +49,57 @@ async def add_domain_to_database(domain: str, session: AsyncSession):
     return new_domain
 
 
+async def add_domains_to_database(
+    rows: list[dict], session: AsyncSession
+) -> dict[str, int]:
+    """
+    Insert many domains in one statement, skipping the ones that already
+    exist. Returns {domain: id} of the domains actually created.
+    """
+    if not rows:
+        return {}
+    if session.get_bind().dialect.name == "postgresql":
+        stmt = postgresql_insert(Domain)
+    else:
+        stmt = sqlite_insert(Domain)
+    # column defaults that read the statement parameters are not applied
+    # to multi-row VALUES, so the host is filled in here
+    rows = [{**row, "host": normalize_host(row["domain"])} for row in rows]
+    stmt = (
+        stmt.values(rows)
+        .on_conflict_do_nothing(index_elements=[Domain.domain])
+        .returning(Domain.id, Domain.domain)
+    )
+    result: Result = await session.execute(stmt)
+    created = {domain: domain_id for domain_id, domain in result.all()}
+    await session.commit()
+    return created
+
+
+async def stream_domains_from_db(session: AsyncSession, batch_size: int):
+    """All domains ordered by id, fetched `batch_size` rows at a time."""
+    result = await session.stream(
+        select(Domain).order_by(Domain.id).execution_options(yield_per=batch_size)
+    )
+    async for partition in result.scalars().partitions():
+        yield partition
+
+
+async def delete_domain_from_database(domain_id: int, session: AsyncSession):
+    domain = await session.get(Domain, domain_id)
+    if not domain:
+        raise NoDomainFoundError
+    await session.execute(
+        delete(ExaminationModel).where(ExaminationModel.domain_id == domain_id)
+    )
+    await session.execute(
+        delete(ExaminationRollup).where(ExaminationRollup.domain_id == domain_id)
+    )
+    await session.execute(delete(Incident).where(Incident.domain_id == domain_id))
+    await session.delete(domain)
+    await session.commit()
+
+
 async def add_examination_to_database(examination: Examination, session: AsyncSession):
     new_examination = ExaminationModel(**examination.model_dump())
     session.add(new_examination)
@@ -32,18 +110,469 @@ async def add_examination_to_database(examination: Examination, session: AsyncSe
         raise ExaminationCreateDBError
 
 
+EXAMINATION_COLUMNS = (
+    "status_code",
+    "examination_time",
+    "response_time",
+    "domain_id",
+    "dns_time",
+    "connect_time",
+    "tls_time",
+    "ttfb_time",
+    "body_time",
+    "content_match",
+    "error_kind",
+    "cert_expires_at",
+)
+
+
+async def add_examinations_to_database(
+    examinations: list[Examination], session: AsyncSession, commit: bool = True
+):
+    """
+    Insert a batch of examinations in one round trip: COPY when running on
+    asyncpg, a single executemany INSERT everywhere else. With
+    commit=False the caller commits, e.g. together with the rollups.
+    """
+    if not examinations:
+        return
+    if session.get_bind().dialect.driver == "asyncpg":
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            ExaminationModel.__tablename__,
+            records=[
+                tuple(getattr(examination, column) for column in EXAMINATION_COLUMNS)
+                for examination in examinations
+            ],
+            columns=EXAMINATION_COLUMNS,
+        )
+    else:
+        await session.execute(
+            insert(ExaminationModel),
+            [examination.model_dump() for examination in examinations],
+        )
+    if commit:
+        await session.commit()
+
+
+async def update_rollups_in_database(
+    examinations: list[Examination], session: AsyncSession, commit: bool = True
+):
+    """Merge a batch of examinations into the 1m / 1h / 1d rollup rows."""
+    buckets = aggregate_examinations(examinations)
+    if not buckets:
+        return
+    result: Result = await session.execute(
+        select(ExaminationRollup).where(
+            tuple_(
+                ExaminationRollup.resolution,
+                ExaminationRollup.domain_id,
+                ExaminationRollup.bucket_start,
+            ).in_(list(buckets))
+        )
+    )
+    existing = {
+        (row.resolution, row.domain_id, row.bucket_start): row
+        for row in result.scalars()
+    }
+    for key, bucket in buckets.items():
+        row = existing.get(key)
+        if row is None:
+            resolution, domain_id, start = key
+            row = ExaminationRollup(
+                resolution=resolution, domain_id=domain_id, bucket_start=start
+            )
+            session.add(row)
+        else:
+            bucket.merge(
+                RollupBucket(
+                    count=row.count,
+                    error_count=row.error_count,
+                    latency_count=row.latency_count,
+                    min_response_ms=(
+                        math.inf if row.min_response_ms is None else row.min_response_ms
+                    ),
+                    max_response_ms=row.max_response_ms or 0.0,
+                    sum_response_ms=row.sum_response_ms,
+                    histogram=row.histogram,
+                )
+            )
+        timed = bucket.latency_count > 0
+        row.count = bucket.count
+        row.error_count = bucket.error_count
+        row.latency_count = bucket.latency_count
+        row.min_response_ms = bucket.min_response_ms if timed else None
+        row.max_response_ms = bucket.max_response_ms if timed else None
+        row.sum_response_ms = bucket.sum_response_ms
+        row.p50_response_ms = bucket.percentile(0.50) if timed else None
+        row.p95_response_ms = bucket.percentile(0.95) if timed else None
+        row.p99_response_ms = bucket.percentile(0.99) if timed else None
+        row.histogram = bucket.histogram
+    if commit:
+        await session.commit()
+
+
+@db_query_seconds.labels(query="all_domains").time()
 async def get_all_domains_from_db(session: AsyncSession):
     res: Result = await session.execute(statement=select(Domain))
-    print(res)
     return res.scalars().all()
 
 
+@db_query_seconds.labels(query="domains_in_shards").time()
+async def get_domains_in_shards_from_db(
+    shards: set[int], shard_count: int, session: AsyncSession
+):
+    """Domains whose id falls into one of `shards` out of `shard_count`."""
+    if not shards:
+        return []
+    res: Result = await session.execute(
+        statement=select(Domain).where((Domain.id % shard_count).in_(shards))
+    )
+    return res.scalars().all()
+
+
+@db_query_seconds.labels(query="latest_examinations").time()
+async def get_latest_examinations_from_db(session: AsyncSession) -> list[dict]:
+    """
+    The most recent examination of every domain, as plain dicts. Each one
+    is read from the end of the domain's (domain_id, examination_time, id)
+    index range, so the cost grows with the domains, not the history.
+    """
+    recent = aliased(ExaminationModel)
+    newest = (
+        select(recent.status_code, recent.examination_time, recent.response_time)
+        .where(recent.domain_id == Domain.id)
+        .order_by(recent.examination_time.desc(), recent.id.desc())
+        .limit(1)
+    )
+    if session.get_bind().dialect.name == "postgresql":
+        latest = newest.lateral()
+        stmt = (
+            select(
+                Domain.id.label("domain_id"),
+                latest.c.status_code,
+                latest.c.examination_time,
+                latest.c.response_time,
+            )
+            .select_from(Domain)
+            .join(latest, true())
+        )
+    else:
+        # no LATERAL in SQLite; a correlated subquery walks the same index
+        latest_id = newest.with_only_columns(recent.id).scalar_subquery()
+        stmt = (
+            select(
+                ExaminationModel.domain_id,
+                ExaminationModel.status_code,
+                ExaminationModel.examination_time,
+                ExaminationModel.response_time,
+            )
+            .select_from(Domain)
+            .join(ExaminationModel, ExaminationModel.id == latest_id)
+        )
+    result: Result = await session.execute(stmt)
+    return [row._asdict() for row in result]
+
+
+@db_query_seconds.labels(query="domain_by_name").time()
+async def get_domain_by_name_from_db(domain: str, session: AsyncSession) -> Domain:
+    """Look a domain up by any spelling of its URL, through the host index."""
+    result: Result = await session.execute(
+        select(Domain)
+        .where(Domain.host == normalize_host(domain))
+        .order_by(Domain.id)
+        .limit(1)
+    )
+    domain: Domain = result.scalar_one_or_none()
+    if not domain:
+        raise NoDomainFoundError
+    return domain
+
+
+@db_query_seconds.labels(query="search_domains").time()
+async def search_domains_in_db(
+    query: str, session: AsyncSession, limit: int, substring: bool = False
+):
+    """
+    Domains whose host starts with (or, with `substring`, contains) the
+    normalized query. Prefix searches are index range scans on both
+    backends; substring searches use the trigram index on PostgreSQL.
+    """
+    query = normalize_host(query)
+    if substring:
+        condition = Domain.host.like(f"%{escape_like(query)}%", escape="\\")
+    elif session.get_bind().dialect.name == "postgresql":
+        condition = Domain.host.like(f"{escape_like(query)}%", escape="\\")
+    else:
+        # SQLite only uses an index for LIKE with a NOCASE column; a range
+        # over the binary-ordered host column does the same
+        condition = (Domain.host >= query) & (Domain.host < query + "\U0010ffff")
+    result: Result = await session.execute(
+        select(Domain).where(condition).order_by(Domain.host, Domain.id).limit(limit)
+    )
+    return result.scalars().all()
+
+
+def _examinations_select(
+    domain_id: int,
+    start: datetime.datetime | None,
+    end: datetime.datetime | None,
+):
+    stmt = select(
+        ExaminationModel.id,
+        ExaminationModel.status_code,
+        ExaminationModel.examination_time,
+        ExaminationModel.response_time,
+        ExaminationModel.domain_id,
+        ExaminationModel.dns_time,
+        ExaminationModel.connect_time,
+        ExaminationModel.tls_time,
+        ExaminationModel.ttfb_time,
+        ExaminationModel.body_time,
+        ExaminationModel.content_match,
+        ExaminationModel.error_kind,
+        ExaminationModel.cert_expires_at,
+    ).where(ExaminationModel.domain_id == domain_id)
+    if start is not None:
+        stmt = stmt.where(ExaminationModel.examination_time >= start)
+    if end is not None:
+        stmt = stmt.where(ExaminationModel.examination_time < end)
+    return stmt
+
+
+async def stream_examinations_from_db(
+    domain_id: int,
+    session: AsyncSession,
+    batch_size: int,
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+):
+    """
+    A domain's examinations as plain dicts, oldest first, fetched through
+    a server-side cursor `batch_size` rows at a time.
+    """
+    stmt = _examinations_select(domain_id, start, end).order_by(
+        ExaminationModel.examination_time, ExaminationModel.id
+    )
+    result = await session.stream(stmt.execution_options(yield_per=batch_size))
+    async for partition in result.partitions():
+        yield [row._asdict() for row in partition]
+
+
+@db_query_seconds.labels(query="examinations_page").time()
+async def get_examinations_page_from_db(
+    domain_id: int,
+    session: AsyncSession,
+    limit: int,
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+    after: tuple[datetime.datetime, int] | None = None,
+) -> list[dict]:
+    """
+    Return up to `limit` examinations of a domain as plain dicts, oldest
+    first. `after` is the (examination_time, id) of the last row of the
+    previous page; pages are found through the composite index instead of
+    an OFFSET scan.
+    """
+    stmt = _examinations_select(domain_id, start, end)
+    if after is not None:
+        stmt = stmt.where(
+            tuple_(ExaminationModel.examination_time, ExaminationModel.id)
+            > tuple_(*after)
+        )
+    stmt = stmt.order_by(ExaminationModel.examination_time, ExaminationModel.id).limit(
+        limit
+    )
+    result: Result = await session.execute(stmt)
+    return [row._asdict() for row in result]
+
+
+@db_query_seconds.labels(query="rollups_page").time()
+async def get_rollups_page_from_db(
+    domain_id: int,
+    resolution: str,
+    session: AsyncSession,
+    limit: int,
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+    after: tuple[datetime.datetime, int] | None = None,
+) -> list[dict]:
+    """Same contract as get_examinations_page_from_db, for rollup buckets."""
+    stmt = select(
+        ExaminationRollup.id,
+        ExaminationRollup.bucket_start,
+        ExaminationRollup.count,
+        ExaminationRollup.error_count,
+        ExaminationRollup.min_response_ms,
+        (
+            ExaminationRollup.sum_response_ms
+            / func.nullif(ExaminationRollup.latency_count, 0)
+        ).label("avg_response_ms"),
+        ExaminationRollup.max_response_ms,
+        ExaminationRollup.p50_response_ms,
+        ExaminationRollup.p95_response_ms,
+        ExaminationRollup.p99_response_ms,
+    ).where(
+        ExaminationRollup.domain_id == domain_id,
+        ExaminationRollup.resolution == resolution,
+    )
+    if start is not None:
+        stmt = stmt.where(ExaminationRollup.bucket_start >= start)
+    if end is not None:
+        stmt = stmt.where(ExaminationRollup.bucket_start < end)
+    if after is not None:
+        stmt = stmt.where(
+            tuple_(ExaminationRollup.bucket_start, ExaminationRollup.id)
+            > tuple_(*after)
+        )
+    stmt = stmt.order_by(ExaminationRollup.bucket_start, ExaminationRollup.id).limit(
+        limit
+    )
+    result: Result = await session.execute(stmt)
+    return [row._asdict() for row in result]
+
+
+@db_query_seconds.labels(query="rollup_totals").time()
+async def get_rollup_totals_from_db(
+    resolution: str,
+    start: datetime.datetime,
+    end: datetime.datetime,
+    session: AsyncSession,
+    domain_ids: list[int] | None = None,
+) -> dict[int, dict]:
+    """Per-domain sums of the `resolution` rollups starting in [start, end)."""
+    stmt = select(
+        ExaminationRollup.domain_id,
+        func.sum(ExaminationRollup.count).label("count"),
+        func.sum(ExaminationRollup.error_count).label("error_count"),
+        func.sum(ExaminationRollup.latency_count).label("latency_count"),
+        func.min(ExaminationRollup.min_response_ms).label("min_response_ms"),
+        func.max(ExaminationRollup.max_response_ms).label("max_response_ms"),
+        func.sum(ExaminationRollup.sum_response_ms).label("sum_response_ms"),
+    ).where(
+        ExaminationRollup.resolution == resolution,
+        ExaminationRollup.bucket_start >= start,
+        ExaminationRollup.bucket_start < end,
+    )
+    if domain_ids is not None:
+        stmt = stmt.where(ExaminationRollup.domain_id.in_(domain_ids))
+    result: Result = await session.execute(stmt.group_by(ExaminationRollup.domain_id))
+    return {row.domain_id: row._asdict() for row in result}
+
+
+@db_query_seconds.labels(query="rollup_histograms").time()
+async def get_rollup_histograms_from_db(
+    resolution: str,
+    start: datetime.datetime,
+    end: datetime.datetime,
+    session: AsyncSession,
+    domain_ids: list[int] | None = None,
+) -> dict[int, dict[str, int]]:
+    """
+    Per-domain latency histograms of the same rollups, merged by the
+    database: one row per domain and histogram bin.
+    """
+    if session.get_bind().dialect.name == "postgresql":
+        bins = func.json_each_text(ExaminationRollup.histogram)
+    else:
+        bins = func.json_each(ExaminationRollup.histogram)
+    bins = bins.table_valued("key", "value")
+    stmt = (
+        select(
+            ExaminationRollup.domain_id,
+            bins.c.key,
+            func.sum(cast(bins.c.value, Integer)).label("count"),
+        )
+        # a function in FROM may read the columns of the tables before it
+        .select_from(ExaminationRollup)
+        .join(bins, true())
+        .where(
+            ExaminationRollup.resolution == resolution,
+            ExaminationRollup.bucket_start >= start,
+            ExaminationRollup.bucket_start < end,
+        )
+    )
+    if domain_ids is not None:
+        stmt = stmt.where(ExaminationRollup.domain_id.in_(domain_ids))
+    result: Result = await session.execute(
+        stmt.group_by(ExaminationRollup.domain_id, bins.c.key)
+    )
+    histograms: dict[int, dict[str, int]] = {}
+    for domain_id, key, count in result:
+        histograms.setdefault(domain_id, {})[str(key)] = count
+    return histograms
+
+
+@db_query_seconds.labels(query="status_changes").time()
+async def get_status_changes_from_db(
+    start: datetime.datetime,
+    end: datetime.datetime,
+    session: AsyncSession,
+    domain_ids: list[int] | None = None,
+) -> dict[int, list[tuple[datetime.datetime, bool]]]:
+    """
+    The examinations in [start, end) where a domain went down or came back
+    up (plus each domain's first one), as (time, down) in time order. The
+    comparison with the previous examination is done by the database, so
+    only the changes are sent over.
+    """
+    down = case(
+        (
+            or_(
+                ExaminationModel.status_code < 200,
+                ExaminationModel.status_code >= 400,
+                ExaminationModel.content_match.is_(False),
+            ),
+            1,
+        ),
+        else_=0,
+    )
+    examinations = select(
+        ExaminationModel.domain_id,
+        ExaminationModel.examination_time,
+        down.label("down"),
+        func.lag(down)
+        .over(
+            partition_by=ExaminationModel.domain_id,
+            order_by=(ExaminationModel.examination_time, ExaminationModel.id),
+        )
+        .label("previous"),
+    ).where(
+        ExaminationModel.examination_time >= start,
+        ExaminationModel.examination_time < end,
+    )
+    if domain_ids is not None:
+        examinations = examinations.where(ExaminationModel.domain_id.in_(domain_ids))
+    examinations = examinations.subquery()
+    stmt = (
+        select(
+            examinations.c.domain_id,
+            examinations.c.examination_time,
+            examinations.c.down,
+        )
+        .where(
+            or_(
+                examinations.c.previous.is_(None),
+                examinations.c.down != examinations.c.previous,
+            )
+        )
+        .order_by(examinations.c.domain_id, examinations.c.examination_time)
+    )
+    result: Result = await session.execute(stmt)
+    changes: dict[int, list[tuple[datetime.datetime, bool]]] = {}
+    for domain_id, examination_time, is_down in result:
+        changes.setdefault(domain_id, []).append((examination_time, bool(is_down)))
+    return changes
+
+
+@db_query_seconds.labels(query="domain_and_examination").time()
 async def get_domain_and_examination_from_db(domain: str, session: AsyncSession):
-    domain_name = "https://www." + domain + "/"
-    print(domain_name)
     stmt = (
         select(Domain)
-        .where(Domain.domain == domain_name)
+        .where(Domain.host == normalize_host(domain))
+        .order_by(Domain.id)
+        .limit(1)
         .options(joinedload(Domain.examinations))
     )
     result: Result = await session.execute(stmt)
@@ -51,3 +580,68 @@ async def get_domain_and_examination_from_db(domain: str, session: AsyncSession)
     if not domain:
         raise NoDomainFoundError
     return domain
+
+
+async def add_incidents_to_database(
+    incidents: list[dict], session: AsyncSession
+) -> list[int]:
+    """Open incidents ({domain_id, started_at, status_code}); returns their ids."""
+    result: Result = await session.execute(
+        insert(Incident).returning(Incident.id, sort_by_parameter_order=True),
+        incidents,
+    )
+    ids = list(result.scalars())
+    await session.commit()
+    return ids
+
+
+async def resolve_incident_in_database(
+    domain_id: int, resolved_at: datetime.datetime, session: AsyncSession
+) -> tuple[int, datetime.datetime] | None:
+    """Close the open incident of a domain; returns its (id, started_at)."""
+    result: Result = await session.execute(
+        update(Incident)
+        .where(Incident.domain_id == domain_id, Incident.resolved_at.is_(None))
+        .values(resolved_at=resolved_at)
+        .returning(Incident.id, Incident.started_at)
+    )
+    row = result.first()
+    await session.commit()
+    return tuple(row) if row else None
+
+
+async def get_open_incidents_from_db(
+    session: AsyncSession, domain_ids: list[int] | None = None
+):
+    """Open incidents, of all domains or only of `domain_ids`."""
+    stmt = select(Incident).where(Incident.resolved_at.is_(None))
+    if domain_ids is not None:
+        stmt = stmt.where(Incident.domain_id.in_(domain_ids))
+    result: Result = await session.execute(stmt)
+    return result.scalars().all()
+
+
+@db_query_seconds.labels(query="incidents").time()
+async def get_incidents_from_db(
+    session: AsyncSession,
+    limit: int,
+    domain_id: int | None = None,
+    open_only: bool = False,
+) -> list[dict]:
+    """Most recent incidents first, with the host of their domain."""
+    stmt = select(
+        Incident.id,
+        Incident.domain_id,
+        Domain.host.label("domain"),
+        Incident.started_at,
+        Incident.resolved_at,
+        Incident.status_code,
+    ).join(Domain, Domain.id == Incident.domain_id)
+    if domain_id is not None:
+        stmt = stmt.where(Incident.domain_id == domain_id)
+    if open_only:
+        stmt = stmt.where(Incident.resolved_at.is_(None))
+    result: Result = await session.execute(
+        stmt.order_by(Incident.started_at.desc(), Incident.id.desc()).limit(limit)
+    )
+    return [row._asdict() for row in result]
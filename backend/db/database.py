@@ -1,11 +1,28 @@
+import time
+
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 
 from backend.config.settings import settings
+from backend.metrics import db_pool_wait_seconds
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Records how long each connection checkout waited for the pool."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_wait_seconds.observe(time.perf_counter() - started)
+
 
 engine = create_async_engine(
     settings.DATABASE_URL,
+    poolclass=TimedQueuePool,
     pool_pre_ping=True,
     pool_size=50,
     max_overflow=100,
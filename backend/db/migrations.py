@@ -0,0 +1,86 @@
+import logging
+
+from sqlalchemy import Connection, bindparam, inspect, literal, select, text
+from sqlalchemy.schema import Column, Table
+
+from backend.utils import normalize_host
+from .models import Base, Domain, host_trigram_index
+
+logger = logging.getLogger(__name__)
+
+
+def _column_ddl(column: Column, connection: Connection) -> str:
+    """
+    ADD COLUMN clause of a model column. A scalar default becomes the
+    server default, filling in the existing rows; columns without one (or
+    with a computed one, see _backfill_hosts) are added as nullable.
+    """
+    dialect = connection.dialect
+    ddl = f"{column.name} {column.type.compile(dialect=dialect)}"
+    default = column.default
+    if default is not None and default.is_scalar:
+        value = literal(default.arg, column.type).compile(
+            dialect=dialect, compile_kwargs={"literal_binds": True}
+        )
+        ddl += f" DEFAULT {value}"
+        if not column.nullable:
+            ddl += " NOT NULL"
+    return ddl
+
+
+def _backfill_hosts(connection: Connection) -> None:
+    table = Domain.__table__
+    rows = connection.execute(
+        select(table.c.id, table.c.domain).where(table.c.host.is_(None))
+    ).all()
+    if rows:
+        connection.execute(
+            table.update()
+            .where(table.c.id == bindparam("domain_id"))
+            .values(host=bindparam("new_host")),
+            [{"domain_id": id_, "new_host": normalize_host(url)} for id_, url in rows],
+        )
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("ALTER TABLE domains ALTER COLUMN host SET NOT NULL"))
+        connection.execute(host_trigram_index)
+
+
+def _upgrade_table(connection: Connection, table: Table) -> list[str]:
+    inspector = inspect(connection)
+    existing = {column["name"] for column in inspector.get_columns(table.name)}
+    added = [column.name for column in table.columns if column.name not in existing]
+    for name in added:
+        connection.execute(
+            text(
+                f"ALTER TABLE {table.name} "
+                f"ADD COLUMN {_column_ddl(table.c[name], connection)}"
+            )
+        )
+    if table is Domain.__table__ and "host" in added:
+        # before its index is created below
+        _backfill_hosts(connection)
+
+    indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+    for index in table.indexes:
+        if index.name not in indexes:
+            index.create(connection)
+    return added
+
+
+def upgrade_schema(connection: Connection) -> dict[str, list[str]]:
+    """
+    Bring tables created by an earlier version up to the models: add the
+    columns they lack (existing rows get the column's default, domains
+    their host) and the indexes, which create_all only makes together with
+    a new table. Runs after create_all; returns the added columns per table.
+    """
+    inspector = inspect(connection)
+    upgraded = {}
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        added = _upgrade_table(connection, table)
+        if added:
+            logger.info("Added columns to %s: %s", table.name, ", ".join(added))
+            upgraded[table.name] = added
+    return upgraded
@@ -1,27 +1,180 @@
 import datetime
-from typing import List
+from typing import List, Optional
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import Integer, String, ForeignKey
+from sqlalchemy import Boolean, Integer, String, Float, JSON, ForeignKey, Index
+from sqlalchemy import DDL, UniqueConstraint, event
 from sqlalchemy.sql import func
 
+from backend.utils import normalize_host
+
 
 class Base(DeclarativeBase):
     pass
 
 
+def _domain_host(context) -> str:
+    return normalize_host(context.get_current_parameters()["domain"])
+
+
 class Domain(Base):
     __tablename__ = "domains"
+    __table_args__ = (
+        # equality and prefix lookups; text_pattern_ops lets PostgreSQL use
+        # the index for LIKE 'prefix%' whatever the database collation
+        Index(
+            "ix_domains_host",
+            "host",
+            postgresql_ops={"host": "text_pattern_ops"},
+        ),
+    )
+
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     domain: Mapped[str] = mapped_column(String(60), unique=True)
+    # see backend.utils.normalize_host; computed once on insert
+    host: Mapped[str] = mapped_column(String(60), default=_domain_host)
+    check_interval: Mapped[int] = mapped_column(Integer, default=60 * 5)
+    # "http", or one of the other probes in backend.probe_types
+    probe_type: Mapped[str] = mapped_column(String(8), default="http")
+    # "get" (body read up to PROBE_BODY_LIMIT), "head" or "range"
+    probe_method: Mapped[str] = mapped_column(String(5), default="get")
+    # optional checks on the first PROBE_BODY_LIMIT bytes of the body
+    expect_keyword: Mapped[Optional[str]] = mapped_column(String(200))
+    expect_hash: Mapped[Optional[str]] = mapped_column(String(64))
     examinations: Mapped[List["Examination"]] = relationship(back_populates="domain")
 
 
+# Substring search on PostgreSQL goes through a trigram index when the
+# pg_trgm extension is available (it needs to be installed by a user
+# allowed to); without it such searches scan the table.
+host_trigram_index = DDL(
+    """
+        DO $$
+        BEGIN
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        EXCEPTION WHEN insufficient_privilege THEN
+            RAISE NOTICE 'pg_trgm is not available';
+        END
+        $$;
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+                CREATE INDEX IF NOT EXISTS ix_domains_host_trgm
+                    ON domains USING gin (host gin_trgm_ops);
+            END IF;
+        END
+        $$;
+    """
+)
+event.listen(
+    Domain.__table__,
+    "after_create",
+    host_trigram_index.execute_if(dialect="postgresql"),
+)
+
+
 class Examination(Base):
     __tablename__ = "examinations"
+    __table_args__ = (
+        # keyset pagination over a domain's history
+        Index(
+            "ix_examinations_domain_id_examination_time",
+            "domain_id",
+            "examination_time",
+            "id",
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     status_code: Mapped[int] = mapped_column(Integer)
     examination_time: Mapped[datetime.datetime] = mapped_column(default=func.now())
     response_time: Mapped[datetime.timedelta] = mapped_column()
+    # phases of response_time; NULL when a phase did not happen (cached DNS,
+    # reused connection, plain HTTP)
+    dns_time: Mapped[Optional[datetime.timedelta]] = mapped_column()
+    connect_time: Mapped[Optional[datetime.timedelta]] = mapped_column()
+    tls_time: Mapped[Optional[datetime.timedelta]] = mapped_column()
+    ttfb_time: Mapped[Optional[datetime.timedelta]] = mapped_column()
+    body_time: Mapped[Optional[datetime.timedelta]] = mapped_column()
+    # outcome of the domain's keyword / hash check; NULL without one
+    content_match: Mapped[Optional[bool]] = mapped_column(Boolean)
+    # why the probe got no response (status_code 0); see backend.probes
+    error_kind: Mapped[Optional[str]] = mapped_column(String(16))
+    # expiry of the certificate seen by a "tls" probe
+    cert_expires_at: Mapped[Optional[datetime.datetime]] = mapped_column()
     domain_id: Mapped[int] = mapped_column(ForeignKey("domains.id"), nullable=False)
     domain: Mapped["Domain"] = relationship(back_populates="examinations")
+
+
+class ExaminationRollup(Base):
+    """Per-domain examination aggregates over 1m / 1h / 1d buckets."""
+
+    __tablename__ = "examination_rollups"
+    __table_args__ = (
+        UniqueConstraint(
+            "domain_id",
+            "resolution",
+            "bucket_start",
+            name="uq_examination_rollups_domain_id_resolution_bucket_start",
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    domain_id: Mapped[int] = mapped_column(ForeignKey("domains.id"), nullable=False)
+    resolution: Mapped[str] = mapped_column(String(4))
+    bucket_start: Mapped[datetime.datetime] = mapped_column()
+    count: Mapped[int] = mapped_column(Integer)
+    error_count: Mapped[int] = mapped_column(Integer)
+    # checks that got a response; the latency columns only cover those, and
+    # are NULL when there were none
+    latency_count: Mapped[int] = mapped_column(Integer, default=0)
+    min_response_ms: Mapped[float | None] = mapped_column(Float)
+    max_response_ms: Mapped[float | None] = mapped_column(Float)
+    sum_response_ms: Mapped[float] = mapped_column(Float)
+    p50_response_ms: Mapped[float | None] = mapped_column(Float)
+    p95_response_ms: Mapped[float | None] = mapped_column(Float)
+    p99_response_ms: Mapped[float | None] = mapped_column(Float)
+    # sparse latency histogram {bin: count}, see backend.rollups
+    histogram: Mapped[dict] = mapped_column(JSON)
+
+
+class Incident(Base):
+    """
+    An outage of a domain, from the examination that confirmed it (see
+    backend.incidents) to the one that confirmed its recovery; open while
+    `resolved_at` is NULL.
+    """
+
+    __tablename__ = "incidents"
+    __table_args__ = (
+        Index("ix_incidents_domain_id_started_at", "domain_id", "started_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    domain_id: Mapped[int] = mapped_column(ForeignKey("domains.id"), nullable=False)
+    started_at: Mapped[datetime.datetime] = mapped_column()
+    resolved_at: Mapped[Optional[datetime.datetime]] = mapped_column()
+    # status of the examination that opened the incident
+    status_code: Mapped[int] = mapped_column(Integer)
+
+
+class ProbeLease(Base):
+    """
+    One row per shard of the domain set (domain id modulo the shard
+    count); the replica named in `owner` probes the shard's domains until
+    `expires_at`, unless it renews the lease first.
+    """
+
+    __tablename__ = "probe_leases"
+
+    shard: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    owner: Mapped[Optional[str]] = mapped_column(String(128))
+    expires_at: Mapped[Optional[datetime.datetime]] = mapped_column()
+
+
+class ProbeWorker(Base):
+    """Replicas taking part in shard assignment, with their last heartbeat."""
+
+    __tablename__ = "probe_workers"
+
+    id: Mapped[str] = mapped_column(String(128), primary_key=True)
+    heartbeat_at: Mapped[datetime.datetime] = mapped_column()
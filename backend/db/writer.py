@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import time
+
+from backend.config.settings import settings
+from backend.etags import examination_versions
+from backend.metrics import (
+    examinations_dropped,
+    insert_batch_seconds,
+    insert_batch_size,
+)
+from backend.schemas import Examination
+from .crud import add_examinations_to_database, update_rollups_in_database
+from .database import async_session
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class ExaminationWriter:
+    """
+    Write-behind buffer for probe results. Examinations are queued by the
+    probes and inserted in batches of up to `batch_size`, or whatever has
+    been collected after `flush_interval` seconds. The queue is bounded by
+    `max_pending`, so `put` blocks (slowing the probes down) when the
+    database falls behind.
+
+    A batch and its rollups are written in one transaction. A failing
+    batch is tried `attempts` times, `retry_backoff` seconds apart and
+    doubling, before it is dropped (and counted as dropped).
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_pending: int = 10_000,
+        attempts: int = 4,
+        retry_backoff: float = 0.5,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.attempts = attempts
+        self.retry_backoff = retry_backoff
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._task = asyncio.create_task(self._run())
+
+    async def put(self, examination: Examination) -> None:
+        await self._queue.put(examination)
+
+    async def close(self) -> None:
+        """Flush everything queued so far and stop the writer."""
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+        self._queue = None
+
+    async def _next_batch(self) -> tuple[list[Examination], bool]:
+        loop = asyncio.get_running_loop()
+        item = await self._queue.get()
+        if item is _STOP:
+            return [], True
+
+        batch = [item]
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except TimeoutError:
+                    break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._next_batch()
+            if batch:
+                await self._flush(batch)
+
+    async def _write(self, batch: list[Examination]) -> None:
+        async with self.session_factory() as session:
+            await add_examinations_to_database(
+                examinations=batch, session=session, commit=False
+            )
+            await update_rollups_in_database(
+                examinations=batch, session=session, commit=False
+            )
+            await session.commit()
+
+    async def _flush(self, batch: list[Examination]) -> None:
+        started = time.perf_counter()
+        for attempt in range(self.attempts):
+            try:
+                await self._write(batch)
+                break
+            except Exception:
+                if attempt + 1 == self.attempts:
+                    logger.exception("Dropped %d examinations", len(batch))
+                    examinations_dropped.inc(len(batch))
+                    return
+                delay = self.retry_backoff * 2**attempt
+                logger.warning(
+                    "Failed to write %d examinations, retrying in %.1fs",
+                    len(batch),
+                    delay,
+                    exc_info=True,
+                )
+                await asyncio.sleep(delay)
+        examination_versions.touch(examination.domain_id for examination in batch)
+        insert_batch_size.observe(len(batch))
+        insert_batch_seconds.observe(time.perf_counter() - started)
+
+
+examination_writer = ExaminationWriter(
+    session_factory=async_session,
+    batch_size=settings.WRITER_BATCH_SIZE,
+    flush_interval=settings.WRITER_FLUSH_INTERVAL,
+    max_pending=settings.WRITER_MAX_PENDING,
+    attempts=settings.WRITER_ATTEMPTS,
+    retry_backoff=settings.WRITER_RETRY_BACKOFF,
+)
@@ -16,3 +16,7 @@ class ExaminationCreateDBError(ShortenerBaseError):
 
 class DomainValidationError(ShortenerBaseError):
     pass
+
+
+class InvalidCursorError(ShortenerBaseError):
+    pass
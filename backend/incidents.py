@@ -0,0 +1,261 @@
+import asyncio
+import datetime
+import logging
+from dataclasses import dataclass
+from typing import Literal
+
+from backend.alerts import AlertDispatcher, alert_dispatcher
+from backend.config.settings import settings
+from backend.db import (
+    add_incidents_to_database,
+    async_session,
+    get_open_incidents_from_db,
+    resolve_incident_in_database,
+)
+from backend.metrics import incident_events
+from backend.rollups import is_error
+from backend.schemas import Examination, IncidentEvent
+
+logger = logging.getLogger(__name__)
+
+HealthState = Literal["up", "degraded", "down"]
+
+
+@dataclass(slots=True)
+class DomainHealth:
+    """
+    The last `window` outcomes of a domain as a bit mask (1 = failed, newest
+    in the lowest bit) with their failure count, so an update is a shift
+    and two additions whatever the window size.
+    """
+
+    state: HealthState = "up"
+    outcomes: int = 0
+    seen: int = 0
+    failures: int = 0
+    passing_streak: int = 0
+    incident_started: datetime.datetime | None = None
+    incident_status: int = 0
+
+
+@dataclass
+class HealthPolicy:
+    """
+    N-of-M confirmation: down once `down_after` of the last `window`
+    examinations failed, up again after `recover_after` passing ones in a
+    row. In between a domain with any failure in its window is degraded.
+    """
+
+    window: int = 5
+    down_after: int = 3
+    recover_after: int = 2
+
+    def __post_init__(self):
+        if not 0 < self.down_after <= self.window:
+            raise ValueError("down_after must be between 1 and window")
+
+    def update(self, health: DomainHealth, failed: bool) -> HealthState:
+        if health.seen == self.window:
+            health.failures -= health.outcomes >> (self.window - 1) & 1
+        else:
+            health.seen += 1
+        health.outcomes = (health.outcomes << 1 | failed) & ((1 << self.window) - 1)
+        health.failures += failed
+        health.passing_streak = 0 if failed else health.passing_streak + 1
+
+        if health.state == "down":
+            if health.passing_streak >= self.recover_after:
+                # start the next outage from a clean window
+                health.outcomes = health.seen = health.failures = 0
+                health.state = "up"
+        elif health.failures >= self.down_after:
+            health.state = "down"
+        else:
+            health.state = "degraded" if health.failures else "up"
+        return health.state
+
+
+class IncidentTracker:
+    """
+    Follows the health of every probed domain in memory, updated as each
+    examination comes in. Transitions to and from "down" become incidents:
+    they are persisted and passed on to the alert dispatcher by a
+    background task, so the probe pipeline never waits on either.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        dispatcher: AlertDispatcher,
+        policy: HealthPolicy | None = None,
+    ):
+        self.session_factory = session_factory
+        self.dispatcher = dispatcher
+        self.policy = policy or HealthPolicy()
+        self._health: dict[int, DomainHealth] = {}
+        self._queue: asyncio.Queue[IncidentEvent] | None = None
+        self._task: asyncio.Task | None = None
+
+    def state(self, domain_id: int) -> HealthState:
+        health = self._health.get(domain_id)
+        return health.state if health else "up"
+
+    def forget(self, domain_id: int) -> None:
+        self._health.pop(domain_id, None)
+
+    async def _load_open(self, domain_ids: list[int] | None = None) -> None:
+        async with self.session_factory() as session:
+            incidents = await get_open_incidents_from_db(
+                session=session, domain_ids=domain_ids
+            )
+        for incident in incidents:
+            self._health[incident.domain_id] = DomainHealth(
+                state="down",
+                incident_started=incident.started_at,
+                incident_status=incident.status_code,
+            )
+
+    async def adopt(self, domain_ids: list[int]) -> None:
+        """
+        Take over domains probed by another replica until now: their health
+        starts from the database, so an open incident stays open (and is
+        resolved here) instead of being opened a second time.
+        """
+        for domain_id in domain_ids:
+            self.forget(domain_id)
+        if domain_ids:
+            await self._load_open(domain_ids)
+
+    async def start(self) -> None:
+        """Pick the open incidents up again, then start persisting events."""
+        if self._task is not None:
+            return
+        await self._load_open()
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Persist and dispatch what is queued so far, then stop."""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._queue = None
+
+    def observe(self, examination: Examination, domain: str) -> IncidentEvent | None:
+        health = self._health.get(examination.domain_id)
+        if health is None:
+            health = self._health[examination.domain_id] = DomainHealth()
+        before = health.state
+        after = self.policy.update(
+            health, is_error(examination.status_code, examination.content_match)
+        )
+        if (before == "down") == (after == "down"):
+            return None
+
+        if after == "down":
+            health.incident_started = examination.examination_time
+            health.incident_status = examination.status_code
+        event: IncidentEvent = {
+            "event": "opened" if after == "down" else "resolved",
+            "incident_id": None,
+            "domain_id": examination.domain_id,
+            "domain": domain,
+            "started_at": health.incident_started,
+            "resolved_at": None if after == "down" else examination.examination_time,
+            "status_code": health.incident_status,
+        }
+        incident_events.labels(event=event["event"]).inc()
+        if self._queue is not None:
+            self._queue.put_nowait(event)
+        return event
+
+    async def _next_batch(self) -> list[IncidentEvent]:
+        events = [await self._queue.get()]
+        while not self._queue.empty():
+            events.append(self._queue.get_nowait())
+        return events
+
+    async def _run(self) -> None:
+        while True:
+            events = await self._next_batch()
+            try:
+                await self._persist(events)
+            except Exception:
+                logger.exception("Failed to save %d incident events", len(events))
+            self.dispatcher.publish(events)
+            for _ in events:
+                self._queue.task_done()
+
+    async def _persist(self, events: list[IncidentEvent]) -> None:
+        """
+        Open incidents in bulk; resolutions close the domain's open incident
+        (one opened earlier in the same batch is inserted first).
+        """
+        async with self.session_factory() as session:
+            opened: list[IncidentEvent] = []
+            for event in events:
+                if event["event"] == "opened":
+                    opened.append(event)
+                    continue
+                if opened:
+                    await self._insert(opened, session)
+                    opened = []
+                resolved = await resolve_incident_in_database(
+                    domain_id=event["domain_id"],
+                    resolved_at=event["resolved_at"],
+                    session=session,
+                )
+                if resolved:
+                    event["incident_id"] = resolved[0]
+            if opened:
+                await self._insert(opened, session)
+
+    @staticmethod
+    async def _insert(opened: list[IncidentEvent], session) -> None:
+        # a domain handed over between replicas may still have its incident
+        # open; that one goes on instead of a second
+        already_open = {
+            incident.domain_id: incident.id
+            for incident in await get_open_incidents_from_db(
+                session=session,
+                domain_ids=[event["domain_id"] for event in opened],
+            )
+        }
+        new = []
+        for event in opened:
+            if event["domain_id"] in already_open:
+                event["incident_id"] = already_open[event["domain_id"]]
+            else:
+                new.append(event)
+        if not new:
+            return
+        ids = await add_incidents_to_database(
+            [
+                {
+                    "domain_id": event["domain_id"],
+                    "started_at": event["started_at"],
+                    "status_code": event["status_code"],
+                }
+                for event in new
+            ],
+            session=session,
+        )
+        for event, incident_id in zip(new, ids):
+            event["incident_id"] = incident_id
+
+
+incident_tracker = IncidentTracker(
+    session_factory=async_session,
+    dispatcher=alert_dispatcher,
+    policy=HealthPolicy(
+        window=settings.INCIDENT_WINDOW,
+        down_after=settings.INCIDENT_DOWN_AFTER,
+        recover_after=settings.INCIDENT_RECOVER_AFTER,
+    ),
+)
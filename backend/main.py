@@ -1,46 +1,128 @@
 import asyncio
+import datetime
 import logging
 from http.client import HTTPException
 
-import aiohttp
-from typing import Annotated
-from contextlib import asynccontextmanager
-from fastapi import FastAPI, Body, status, HTTPException
-from backend.db import engine, Base
-from backend.middlewares import RequestLoggingMiddleware
-from backend.service import get_status_for_all_domains
+from typing import Annotated, Literal
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI, Body, Query, Request, Response, status, HTTPException
+from backend.alerts import alert_dispatcher
+from backend.broadcast import status_broadcaster
+from backend.config.settings import settings
+from backend.db import engine, Base, examination_writer
+from backend.db.migrations import upgrade_schema
+from backend.etags import (
+    cache_headers,
+    etag_matches,
+    examination_versions,
+    not_modified,
+)
+from backend.incidents import incident_tracker
+from backend.logs import configure_logging
+from backend.metrics import http_request_seconds, registry
+from backend.middlewares import (
+    CompressionMiddleware,
+    RequestLoggingMiddleware,
+    RequestMetricsMiddleware,
+)
+from backend.probes import probe_engine
+from backend.retention import (
+    create_partitioned_examinations,
+    prepare_partitions,
+    run_retention,
+)
+from backend.service import run_probe_scheduler, run_sharded_probe_scheduler
+from backend.sharding import shard_coordinator
+from backend.workers import run_probe_scheduler_in_processes
 from backend.db import async_session
 from backend.depends import db_connection
-from backend.service import add_domain, get_domain_with_examinations, get_all_domains
-from backend.exceptions import DomainAlreadyExistsError, NoDomainFoundError
+from backend.service import (
+    add_domain,
+    delete_domain,
+    domain_status_cache,
+    export_domains,
+    import_domains,
+    get_domain_with_examinations,
+    get_all_domains_json,
+    get_incidents,
+    get_stats,
+    search_domains,
+    stream_domain_examinations,
+)
+from backend.exceptions import (
+    DomainAlreadyExistsError,
+    InvalidCursorError,
+    NoDomainFoundError,
+)
+from backend.schemas import (
+    ProbeMethod,
+    ProbeType,
+    domain_import_report_adapter,
+    dump_history_page,
+    incident_rows_adapter,
+    stats_report_adapter,
+)
 from fastapi.middleware.cors import CORSMiddleware
-from backend.utils import validate_url
+from fastapi.responses import StreamingResponse
+from backend.utils import normalize_host, validate_url
 
-logging.basicConfig(
-    filename="app.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-)
+configure_logging(filename="app.log", level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
 async def wait():
-    while True:
-        async with aiohttp.ClientSession() as session:
-            await get_status_for_all_domains(
-                https_session=session, db_session_factory=async_session
+    if settings.PROBE_PROCESSES and not shard_coordinator.enabled:
+        # the worker processes have probe engines of their own
+        await run_probe_scheduler_in_processes(
+            db_session_factory=async_session, workers=settings.PROBE_PROCESSES
+        )
+        return
+    async with probe_engine:
+        if shard_coordinator.enabled:
+            await run_sharded_probe_scheduler(
+                https_session=probe_engine.session, db_session_factory=async_session
+            )
+        else:
+            await run_probe_scheduler(
+                https_session=probe_engine.session, db_session_factory=async_session
             )
-            await asyncio.sleep(60 * 5)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     async with engine.begin() as connection:
+        if (
+            settings.EXAMINATIONS_PARTITIONED
+            and connection.dialect.name == "postgresql"
+        ):
+            await connection.run_sync(create_partitioned_examinations)
         await connection.run_sync(Base.metadata.create_all)
+        # tables from an earlier version get the columns added since
+        await connection.run_sync(upgrade_schema)
         print("Successfully created db tables!")
+    # before the writer starts, so no day's rows land in the default partition
+    await prepare_partitions(async_session)
 
-    asyncio.create_task(wait())
+    examination_writer.start()
+    alert_dispatcher.start()
+    await incident_tracker.start()
+    tasks = [
+        asyncio.create_task(wait()),
+        asyncio.create_task(run_retention(async_session)),
+    ]
+    if shard_coordinator.enabled:
+        # statuses of the domains other replicas probe
+        tasks.append(
+            asyncio.create_task(domain_status_cache.run_reload_latest(async_session))
+        )
     yield
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await examination_writer.close()
+    await incident_tracker.close()
+    await alert_dispatcher.close()
 
 
 app = FastAPI(
@@ -59,35 +141,244 @@ app.add_middleware(
 )
 
 
-app.add_middleware(RequestLoggingMiddleware, logger=logger)
+app.add_middleware(
+    RequestLoggingMiddleware, logger=logger, sample_rates=settings.LOG_SAMPLE_RATES
+)
+app.add_middleware(RequestMetricsMiddleware, histogram=http_request_seconds)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESS_MIN_SIZE,
+    gzip_level=settings.GZIP_LEVEL,
+    brotli_quality=settings.BROTLI_QUALITY,
+)
 
 
 @app.get("/domains", status_code=status.HTTP_200_OK)
-async def get_domains(db_session: db_connection):
-    domains = await get_all_domains(session=db_session)
-    return domains
+async def get_domains(request: Request, db_session: db_connection):
+    etag = domain_status_cache.etag()
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return not_modified(etag)
+    content = await get_all_domains_json(session=db_session)
+    return Response(
+        content=content,
+        media_type="application/json",
+        headers=cache_headers(domain_status_cache.etag()),
+    )
+
+
+@app.get("/domains/search", status_code=status.HTTP_200_OK)
+async def search_domain_list(
+    q: Annotated[str, Query(min_length=1, max_length=60)],
+    db_session: db_connection,
+    match: Literal["prefix", "substring"] = "prefix",
+    limit: Annotated[int, Query(ge=1, le=500)] = 50,
+):
+    """Domains by host prefix (or substring), e.g. ?q=exam or ?q=ample&match=substring."""
+    content = await search_domains(q, session=db_session, match=match, limit=limit)
+    return Response(content=content, media_type="application/json")
+
+
+@app.get("/stats", status_code=status.HTTP_200_OK)
+async def get_dashboard_stats(
+    db_session: db_connection,
+    domain_id: Annotated[list[int] | None, Query()] = None,
+    start: Annotated[datetime.datetime | None, Query(alias="from")] = None,
+    end: Annotated[datetime.datetime | None, Query(alias="to")] = None,
+    slo: Annotated[float, Query(gt=0, lt=100)] = settings.SLO_TARGET,
+):
+    """Uptime stats of every domain (or of the given domain_id's) at once."""
+    report = await get_stats(
+        session=db_session, domain_ids=domain_id, start=start, end=end, slo=slo
+    )
+    return Response(
+        content=stats_report_adapter.dump_json(report), media_type="application/json"
+    )
+
+
+@app.get("/stats/{domain}", status_code=status.HTTP_200_OK)
+async def get_domain_stats(
+    domain: str,
+    db_session: db_connection,
+    start: Annotated[datetime.datetime | None, Query(alias="from")] = None,
+    end: Annotated[datetime.datetime | None, Query(alias="to")] = None,
+    slo: Annotated[float, Query(gt=0, lt=100)] = settings.SLO_TARGET,
+):
+    try:
+        report = await get_stats(
+            session=db_session, domain=domain, start=start, end=end, slo=slo
+        )
+    except NoDomainFoundError:
+        raise HTTPException(status_code=404, detail="Domain not found")
+    return Response(
+        content=stats_report_adapter.dump_json(report), media_type="application/json"
+    )
+
+
+@app.get("/incidents", status_code=status.HTTP_200_OK)
+async def list_incidents(
+    db_session: db_connection,
+    domain_id: int | None = None,
+    open: bool = False,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+):
+    """Most recent incidents first; ?open=true for the ongoing ones only."""
+    incidents = await get_incidents(
+        session=db_session, limit=limit, domain_id=domain_id, open_only=open
+    )
+    return Response(
+        content=incident_rows_adapter.dump_json(incidents),
+        media_type="application/json",
+    )
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/stream")
+async def stream_statuses(domain_id: int | None = None):
+    """Server-sent events with every new examination, as the probes produce them."""
+    return StreamingResponse(
+        status_broadcaster.stream(domain_id=domain_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.post("/add_domain", status_code=status.HTTP_201_CREATED)
 async def post_domain(
-    domain: Annotated[str, Body(embed=True)], db_session: db_connection
+    domain: Annotated[str, Body(embed=True)],
+    db_session: db_connection,
+    check_interval: Annotated[int | None, Body(embed=True, ge=10, le=86400)] = None,
+    probe_method: Annotated[ProbeMethod | None, Body(embed=True)] = None,
+    expect_keyword: Annotated[
+        str | None, Body(embed=True, min_length=1, max_length=200)
+    ] = None,
+    expect_hash: Annotated[
+        str | None, Body(embed=True, pattern="^[0-9a-f]{64}$")
+    ] = None,
+    probe_type: Annotated[ProbeType | None, Body(embed=True)] = None,
 ):
     if not validate_url(domain):
         raise HTTPException(status_code=400, detail="Wrong URL")
 
     try:
-        new_domain = await add_domain(session=db_session, domain=domain)
+        new_domain = await add_domain(
+            session=db_session,
+            domain=domain,
+            check_interval=check_interval,
+            probe_method=probe_method,
+            expect_keyword=expect_keyword,
+            expect_hash=expect_hash,
+            probe_type=probe_type,
+        )
         return new_domain
     except DomainAlreadyExistsError:
         raise HTTPException(status_code=400, detail="Domain already exists")
 
 
+@app.post("/domains/import", status_code=status.HTTP_200_OK)
+async def import_domain_list(
+    request: Request,
+    db_session: db_connection,
+    format: Literal["csv", "ndjson"] | None = None,
+):
+    """
+    Bulk-add domains from a CSV or NDJSON body (by `format`, else by
+    Content-Type). Returns a result for every row.
+    """
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "csv" if "csv" in content_type else "ndjson"
+    report = await import_domains(
+        request.stream(), file_format=format, session=db_session
+    )
+    return Response(
+        content=domain_import_report_adapter.dump_json(report),
+        media_type="application/json",
+    )
+
+
+@app.get("/domains/export")
+async def export_domain_list(
+    db_session: db_connection, format: Literal["csv", "ndjson"] = "ndjson"
+):
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        export_domains(session=db_session, file_format=format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="domains.{format}"'},
+    )
+
+
+@app.delete("/domains/{domain_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def remove_domain(domain_id: int, db_session: db_connection):
+    try:
+        await delete_domain(domain_id=domain_id, session=db_session)
+    except NoDomainFoundError:
+        raise HTTPException(status_code=404, detail="Domain not found")
+
+
 @app.get("/examinations/{domain}", status_code=status.HTTP_200_OK)
-async def get_domain_examinations(domain: str, db_session: db_connection):
+async def get_domain_examinations(
+    domain: str,
+    request: Request,
+    db_session: db_connection,
+    start: Annotated[datetime.datetime | None, Query(alias="from")] = None,
+    end: Annotated[datetime.datetime | None, Query(alias="to")] = None,
+    limit: Annotated[int, Query(ge=1, le=10_000)] = 1000,
+    cursor: str | None = None,
+    resolution: Literal["auto", "raw", "1m", "1h", "1d"] = "auto",
+):
+    host = normalize_host(domain)
+    etag = examination_versions.etag(host)
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return not_modified(etag)
+    seen = examination_versions.sequence
     try:
         domain_examinations = await get_domain_with_examinations(
-            domain=domain, session=db_session
+            domain=domain,
+            session=db_session,
+            limit=limit,
+            start=start,
+            end=end,
+            cursor=cursor,
+            resolution=resolution,
+        )
+    except NoDomainFoundError:
+        raise HTTPException(status_code=404, detail="Domain not found")
+    except InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    etag = examination_versions.learn(host, domain_examinations["id"], seen)
+    return Response(
+        content=dump_history_page(domain_examinations),
+        media_type="application/json",
+        headers=cache_headers(etag),
+    )
+
+
+@app.get("/examinations/{domain}/export")
+async def export_domain_examinations(
+    domain: str,
+    db_session: db_connection,
+    start: Annotated[datetime.datetime | None, Query(alias="from")] = None,
+    end: Annotated[datetime.datetime | None, Query(alias="to")] = None,
+    format: Literal["json", "ndjson"] = "ndjson",
+):
+    """
+    The full raw history of a domain in one streamed response, for exports
+    too large to page through.
+    """
+    try:
+        content = await stream_domain_examinations(
+            domain=domain,
+            session=db_session,
+            file_format=format,
+            start=start,
+            end=end,
         )
-        return domain_examinations
     except NoDomainFoundError:
         raise HTTPException(status_code=404, detail="Domain not found")
+    media_type = "application/json" if format == "json" else "application/x-ndjson"
+    return StreamingResponse(content, media_type=media_type)
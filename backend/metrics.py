@@ -0,0 +1,270 @@
+import bisect
+import functools
+import math
+import time
+from typing import Callable, Iterable
+
+# Everything is updated from the event loop thread only, so the metrics
+# are plain counters without locks. Histograms keep per-bucket counts
+# (cumulated only when rendered), so an observation is a bisect and two
+# additions.
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"),
+        )
+        for name, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], "_Metric"] = {}
+
+    def labels(self, **labels: str):
+        """The child metric for one combination of label values."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._child()
+        return child
+
+    def _child(self) -> "_Metric":
+        raise NotImplementedError
+
+    def _samples(self) -> Iterable[tuple[str, dict[str, str], float]]:
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        children = self._children.items() if self.labelnames else [((), self)]
+        for key, child in children:
+            labels = dict(zip(self.labelnames, key))
+            for suffix, extra, value in child._samples():
+                lines.append(
+                    f"{self.name}{suffix}{_format_labels({**labels, **extra})} "
+                    f"{_format_value(value)}"
+                )
+        return lines
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0.0
+
+    def _child(self) -> "Counter":
+        return Counter(self.name, self.documentation)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def _samples(self):
+        yield "_total", {}, self.value
+
+
+class Gauge(_Metric):
+    """A value that is set, or read from `function` at render time."""
+
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        function: Callable[[], float] | None = None,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0.0
+        self.function = function
+
+    def _child(self) -> "Gauge":
+        return Gauge(self.name, self.documentation)
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def _samples(self):
+        yield "", {}, self.function() if self.function else self.value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # one slot per bucket plus the +Inf overflow
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def _child(self) -> "Histogram":
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def time(self):
+        """Decorator timing every call of an async function."""
+
+        def decorator(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - started)
+
+            return wrapper
+
+        return decorator
+
+    def _samples(self):
+        cumulative = 0
+        for upper, count in zip((*self.buckets, math.inf), self.counts):
+            cumulative += count
+            yield "_bucket", {"le": _format_value(upper)}, cumulative
+        yield "_sum", {}, self.sum
+        yield "_count", {}, cumulative
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), function=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(
+        self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> bytes:
+        """Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return ("\n".join(lines) + "\n").encode()
+
+
+registry = Registry()
+
+probe_phase_seconds = registry.histogram(
+    "servicemonitor_probe_phase_seconds",
+    "Duration of each probe phase (total, dns, connect, tls, ttfb, body).",
+    labelnames=("phase",),
+)
+probes = registry.counter(
+    "servicemonitor_probes",
+    "Finished probes by status class, or error kind when there was no response.",
+    labelnames=("status",),
+)
+probe_cycle_seconds = registry.histogram(
+    "servicemonitor_probe_cycle_seconds",
+    "Duration of full probe cycles.",
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800),
+)
+probes_in_flight = registry.gauge(
+    "servicemonitor_probes_in_flight", "Probes currently running."
+)
+probes_per_second = registry.gauge(
+    "servicemonitor_probes_per_second",
+    "Probes finished per second, averaged over the scheduler's rate window.",
+)
+db_pool_wait_seconds = registry.histogram(
+    "servicemonitor_db_pool_wait_seconds",
+    "Time spent waiting to check a connection out of the database pool.",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+db_query_seconds = registry.histogram(
+    "servicemonitor_db_query_seconds",
+    "Duration of database reads, by query.",
+    labelnames=("query",),
+)
+insert_batch_size = registry.histogram(
+    "servicemonitor_insert_batch_size",
+    "Examinations written per batch.",
+    buckets=(1, 5, 10, 50, 100, 250, 500, 1000, 5000),
+)
+insert_batch_seconds = registry.histogram(
+    "servicemonitor_insert_batch_seconds", "Duration of examination batch writes."
+)
+examinations_dropped = registry.counter(
+    "servicemonitor_examinations_dropped",
+    "Examinations lost because their batch could not be written.",
+)
+http_request_seconds = registry.histogram(
+    "servicemonitor_http_request_seconds",
+    "HTTP handler latency by route template.",
+    labelnames=("method", "route", "status"),
+)
+incident_events = registry.counter(
+    "servicemonitor_incident_events",
+    "Incidents opened and resolved.",
+    labelnames=("event",),
+)
+alert_digests = registry.counter(
+    "servicemonitor_alert_digests",
+    "Alert digests handed to each sink, by result.",
+    labelnames=("sink", "result"),
+)
@@ -1,28 +1,185 @@
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
-from fastapi import Request, Response
-from starlette.types import ASGIApp
-
+import random
+import time
 from logging import Logger
 
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipResponder, IdentityResponder
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
+from backend.metrics import Histogram
 
-    def __init__(self, app: ASGIApp, logger: Logger):
-        super().__init__(app)
-        self.logger = logger
+try:
+    import brotli
+except ImportError:  # optional; responses are gzipped instead
+    brotli = None
 
-    async def dispatch(
-        self, request: Request, call_next: RequestResponseEndpoint
-    ) -> Response:
-        client_ip = request.client.host if request.client else "unknown"
-        method = request.method
-        url = request.url.path
-        self.logger.info(f"Request: {method} {url} from {client_ip}")
 
-        response = await call_next(request)
+class RequestLoggingMiddleware:
+    """
+    Plain ASGI middleware writing one record per request with method, path,
+    status, duration and client. Requests under a path prefix listed in
+    `sample_rates` are only logged at that rate; server errors always are.
+    """
 
-        status_code = response.status_code
-        self.logger.info(
-            f"Response: {method} {url} returned {status_code} to {client_ip}"
+    def __init__(
+        self,
+        app: ASGIApp,
+        logger: Logger,
+        sample_rates: dict[str, float] | None = None,
+    ):
+        self.app = app
+        self.logger = logger
+        # longest prefix first, so the most specific rate wins
+        self.sample_rates = sorted(
+            (sample_rates or {}).items(), key=lambda item: len(item[0]), reverse=True
         )
-        return response
+
+    def _sample_rate(self, path: str) -> float:
+        for prefix, rate in self.sample_rates:
+            if path.startswith(prefix):
+                return rate
+        return 1.0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            path = scope["path"]
+            rate = self._sample_rate(path)
+            if status_code >= 500 or rate >= 1.0 or random.random() < rate:
+                duration_ms = (time.perf_counter() - start) * 1000
+                client = scope.get("client")
+                client_ip = client[0] if client else "unknown"
+                self.logger.info(
+                    "%s %s %d %.1fms from %s",
+                    scope["method"],
+                    path,
+                    status_code,
+                    duration_ms,
+                    client_ip,
+                    extra={
+                        "method": scope["method"],
+                        "path": path,
+                        "status_code": status_code,
+                        "duration_ms": duration_ms,
+                        "client_ip": client_ip,
+                    },
+                )
+
+
+class RequestMetricsMiddleware:
+    """
+    Times every HTTP request into `histogram`, labelled by method, route
+    template (not the raw path, which would make one series per domain)
+    and status code.
+    """
+
+    def __init__(self, app: ASGIApp, histogram: Histogram):
+        self.app = app
+        self.histogram = histogram
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            self.histogram.labels(
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status_code,
+            ).observe(time.perf_counter() - start)
+
+
+def accepted_encodings(accept_encoding: str) -> set[str]:
+    """Content codings an Accept-Encoding header allows (q > 0)."""
+    accepted = set()
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.partition(";")
+        quality = params.strip()
+        try:
+            if not quality.startswith("q=") or float(quality[2:]) > 0:
+                accepted.add(coding.strip())
+        except ValueError:
+            continue
+    return accepted
+
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int = 5):
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        # flushing every chunk keeps streamed responses streaming
+        body = self.compressor.process(body)
+        if more_body:
+            return body + self.compressor.flush()
+        return body + self.compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses of at least `minimum_size` bytes with brotli when
+    the client accepts it and the brotli package is installed, otherwise
+    with gzip. Smaller responses (304s included) and event streams are
+    sent as they are; streamed bodies are compressed chunk by chunk.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 5,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accepted = accepted_encodings(Headers(scope=scope).get("Accept-Encoding", ""))
+        responder: ASGIApp
+        if brotli is not None and "br" in accepted:
+            responder = BrotliResponder(
+                self.app, self.minimum_size, quality=self.brotli_quality
+            )
+        elif "gzip" in accepted:
+            responder = GZipResponder(
+                self.app, self.minimum_size, compresslevel=self.gzip_level
+            )
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size)
+        await responder(scope, receive, send)
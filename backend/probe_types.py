@@ -0,0 +1,182 @@
+import asyncio
+import datetime
+import socket
+import ssl
+import time
+from typing import Awaitable, Callable, Iterator
+from urllib.parse import urlsplit
+
+from aiohttp import ClientSession
+
+from backend.config.settings import settings
+from backend.probes import ProbeTimings, classify_probe_error
+from backend.schemas import Domain, Examination
+from backend.utils import utcnow
+
+# Probes other than HTTP have no status code of their own; they report 200
+# when they succeed so that everything judging examinations by status
+# (rollups, stats, incidents, the UI) treats all probe types alike.
+PROBE_OK_STATUS = 200
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+Probe = Callable[[Domain, ClientSession], Awaitable[Examination]]
+
+
+class ProbeRegistry:
+    """Probe implementations by Domain.probe_type."""
+
+    def __init__(self):
+        self._probes: dict[str, Probe] = {}
+
+    def register(self, probe_type: str, probe: Probe | None = None):
+        """Register `probe`, or use as a decorator."""
+
+        def decorator(probe: Probe) -> Probe:
+            self._probes[probe_type] = probe
+            return probe
+
+        return decorator(probe) if probe is not None else decorator
+
+    def get(self, probe_type: str) -> Probe:
+        try:
+            return self._probes[probe_type]
+        except KeyError:
+            raise ValueError(f"Unknown probe type {probe_type!r}") from None
+
+    def __contains__(self, probe_type: str) -> bool:
+        return probe_type in self._probes
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._probes)
+
+
+probe_registry = ProbeRegistry()
+
+_tls_context: ssl.SSLContext | None = None
+
+
+def tls_context() -> ssl.SSLContext:
+    """One verifying context for all TLS probes; loading the CA store is slow."""
+    global _tls_context
+    if _tls_context is None:
+        _tls_context = ssl.create_default_context()
+    return _tls_context
+
+
+def probe_target(domain: Domain) -> tuple[str, int]:
+    """Host and port of a domain's URL, the port defaulting by scheme."""
+    parts = urlsplit(domain.domain)
+    return parts.hostname, parts.port or DEFAULT_PORTS.get(parts.scheme, 443)
+
+
+async def _resolve(host: str, port: int, timings: ProbeTimings) -> str:
+    loop = asyncio.get_running_loop()
+    timings.dns_start = time.perf_counter_ns()
+    addresses = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    timings.dns_end = time.perf_counter_ns()
+    return addresses[0][4][0]
+
+
+async def _examine(
+    domain: Domain,
+    check: Callable[[ProbeTimings], Awaitable[dict]],
+    timeout: float,
+) -> Examination:
+    """
+    Run `check` under `timeout` and turn it into an examination: status 200
+    and the fields `check` returns, or status 0 and the error kind.
+    """
+    examination_time = utcnow()
+    timings = ProbeTimings(start=time.perf_counter_ns())
+    try:
+        async with asyncio.timeout(timeout):
+            fields = await check(timings)
+    except Exception as exc:
+        error_kind = classify_probe_error(exc)
+        if error_kind is None:
+            raise
+        timings.end = time.perf_counter_ns()
+        return Examination(
+            status_code=0,
+            examination_time=examination_time,
+            domain_id=domain.id,
+            error_kind=error_kind,
+            **timings.durations(),
+        )
+    timings.end = time.perf_counter_ns()
+    return Examination(
+        status_code=PROBE_OK_STATUS,
+        examination_time=examination_time,
+        domain_id=domain.id,
+        **timings.durations(),
+        **fields,
+    )
+
+
+@probe_registry.register("tcp")
+async def tcp_probe(
+    domain: Domain,
+    http_session: ClientSession | None = None,
+    timeout: float = settings.PROBE_CONNECT_TIMEOUT,
+) -> Examination:
+    """Resolve and open a TCP connection to the domain's port, then drop it."""
+    host, port = probe_target(domain)
+
+    async def check(timings: ProbeTimings) -> dict:
+        address = await _resolve(host, port, timings)
+        _, writer = await asyncio.open_connection(address, port)
+        timings.connect_end = time.perf_counter_ns()
+        writer.transport.abort()
+        return {}
+
+    return await _examine(domain, check, timeout)
+
+
+@probe_registry.register("dns")
+async def dns_probe(
+    domain: Domain,
+    http_session: ClientSession | None = None,
+    timeout: float = settings.PROBE_CONNECT_TIMEOUT,
+) -> Examination:
+    """Time the resolution of the domain's host name."""
+    host, port = probe_target(domain)
+
+    async def check(timings: ProbeTimings) -> dict:
+        await _resolve(host, port, timings)
+        return {}
+
+    return await _examine(domain, check, timeout)
+
+
+@probe_registry.register("tls")
+async def tls_probe(
+    domain: Domain,
+    http_session: ClientSession | None = None,
+    timeout: float = settings.PROBE_CONNECT_TIMEOUT,
+    context: ssl.SSLContext | None = None,
+) -> Examination:
+    """
+    Connect and complete a verified TLS handshake, recording TCP and TLS
+    time separately and when the server's certificate expires. An invalid
+    or expired certificate fails the handshake (error kind "tls").
+    """
+    host, port = probe_target(domain)
+
+    async def check(timings: ProbeTimings) -> dict:
+        address = await _resolve(host, port, timings)
+        _, writer = await asyncio.open_connection(address, port)
+        timings.tcp_end = time.perf_counter_ns()
+        try:
+            await writer.start_tls(context or tls_context(), server_hostname=host)
+            timings.connect_end = time.perf_counter_ns()
+            certificate = writer.get_extra_info("ssl_object").getpeercert()
+        finally:
+            writer.transport.abort()
+        expires = ssl.cert_time_to_seconds(certificate["notAfter"])
+        return {
+            "cert_expires_at": datetime.datetime.fromtimestamp(
+                expires, datetime.timezone.utc
+            ).replace(tzinfo=None)
+        }
+
+    return await _examine(domain, check, timeout)
@@ -0,0 +1,343 @@
+import datetime
+import logging
+import socket
+import ssl
+import sys
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+import aiohappyeyeballs
+import aiohttp
+from aiohttp.client_exceptions import (
+    ClientConnectorCertificateError,
+    ClientConnectorError,
+    ClientConnectorSSLError,
+    cert_errors,
+    ssl_errors,
+)
+from aiohttp.helpers import ceil_timeout
+
+from backend.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ProbeTimings:
+    """
+    perf_counter_ns() marks taken while a probe runs; 0 means the step did
+    not happen (cached DNS, reused connection, plain HTTP).
+    """
+
+    start: int = 0
+    dns_start: int = 0
+    dns_end: int = 0
+    connect_start: int = 0
+    tcp_end: int = 0
+    connect_end: int = 0
+    headers: int = 0
+    end: int = 0
+
+    @staticmethod
+    def _span(start: int, end: int) -> datetime.timedelta | None:
+        if not start or not end:
+            return None
+        return datetime.timedelta(microseconds=(end - start) / 1000)
+
+    def durations(self) -> dict[str, datetime.timedelta | None]:
+        connected = self.tcp_end or self.connect_end
+        return {
+            "response_time": self._span(self.start, self.end),
+            "dns_time": self._span(self.dns_start, self.dns_end),
+            "connect_time": self._span(self.dns_end or self.connect_start, connected),
+            "tls_time": self._span(self.tcp_end, self.connect_end),
+            "ttfb_time": self._span(self.connect_end or self.start, self.headers),
+            "body_time": self._span(self.headers, self.end),
+        }
+
+
+# set for the duration of a probe; read by TimedTCPConnector, which has no
+# access to the request's trace context
+current_probe_timings: ContextVar[ProbeTimings | None] = ContextVar(
+    "current_probe_timings", default=None
+)
+
+
+def _mark(field: str):
+    async def callback(session, trace_config_ctx, params) -> None:
+        timings = trace_config_ctx.trace_request_ctx
+        if isinstance(timings, ProbeTimings):
+            setattr(timings, field, time.perf_counter_ns())
+
+    return callback
+
+
+def timing_trace_config() -> aiohttp.TraceConfig:
+    """Record each request phase into the ProbeTimings passed as trace_request_ctx."""
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_dns_resolvehost_start.append(_mark("dns_start"))
+    trace_config.on_dns_resolvehost_end.append(_mark("dns_end"))
+    trace_config.on_connection_create_start.append(_mark("connect_start"))
+    trace_config.on_connection_create_end.append(_mark("connect_end"))
+    trace_config.on_request_end.append(_mark("headers"))
+    return trace_config
+
+
+# TimedTCPConnector re-implements a private aiohttp method with private
+# attributes, as of these releases; on any other it leaves connecting to
+# aiohttp, and TCP connect and TLS handshake are timed as one step
+SPLIT_TLS_TIMING_VERSIONS = ("3.13.",)
+_CONNECTOR_PRIVATES = (
+    "_local_addr_infos",
+    "_happy_eyeballs_delay",
+    "_interleave",
+    "_socket_factory",
+    "_ssl_shutdown_timeout",
+    "_loop",
+)
+
+
+def split_tls_timing_supported(connector: aiohttp.TCPConnector) -> bool:
+    return (
+        aiohttp.__version__.startswith(SPLIT_TLS_TIMING_VERSIONS)
+        and hasattr(aiohttp.TCPConnector, "_wrap_create_connection")
+        and all(hasattr(connector, name) for name in _CONNECTOR_PRIVATES)
+    )
+
+
+class TimedTCPConnector(aiohttp.TCPConnector):
+    """
+    aiohttp reports TCP connect and TLS handshake as a single connection
+    step. This connector performs the two separately (as aiohttp 3.13 does
+    internally) and marks the moment the TCP connection is up.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.split_tls_timing = split_tls_timing_supported(self)
+        if not self.split_tls_timing:
+            logger.warning(
+                "aiohttp %s is not known to TimedTCPConnector; TLS handshakes "
+                "are timed as part of connect_time",
+                aiohttp.__version__,
+            )
+
+    async def _wrap_create_connection(
+        self,
+        *args,
+        addr_infos,
+        req,
+        timeout: aiohttp.ClientTimeout,
+        client_error=ClientConnectorError,
+        **kwargs,
+    ):
+        timings = current_probe_timings.get()
+        if timings is None or not kwargs.get("ssl") or not self.split_tls_timing:
+            return await super()._wrap_create_connection(
+                *args,
+                addr_infos=addr_infos,
+                req=req,
+                timeout=timeout,
+                client_error=client_error,
+                **kwargs,
+            )
+        try:
+            async with ceil_timeout(
+                timeout.sock_connect, ceil_threshold=timeout.ceil_threshold
+            ):
+                sock = await aiohappyeyeballs.start_connection(
+                    addr_infos=addr_infos,
+                    local_addr_infos=self._local_addr_infos,
+                    happy_eyeballs_delay=self._happy_eyeballs_delay,
+                    interleave=self._interleave,
+                    loop=self._loop,
+                    socket_factory=self._socket_factory,
+                )
+                timings.tcp_end = time.perf_counter_ns()
+                if self._ssl_shutdown_timeout and sys.version_info >= (3, 11):
+                    kwargs["ssl_shutdown_timeout"] = self._ssl_shutdown_timeout
+                return await self._loop.create_connection(*args, **kwargs, sock=sock)
+        except cert_errors as exc:
+            raise ClientConnectorCertificateError(req.connection_key, exc) from exc
+        except ssl_errors as exc:
+            raise ClientConnectorSSLError(req.connection_key, exc) from exc
+        except OSError as exc:
+            if exc.errno is None and isinstance(exc, TimeoutError):
+                raise
+            raise client_error(req.connection_key, exc) from exc
+
+
+# errors worth a second attempt: the connection was refused, reset or
+# dropped before a response came; the others would most likely repeat
+RETRYABLE_ERRORS = frozenset({"connect", "http"})
+
+
+def classify_probe_error(exc: BaseException) -> str | None:
+    """
+    The error_kind of a probe that got no HTTP response, or None for
+    exceptions that are not a failure of the probed host.
+    """
+    if isinstance(exc, TimeoutError):
+        return "timeout"
+    if isinstance(exc, (aiohttp.ClientConnectorDNSError, socket.gaierror)) or (
+        isinstance(getattr(exc, "os_error", None), socket.gaierror)
+    ):
+        return "dns"
+    if isinstance(exc, (aiohttp.ClientSSLError, ssl.SSLError)):
+        return "tls"
+    if isinstance(exc, OSError):
+        # refused, reset, unreachable; also raised by the native probes
+        return "connect"
+    if isinstance(exc, aiohttp.ClientError):
+        # disconnected before answering, malformed response, bad redirect
+        return "http"
+    return None
+
+
+async def read_capped(
+    response: aiohttp.ClientResponse, limit: int
+) -> tuple[bytes, bool]:
+    """
+    Read at most `limit` bytes of the body. Returns the bytes and whether
+    that was the whole body.
+    """
+    chunks = []
+    size = 0
+    while size < limit:
+        chunk = await response.content.read(limit - size)
+        if not chunk:
+            return b"".join(chunks), True
+        chunks.append(chunk)
+        size += len(chunk)
+    return b"".join(chunks), response.content.at_eof()
+
+
+class ResponseValidators:
+    """
+    ETag / Last-Modified of each domain's last full response, turned into
+    If-None-Match / If-Modified-Since on its next probe. A 304 answer then
+    costs no body at all; the content check result of the full response
+    is kept to stand in for it.
+    """
+
+    def __init__(self):
+        self._validators: dict[int, tuple[str | None, str | None, bool | None]] = {}
+
+    def headers(self, domain_id: int) -> dict[str, str]:
+        etag, last_modified, _ = self._validators.get(domain_id, (None, None, None))
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def content_match(self, domain_id: int) -> bool | None:
+        return self._validators.get(domain_id, (None, None, None))[2]
+
+    def update(
+        self, domain_id: int, headers, content_match: bool | None = None
+    ) -> None:
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        if etag or last_modified:
+            self._validators[domain_id] = (etag, last_modified, content_match)
+        else:
+            self._validators.pop(domain_id, None)
+
+    def forget(self, domain_id: int) -> None:
+        self._validators.pop(domain_id, None)
+
+
+class ProbeEngine:
+    """
+    Owns the single aiohttp session all probes go through. Its connector
+    keeps DNS results, keep-alive connections and the TLS context across
+    probe cycles instead of rebuilding them for every batch.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        limit_per_host: int,
+        dns_ttl: int,
+        keepalive_timeout: float,
+        connect_timeout: float,
+        read_timeout: float,
+        total_timeout: float,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = aiohttp.ClientTimeout(
+            total=total_timeout,
+            connect=connect_timeout,
+            sock_read=read_timeout,
+        )
+        self._session: aiohttp.ClientSession | None = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            raise RuntimeError("ProbeEngine is not started")
+        return self._session
+
+    async def start(self) -> None:
+        if self._session is not None:
+            return
+        connector = TimedTCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            use_dns_cache=True,
+            ttl_dns_cache=self.dns_ttl,
+            keepalive_timeout=self.keepalive_timeout,
+            enable_cleanup_closed=True,
+            ssl=ssl.create_default_context(),
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=self.timeout,
+            trace_configs=[timing_trace_config()],
+        )
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self) -> "ProbeEngine":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+
+def interval_keepalive_timeout(
+    interval: float, jitter: float, max_factor: float = 1.0
+) -> float:
+    """
+    Seconds an idle connection has to be kept for the next probe of its
+    host to reuse it: the longest the interval is stretched to, plus jitter.
+    """
+    return interval * max_factor * (1 + jitter)
+
+
+probe_engine = ProbeEngine(
+    limit=settings.PROBE_CONCURRENCY,
+    limit_per_host=settings.PROBE_PER_HOST_LIMIT,
+    dns_ttl=settings.PROBE_DNS_TTL,
+    keepalive_timeout=settings.PROBE_KEEPALIVE_TIMEOUT
+    or interval_keepalive_timeout(
+        settings.PROBE_INTERVAL,
+        settings.PROBE_JITTER,
+        settings.PROBE_ADAPTIVE_MAX_FACTOR if settings.PROBE_ADAPTIVE else 1.0,
+    ),
+    connect_timeout=settings.PROBE_CONNECT_TIMEOUT,
+    read_timeout=settings.PROBE_READ_TIMEOUT,
+    total_timeout=settings.PROBE_TIMEOUT,
+)
+
+response_validators = ResponseValidators()
@@ -0,0 +1,257 @@
+import asyncio
+import datetime
+import logging
+import re
+from dataclasses import dataclass, field
+
+from sqlalchemy import MetaData, PrimaryKeyConstraint, delete, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.config.settings import settings
+from backend.etags import examination_versions
+from backend.db.models import Base, Examination, ExaminationRollup
+from backend.utils import utcnow
+
+logger = logging.getLogger(__name__)
+
+PARTITION_BOUNDS = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+@dataclass
+class RetentionReport:
+    rows: dict[str, int] = field(default_factory=dict)
+    bytes: int = 0
+
+    def add(self, name: str, rows: int, reclaimed_bytes: int) -> None:
+        self.rows[name] = self.rows.get(name, 0) + rows
+        self.bytes += reclaimed_bytes
+
+
+def retention_policy() -> dict[str, int]:
+    """Days to keep per history table; 0 keeps the data forever."""
+    return {
+        "raw": settings.RETENTION_RAW_DAYS,
+        "1m": settings.RETENTION_1M_DAYS,
+        "1h": settings.RETENTION_1H_DAYS,
+        "1d": settings.RETENTION_1D_DAYS,
+    }
+
+
+async def _bytes_per_row(session: AsyncSession, table_name: str) -> float:
+    """
+    Average on-disk footprint of a row, indexes included. Used to estimate
+    the space freed by row deletes; 0 when the backend cannot tell.
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        size, rows = (
+            await session.execute(
+                text(
+                    "SELECT pg_total_relation_size(c.oid), c.reltuples "
+                    "FROM pg_class c WHERE c.oid = CAST(:name AS regclass)"
+                ),
+                {"name": table_name},
+            )
+        ).one()
+    elif dialect == "sqlite":
+        try:
+            size = (
+                await session.execute(
+                    text("SELECT SUM(pgsize) FROM dbstat WHERE tbl_name = :name"),
+                    {"name": table_name},
+                )
+            ).scalar()
+        except Exception:
+            # dbstat is an optional SQLite extension
+            return 0.0
+        rows = (
+            await session.execute(text(f"SELECT COUNT(*) FROM {table_name}"))
+        ).scalar()
+    else:
+        return 0.0
+    return (size or 0) / rows if rows and rows > 0 else 0.0
+
+
+async def delete_in_batches(
+    session_factory, model, condition, batch_size: int, pause: float = 0.05
+) -> int:
+    """
+    Delete matching rows `batch_size` at a time, one short transaction per
+    batch, so no long-held lock blocks the examination writer.
+    """
+    deleted = 0
+    while True:
+        ids = select(model.id).where(condition).limit(batch_size).scalar_subquery()
+        async with session_factory() as session:
+            result = await session.execute(delete(model).where(model.id.in_(ids)))
+            await session.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
+        await asyncio.sleep(pause)
+
+
+async def is_partitioned(session: AsyncSession, table_name: str) -> bool:
+    if session.get_bind().dialect.name != "postgresql":
+        return False
+    result = await session.execute(
+        text(
+            "SELECT 1 FROM pg_partitioned_table p "
+            "JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = :name"
+        ),
+        {"name": table_name},
+    )
+    return result.scalar() is not None
+
+
+def create_partitioned_examinations(connection) -> None:
+    """
+    Create `examinations` as a PostgreSQL table range-partitioned by day on
+    examination_time, plus a default partition. Runs before create_all,
+    which then leaves the existing table alone. The table definition is
+    taken from the model so the two cannot drift apart.
+    """
+    metadata = MetaData()
+    Base.metadata.tables["domains"].to_metadata(metadata)
+    table = Examination.__table__.to_metadata(metadata)
+    # the partition key has to be part of the primary key
+    table.c.examination_time.primary_key = True
+    table.append_constraint(PrimaryKeyConstraint("id", "examination_time"))
+    table.c.id.autoincrement = True
+    table.dialect_options["postgresql"]["partition_by"] = "RANGE (examination_time)"
+    table.create(connection, checkfirst=True)
+    connection.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {table.name}_default "
+            f"PARTITION OF {table.name} DEFAULT"
+        )
+    )
+
+
+async def ensure_partitions(
+    session: AsyncSession, table_name: str, days_ahead: int
+) -> int:
+    """
+    Create the daily partitions from today to `days_ahead` days ahead.
+    A day that fails (rows for it already sit in the default partition)
+    is logged and skipped. Returns the number of failed days.
+    """
+    today = utcnow().date()
+    failed = 0
+    for offset in range(days_ahead + 1):
+        day = today + datetime.timedelta(days=offset)
+        try:
+            await session.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {table_name}_p{day:%Y%m%d} "
+                    f"PARTITION OF {table_name} "
+                    f"FOR VALUES FROM ('{day}') "
+                    f"TO ('{day + datetime.timedelta(days=1)}')"
+                )
+            )
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            logger.exception("Could not create the %s partition of %s", day, table_name)
+            failed += 1
+    return failed
+
+
+async def prepare_partitions(session_factory) -> bool:
+    """
+    Create the coming days' examination partitions, when the table is
+    partitioned. Run at startup before the writer starts, and by every
+    retention run. Returns whether the table is partitioned.
+    """
+    async with session_factory() as session:
+        if not await is_partitioned(session, Examination.__tablename__):
+            return False
+        await ensure_partitions(
+            session, Examination.__tablename__, settings.RETENTION_PARTITIONS_AHEAD
+        )
+    return True
+
+
+async def drop_expired_partitions(
+    session: AsyncSession, table_name: str, cutoff: datetime.datetime
+) -> tuple[int, int]:
+    """Drop partitions that only hold rows older than `cutoff`."""
+    result = await session.execute(
+        text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), "
+            "c.reltuples, pg_total_relation_size(c.oid) "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:name AS regclass)"
+        ),
+        {"name": table_name},
+    )
+    rows = reclaimed_bytes = 0
+    for partition, bounds, tuples, size in result.all():
+        match = PARTITION_BOUNDS.search(bounds or "")
+        if not match or datetime.datetime.fromisoformat(match.group(2)) > cutoff:
+            continue
+        await session.execute(
+            text(f"ALTER TABLE {table_name} DETACH PARTITION {partition}")
+        )
+        await session.execute(text(f"DROP TABLE {partition}"))
+        rows += max(int(tuples), 0)
+        reclaimed_bytes += size
+    await session.commit()
+    return rows, reclaimed_bytes
+
+
+async def apply_retention(
+    session_factory, now: datetime.datetime | None = None
+) -> RetentionReport:
+    now = now or utcnow()
+    batch_size = settings.RETENTION_BATCH_SIZE
+    report = RetentionReport()
+
+    try:
+        partitioned = await prepare_partitions(session_factory)
+    except Exception:
+        # the deletes below still have to run
+        logger.exception("Could not prepare the examination partitions")
+        partitioned = False
+
+    for name, days in retention_policy().items():
+        if not days:
+            continue
+        cutoff = now - datetime.timedelta(days=days)
+        if name == "raw":
+            model = Examination
+            condition = Examination.examination_time < cutoff
+        else:
+            model = ExaminationRollup
+            condition = (ExaminationRollup.resolution == name) & (
+                ExaminationRollup.bucket_start < cutoff
+            )
+        table_name = model.__tablename__
+
+        async with session_factory() as session:
+            if name == "raw" and partitioned:
+                rows, reclaimed_bytes = await drop_expired_partitions(
+                    session, table_name, cutoff
+                )
+                report.add(name, rows, reclaimed_bytes)
+            # rows left past the cutoff (e.g. in the default partition)
+            # are deleted like in an unpartitioned table
+            row_bytes = await _bytes_per_row(session, table_name)
+
+        rows = await delete_in_batches(session_factory, model, condition, batch_size)
+        report.add(name, rows, int(rows * row_bytes))
+
+    logger.info(
+        "Retention: deleted %s rows, ~%d bytes reclaimed", report.rows, report.bytes
+    )
+    examination_versions.touch_all()
+    return report
+
+
+async def run_retention(session_factory) -> None:
+    while True:
+        try:
+            await apply_retention(session_factory)
+        except Exception:
+            logger.exception("Retention job failed")
+        await asyncio.sleep(settings.RETENTION_INTERVAL)
@@ -0,0 +1,158 @@
+import datetime
+import math
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from backend.schemas import Examination
+
+RESOLUTIONS: dict[str, datetime.timedelta] = {
+    "1m": datetime.timedelta(minutes=1),
+    "1h": datetime.timedelta(hours=1),
+    "1d": datetime.timedelta(days=1),
+}
+
+# Latency histogram: bin k holds values up to BIN_BASE_MS * BIN_GROWTH ** k,
+# so percentiles read from it are within ~5% of the real value.
+BIN_BASE_MS = 1.0
+BIN_GROWTH = 1.1
+MAX_BIN = 128
+
+
+def bucket_start(value: datetime.datetime, resolution: str) -> datetime.datetime:
+    value = value.replace(second=0, microsecond=0)
+    if resolution in ("1h", "1d"):
+        value = value.replace(minute=0)
+    if resolution == "1d":
+        value = value.replace(hour=0)
+    return value
+
+
+def is_error(status_code: int, content_match: bool | None = None) -> bool:
+    """Down: no 2xx/3xx answer, or a body that failed the content check."""
+    return not 200 <= status_code < 400 or content_match is False
+
+
+def latency_bin(response_ms: float) -> int:
+    if response_ms <= BIN_BASE_MS:
+        return 0
+    return min(MAX_BIN, math.ceil(math.log(response_ms / BIN_BASE_MS, BIN_GROWTH)))
+
+
+def bin_upper_ms(latency_bin: int) -> float:
+    return BIN_BASE_MS * BIN_GROWTH**latency_bin
+
+
+@dataclass
+class RollupBucket:
+    """
+    Checks and failures of a bucket, and the latency of the checks that
+    got a response (`latency_count` of them): a probe that failed without
+    one (status 0) only measured how long it took to give up.
+    """
+
+    count: int = 0
+    error_count: int = 0
+    latency_count: int = 0
+    min_response_ms: float = math.inf
+    max_response_ms: float = 0.0
+    sum_response_ms: float = 0.0
+    histogram: dict[str, int] = field(default_factory=dict)
+
+    def add(
+        self, status_code: int, response_ms: float, content_match: bool | None = None
+    ) -> None:
+        self.count += 1
+        self.error_count += is_error(status_code, content_match)
+        if not status_code:
+            return
+        self.latency_count += 1
+        self.min_response_ms = min(self.min_response_ms, response_ms)
+        self.max_response_ms = max(self.max_response_ms, response_ms)
+        self.sum_response_ms += response_ms
+        key = str(latency_bin(response_ms))
+        self.histogram[key] = self.histogram.get(key, 0) + 1
+
+    def merge(self, other: "RollupBucket") -> None:
+        self.count += other.count
+        self.error_count += other.error_count
+        self.latency_count += other.latency_count
+        self.min_response_ms = min(self.min_response_ms, other.min_response_ms)
+        self.max_response_ms = max(self.max_response_ms, other.max_response_ms)
+        self.sum_response_ms += other.sum_response_ms
+        for key, count in other.histogram.items():
+            self.histogram[key] = self.histogram.get(key, 0) + count
+
+    def percentile(self, q: float) -> float:
+        """Upper edge of the histogram bin holding the q-th value."""
+        if not self.latency_count:
+            return 0.0
+        rank = q * self.latency_count
+        seen = 0
+        for key in sorted(self.histogram, key=int):
+            seen += self.histogram[key]
+            if seen >= rank:
+                value = bin_upper_ms(int(key))
+                return min(max(value, self.min_response_ms), self.max_response_ms)
+        return self.max_response_ms
+
+
+RollupKey = tuple[str, int, datetime.datetime]
+
+
+def aggregate_examinations(
+    examinations: Iterable[Examination],
+) -> dict[RollupKey, RollupBucket]:
+    """Fold examinations into (resolution, domain_id, bucket_start) buckets."""
+    buckets: dict[RollupKey, RollupBucket] = {}
+    for examination in examinations:
+        response_ms = examination.response_time.total_seconds() * 1000
+        for resolution in RESOLUTIONS:
+            key = (
+                resolution,
+                examination.domain_id,
+                bucket_start(examination.examination_time, resolution),
+            )
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = RollupBucket()
+            bucket.add(examination.status_code, response_ms, examination.content_match)
+    return buckets
+
+
+def retained(
+    tier: str,
+    start: datetime.datetime,
+    now: datetime.datetime,
+    retention: dict[str, int],
+) -> bool:
+    """Whether `tier` ("raw" or a resolution) still reaches back to `start`."""
+    days = retention.get(tier)
+    return not days or start >= now - datetime.timedelta(days=days)
+
+
+def pick_resolution(
+    start: datetime.datetime | None,
+    end: datetime.datetime,
+    check_interval: int,
+    max_points: int,
+    now: datetime.datetime | None = None,
+    retention: dict[str, int] | None = None,
+) -> str:
+    """
+    Use raw examinations while the window holds at most `max_points` of
+    them, otherwise the finest rollup that does. Tiers whose `retention`
+    (days per tier, 0 meaning forever) no longer reaches back to `start`
+    are skipped, as their part of the window is deleted already.
+    """
+    if start is None:
+        return "raw"
+    now = now or end
+    retention = retention or {}
+    span = (end - start).total_seconds()
+    if retained("raw", start, now, retention) and span / check_interval <= max_points:
+        return "raw"
+    for resolution, width in RESOLUTIONS.items():
+        fits = span / width.total_seconds() <= max_points
+        if fits and retained(resolution, start, now, retention):
+            return resolution
+    return "1d"
@@ -0,0 +1,403 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterable, Iterator, TypeVar
+
+from backend.config.settings import settings
+from backend.metrics import probe_cycle_seconds, probes_in_flight, probes_per_second
+from backend.rollups import is_error
+from backend.schemas import Domain, Examination
+from backend.utils import get_host
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ProbeLimiter:
+    """
+    Caps the number of probes running at the same time, both globally
+    and per target host. A probe takes its host slot before a global one,
+    so probes queued behind a slow host never hold global slots the
+    other hosts could use.
+    """
+
+    def __init__(self, concurrency: int, per_host_limit: int):
+        self.concurrency = concurrency
+        self.per_host_limit = per_host_limit
+        self._global = asyncio.Semaphore(concurrency)
+        self._hosts: dict[str, asyncio.Semaphore] = {}
+        self._host_users: dict[str, int] = {}
+        self.in_flight = 0
+
+    @asynccontextmanager
+    async def slot(self, host: str):
+        semaphore = self._hosts.get(host)
+        if semaphore is None:
+            semaphore = self._hosts[host] = asyncio.Semaphore(self.per_host_limit)
+        self._host_users[host] = self._host_users.get(host, 0) + 1
+        try:
+            async with semaphore, self._global:
+                self.in_flight += 1
+                try:
+                    yield
+                finally:
+                    self.in_flight -= 1
+        finally:
+            self._host_users[host] -= 1
+            if not self._host_users[host]:
+                # drop idle hosts so the dict does not grow with the fleet
+                del self._host_users[host]
+                del self._hosts[host]
+
+
+class ProbeRateMeter:
+    """Counts finished probes over a sliding window of `window` seconds."""
+
+    def __init__(self, window: float = 60.0):
+        self.window = window
+        self.total = 0
+        self._marks: deque[float] = deque()
+
+    def mark(self) -> None:
+        now = time.monotonic()
+        self.total += 1
+        self._marks.append(now)
+        self._trim(now)
+
+    def rate(self) -> float:
+        now = time.monotonic()
+        self._trim(now)
+        return len(self._marks) / self.window
+
+    def _trim(self, now: float) -> None:
+        cutoff = now - self.window
+        while self._marks and self._marks[0] < cutoff:
+            self._marks.popleft()
+
+
+@dataclass
+class ScheduledProbe:
+    domain: Domain
+    interval: float
+    due: float
+    seq: int
+    # adaptive state, see AdaptiveIntervals
+    base_interval: float = 0.0
+    healthy_streak: int = 0
+    last_status: int | None = None
+    latency_ewma: float | None = None
+
+
+@dataclass
+class AdaptiveIntervals:
+    """
+    Adapts a domain's probe interval to its recent results. After
+    `stable_after` healthy probes in a row the interval grows by `backoff`
+    per probe, up to `max_factor` times the domain's check_interval. An
+    error, a changed status code or a latency jump (more than
+    `latency_jump` times the moving average, and at least `min_jump`
+    seconds more) switches to `recheck_factor` times the check_interval,
+    so the change is re-confirmed quickly.
+    """
+
+    backoff: float = 1.5
+    max_factor: float = 4.0
+    stable_after: int = 3
+    recheck_factor: float = 0.25
+    min_interval: float = 10.0
+    latency_jump: float = 3.0
+    min_jump: float = 0.1
+    latency_alpha: float = 0.3
+
+    def next_interval(
+        self, entry: ScheduledProbe, status_code: int, response_time: float
+    ) -> float:
+        base = entry.base_interval
+        changed = entry.last_status is not None and status_code != entry.last_status
+        average = entry.latency_ewma
+        jumped = (
+            average is not None
+            and response_time > average * self.latency_jump
+            and response_time - average >= self.min_jump
+        )
+
+        entry.last_status = status_code
+        if average is None:
+            entry.latency_ewma = response_time
+        elif not jumped:
+            # a jump is kept out of the average until it is confirmed
+            entry.latency_ewma = average + self.latency_alpha * (
+                response_time - average
+            )
+
+        if is_error(status_code) or changed or jumped:
+            entry.healthy_streak = 0
+            return max(self.min_interval, min(base, base * self.recheck_factor))
+        entry.healthy_streak += 1
+        if entry.healthy_streak <= self.stable_after:
+            return base
+        grown = max(entry.interval, base) * self.backoff
+        return min(grown, base * self.max_factor)
+
+
+class ProbeScheduler:
+    """
+    Keeps a min-heap of (due time, seq, domain id) and starts each probe
+    when it becomes due. Removed or rescheduled domains leave stale heap
+    items behind; they are skipped when popped (seq no longer matches).
+    A domain whose previous probe is still running (or still waiting for
+    a slot) is not started again; its turn moves on by one interval.
+    """
+
+    def __init__(
+        self,
+        concurrency: int,
+        per_host_limit: int,
+        default_interval: float = 60 * 5,
+        jitter: float = 0.1,
+        rate_window: float = 60.0,
+        adaptive: AdaptiveIntervals | None = None,
+    ):
+        self.limiter = ProbeLimiter(
+            concurrency=concurrency, per_host_limit=per_host_limit
+        )
+        self.meter = ProbeRateMeter(window=rate_window)
+        self.default_interval = default_interval
+        self.jitter = jitter
+        self.adaptive = adaptive
+        self._heap: list[tuple[float, int, int]] = []
+        self._entries: dict[int, ScheduledProbe] = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._tasks: set[asyncio.Task] = set()
+        self._running: set[int] = set()
+        self._reported_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, domain_id: int) -> bool:
+        return domain_id in self._entries
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(list(self._entries))
+
+    def _jittered(self, interval: float) -> float:
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _push(self, entry: ScheduledProbe) -> None:
+        entry.seq = next(self._seq)
+        heapq.heappush(self._heap, (entry.due, entry.seq, entry.domain.id))
+        if self._heap[0][1] == entry.seq:
+            # new earliest deadline, let the run loop recompute its sleep
+            self._wakeup.set()
+
+    def schedule(self, domain: Domain, delay: float | None = None) -> None:
+        """
+        Add a domain, or replace its schedule if it is already known. New
+        domains get a random first due time within their interval so that
+        a batch of additions does not turn into a burst.
+        """
+        interval = domain.check_interval or self.default_interval
+        if delay is None:
+            delay = random.uniform(0, interval)
+        entry = ScheduledProbe(
+            domain=domain,
+            interval=interval,
+            due=time.monotonic() + delay,
+            seq=0,
+            base_interval=interval,
+        )
+        self._entries[domain.id] = entry
+        self._push(entry)
+
+    def unschedule(self, domain_id: int) -> None:
+        self._entries.pop(domain_id, None)
+
+    def domain(self, domain_id: int) -> Domain | None:
+        entry = self._entries.get(domain_id)
+        return entry.domain if entry else None
+
+    def _pop_due(self) -> ScheduledProbe | float | None:
+        """
+        Return the next due entry, the seconds until one is due, or None
+        when nothing is scheduled.
+        """
+        while self._heap:
+            due, seq, domain_id = self._heap[0]
+            entry = self._entries.get(domain_id)
+            if entry is None or entry.seq != seq:
+                heapq.heappop(self._heap)
+                continue
+            delay = due - time.monotonic()
+            if delay > 0:
+                return delay
+            heapq.heappop(self._heap)
+            return entry
+        return None
+
+    async def run(self, probe: Callable[[Domain], Awaitable[T]]) -> None:
+        """
+        Run probes as they become due, until cancelled. Probes still in
+        flight at that point are cancelled too.
+        """
+        try:
+            await self._run(probe)
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _run(self, probe: Callable[[Domain], Awaitable[T]]) -> None:
+        while True:
+            self._wakeup.clear()
+            next_due = self._pop_due()
+            if next_due is None:
+                await self._wakeup.wait()
+                continue
+            if not isinstance(next_due, ScheduledProbe):
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=next_due)
+                except TimeoutError:
+                    pass
+                continue
+
+            entry = next_due
+            # when running late, count the next interval from now instead of
+            # the missed due time so a backlog does not turn into a burst
+            entry.due = max(entry.due, time.monotonic()) + self._jittered(
+                entry.interval
+            )
+            self._push(entry)
+            if entry.domain.id in self._running:
+                continue
+
+            self._running.add(entry.domain.id)
+            task = asyncio.create_task(self._run_scheduled(entry, probe))
+            self._tasks.add(task)
+            task.add_done_callback(self._probe_done)
+            self._report_rate()
+
+    def _report_rate(self) -> None:
+        """Log the sustained probe rate once per rate window."""
+        now = time.monotonic()
+        if now - self._reported_at < self.meter.window:
+            return
+        self._reported_at = now
+        logger.info(
+            "Probing %d domains: sustained %.1f probes/s, %d in flight",
+            len(self._entries),
+            self.probes_per_second,
+            self.limiter.in_flight,
+        )
+
+    def _probe_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Probe failed", exc_info=task.exception())
+
+    async def _run_scheduled(
+        self, entry: ScheduledProbe, probe: Callable[[Domain], Awaitable[T]]
+    ) -> T:
+        try:
+            result = await self._run_probe(entry.domain, probe)
+        finally:
+            self._running.discard(entry.domain.id)
+        if (
+            self.adaptive is not None
+            and isinstance(result, Examination)
+            and self._entries.get(entry.domain.id) is entry
+        ):
+            interval = self.adaptive.next_interval(
+                entry, result.status_code, result.response_time.total_seconds()
+            )
+            if interval != entry.interval:
+                entry.interval = interval
+                entry.due = time.monotonic() + self._jittered(interval)
+                self._push(entry)
+        return result
+
+    @property
+    def probes_per_second(self) -> float:
+        return self.meter.rate()
+
+    async def _run_probe(
+        self, domain: Domain, probe: Callable[[Domain], Awaitable[T]]
+    ) -> T:
+        async with self.limiter.slot(get_host(domain.domain)):
+            result = await probe(domain)
+        self.meter.mark()
+        return result
+
+    async def run_cycle(
+        self,
+        domains: Iterable[Domain],
+        probe: Callable[[Domain], Awaitable[T]],
+        spread: float = 0.0,
+    ) -> list[T]:
+        """
+        Probe every domain once. Start times are spaced evenly over `spread`
+        seconds; at most `concurrency` probes run at the same time, the
+        others wait for their host's slot and then a global one. Returns
+        the results of the probes that did not raise; the others are logged.
+        """
+        domains = list(domains)
+        if not domains:
+            return []
+
+        step = spread / len(domains)
+        started = time.monotonic()
+        tasks = []
+        for index, domain in enumerate(domains):
+            delay = started + index * step - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(self._run_probe(domain, probe)))
+
+        # one probe raising must not take the rest of the cycle down
+        results = []
+        for domain, result in zip(
+            domains, await asyncio.gather(*tasks, return_exceptions=True)
+        ):
+            if isinstance(result, Exception):
+                logger.error("Probe of %s failed", domain.domain, exc_info=result)
+            else:
+                results.append(result)
+
+        elapsed = time.monotonic() - started
+        probe_cycle_seconds.observe(elapsed)
+        logger.info(
+            "Probe cycle: %d domains in %.2fs (%.1f probes/s, sustained %.1f probes/s)",
+            len(domains),
+            elapsed,
+            len(domains) / elapsed if elapsed else 0.0,
+            self.probes_per_second,
+        )
+        return results
+
+
+probe_scheduler = ProbeScheduler(
+    concurrency=settings.PROBE_CONCURRENCY,
+    per_host_limit=settings.PROBE_PER_HOST_LIMIT,
+    default_interval=settings.PROBE_INTERVAL,
+    jitter=settings.PROBE_JITTER,
+    adaptive=(
+        AdaptiveIntervals(
+            max_factor=settings.PROBE_ADAPTIVE_MAX_FACTOR,
+            stable_after=settings.PROBE_ADAPTIVE_STABLE_AFTER,
+            recheck_factor=settings.PROBE_ADAPTIVE_RECHECK_FACTOR,
+            latency_jump=settings.PROBE_ADAPTIVE_LATENCY_JUMP,
+        )
+        if settings.PROBE_ADAPTIVE
+        else None
+    ),
+)
+probes_in_flight.function = lambda: probe_scheduler.limiter.in_flight
+probes_per_second.function = lambda: probe_scheduler.probes_per_second
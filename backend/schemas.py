@@ -1,7 +1,10 @@
 import datetime
 
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, TypeAdapter
+from typing import List, Literal, Optional, TypedDict
+
+
+ProbeErrorKind = Literal["timeout", "dns", "connect", "tls", "http"]
 
 
 class Examination(BaseModel):
@@ -9,6 +12,15 @@ class Examination(BaseModel):
     examination_time: datetime.datetime
     response_time: datetime.timedelta
     domain_id: int
+    dns_time: Optional[datetime.timedelta] = None
+    connect_time: Optional[datetime.timedelta] = None
+    tls_time: Optional[datetime.timedelta] = None
+    ttfb_time: Optional[datetime.timedelta] = None
+    body_time: Optional[datetime.timedelta] = None
+    content_match: Optional[bool] = None
+    # set when the probe got no HTTP response (status_code is then 0)
+    error_kind: Optional[ProbeErrorKind] = None
+    cert_expires_at: Optional[datetime.datetime] = None
 
 
 class ExaminationDB(BaseModel):
@@ -19,10 +31,181 @@ class ExaminationDB(BaseModel):
     domain_id: int
 
 
+ProbeMethod = Literal["get", "head", "range"]
+ProbeType = Literal["http", "tcp", "dns", "tls"]
+
+
 class Domain(BaseModel):
     id: int
     domain: str
+    check_interval: Optional[int] = None
+    probe_type: ProbeType = "http"
+    probe_method: ProbeMethod = "get"
+    expect_keyword: Optional[str] = None
+    expect_hash: Optional[str] = None
+
+
+class DomainWithStatus(Domain):
+    """A domain with its most recent examination, if any."""
+
+    status_code: Optional[int] = None
+    examination_time: Optional[datetime.datetime] = None
+    response_time: Optional[datetime.timedelta] = None
 
 
 class DomainWithExaminations(Domain):
     examinations: List[ExaminationDB]
+
+
+class ExaminationRow(TypedDict):
+    id: int
+    status_code: int
+    examination_time: datetime.datetime
+    response_time: datetime.timedelta
+    domain_id: int
+    dns_time: Optional[datetime.timedelta]
+    connect_time: Optional[datetime.timedelta]
+    tls_time: Optional[datetime.timedelta]
+    ttfb_time: Optional[datetime.timedelta]
+    body_time: Optional[datetime.timedelta]
+    content_match: Optional[bool]
+    error_kind: Optional[str]
+    cert_expires_at: Optional[datetime.datetime]
+
+
+class RollupRow(TypedDict):
+    id: int
+    bucket_start: datetime.datetime
+    count: int
+    error_count: int
+    # None when no check of the bucket got a response
+    min_response_ms: Optional[float]
+    avg_response_ms: Optional[float]
+    max_response_ms: Optional[float]
+    p50_response_ms: Optional[float]
+    p95_response_ms: Optional[float]
+    p99_response_ms: Optional[float]
+
+
+class ExaminationsPage(TypedDict):
+    id: int
+    domain: str
+    resolution: str
+    examinations: List[ExaminationRow]
+    next_cursor: Optional[str]
+
+
+class RollupsPage(TypedDict):
+    id: int
+    domain: str
+    resolution: str
+    rollups: List[RollupRow]
+    next_cursor: Optional[str]
+
+
+# serialize plain dicts built from DB rows, without creating a model per row
+examinations_page_adapter = TypeAdapter(ExaminationsPage)
+examination_row_adapter = TypeAdapter(ExaminationRow)
+examination_rows_adapter = TypeAdapter(List[ExaminationRow])
+rollups_page_adapter = TypeAdapter(RollupsPage)
+
+
+def dump_history_page(page: ExaminationsPage | RollupsPage) -> bytes:
+    if page["resolution"] == "raw":
+        return examinations_page_adapter.dump_json(page)
+    return rollups_page_adapter.dump_json(page)
+
+
+domains_with_status_adapter = TypeAdapter(List[DomainWithStatus])
+
+
+class DomainStats(TypedDict):
+    domain_id: int
+    domain: str
+    checks: int
+    failed_checks: int
+    # percent of passing checks; None without checks
+    availability: Optional[float]
+    error_budget_burn: Optional[float]
+    outages: int
+    # mean time to recovery of the outages that ended in the window
+    mttr: Optional[datetime.timedelta]
+    avg_response_ms: Optional[float]
+    min_response_ms: Optional[float]
+    max_response_ms: Optional[float]
+    p50_response_ms: Optional[float]
+    p95_response_ms: Optional[float]
+    p99_response_ms: Optional[float]
+
+
+class StatsReport(TypedDict):
+    start: datetime.datetime
+    end: datetime.datetime
+    resolution: str
+    slo: float
+    domains: List[DomainStats]
+
+
+stats_report_adapter = TypeAdapter(StatsReport)
+
+
+class IncidentRow(TypedDict):
+    id: int
+    domain_id: int
+    domain: str
+    started_at: datetime.datetime
+    resolved_at: Optional[datetime.datetime]
+    status_code: int
+
+
+class IncidentEvent(TypedDict):
+    event: Literal["opened", "resolved"]
+    incident_id: Optional[int]
+    domain_id: int
+    domain: str
+    # when the incident started, and (for "resolved") when it ended
+    started_at: datetime.datetime
+    resolved_at: Optional[datetime.datetime]
+    status_code: int
+
+
+class AlertDigest(TypedDict):
+    opened: int
+    resolved: int
+    events: List[IncidentEvent]
+
+
+incident_rows_adapter = TypeAdapter(List[IncidentRow])
+alert_digest_adapter = TypeAdapter(AlertDigest)
+
+
+class DomainImportRow(TypedDict):
+    line: int
+    domain: Optional[str]
+    status: Literal["created", "exists", "invalid"]
+    id: Optional[int]
+    error: Optional[str]
+
+
+class DomainImportReport(TypedDict):
+    created: int
+    existing: int
+    invalid: int
+    results: List[DomainImportRow]
+
+
+class DomainExportRow(TypedDict):
+    id: int
+    domain: str
+    check_interval: int
+    probe_type: str
+    probe_method: str
+    expect_keyword: Optional[str]
+    expect_hash: Optional[str]
+    status_code: Optional[int]
+    examination_time: Optional[datetime.datetime]
+    response_time: Optional[datetime.timedelta]
+
+
+domain_import_report_adapter = TypeAdapter(DomainImportReport)
+domain_export_row_adapter = TypeAdapter(DomainExportRow)
@@ -1,97 +1,1055 @@
 import asyncio
+import csv
 import datetime
+import hashlib
+import io
+import json
+import logging
+import math
+import random
+import time
+from collections import deque
+from contextlib import suppress
+from typing import Literal
 from aiohttp.client import ClientSession
-from backend.schemas import Examination, Domain, DomainWithExaminations, ExaminationDB
+from backend.exceptions import InvalidCursorError
+from backend.schemas import (
+    Domain,
+    DomainWithStatus,
+    Examination,
+    DomainExportRow,
+    DomainImportReport,
+    DomainImportRow,
+    ExaminationsPage,
+    RollupsPage,
+    StatsReport,
+    IncidentRow,
+    domain_export_row_adapter,
+    domains_with_status_adapter,
+    examination_row_adapter,
+    examination_rows_adapter,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
+from backend.broadcast import status_broadcaster
+from backend.config.settings import settings
+from backend.metrics import probe_phase_seconds, probes
 from backend.db import (
-    add_examination_to_database,
+    ExaminationWriter,
+    examination_writer,
     get_all_domains_from_db,
+    get_domains_in_shards_from_db,
+    get_latest_examinations_from_db,
     add_domain_to_database,
-    get_domain_and_examination_from_db,
+    add_domains_to_database,
+    stream_domains_from_db,
+    delete_domain_from_database,
+    get_domain_by_name_from_db,
+    get_examinations_page_from_db,
+    get_rollups_page_from_db,
+    get_rollup_histograms_from_db,
+    get_rollup_totals_from_db,
+    get_status_changes_from_db,
+    get_incidents_from_db,
+    search_domains_in_db,
+    stream_examinations_from_db,
+)
+from backend.etags import examination_versions, weak_etag
+from backend.incidents import IncidentTracker, incident_tracker
+from backend.retention import retention_policy
+from backend.rollups import pick_resolution
+from backend.stats import align_window, domain_stats, stats_resolution
+from backend.scheduler import ProbeScheduler, probe_scheduler
+from backend.probe_types import probe_registry
+from backend.probes import (
+    RETRYABLE_ERRORS,
+    ProbeTimings,
+    classify_probe_error,
+    ResponseValidators,
+    current_probe_timings,
+    read_capped,
+    response_validators,
+)
+from backend.sharding import ShardCoordinator, shard_coordinator
+from backend.utils import (
+    SHA256_PATTERN,
+    decode_cursor,
+    encode_cursor,
+    iter_lines,
+    to_db_time,
+    utcnow,
+    validate_url,
 )
-from backend.utils import clean_url
+
+logger = logging.getLogger(__name__)
+
+
+def check_content(domain: Domain, body: bytes) -> bool | None:
+    """Keyword / sha256 check of a (capped) body; None without a check."""
+    if not domain.expect_keyword and not domain.expect_hash:
+        return None
+    if domain.expect_keyword and domain.expect_keyword.encode() not in body:
+        return False
+    if domain.expect_hash and hashlib.sha256(body).hexdigest() != domain.expect_hash:
+        return False
+    return True
 
 
 async def get_service_status(
-    domain: Domain, http_session: ClientSession, db_session: AsyncSession
+    domain: Domain,
+    http_session: ClientSession,
+    validators: ResponseValidators = response_validators,
+    body_limit: int = settings.PROBE_BODY_LIMIT,
+    retries: int = settings.PROBE_RETRIES,
+    backoff: float = settings.PROBE_RETRY_BACKOFF,
+    max_backoff: float = settings.PROBE_RETRY_MAX_BACKOFF,
 ) -> Examination:
-    time_now = datetime.datetime.now(datetime.timezone.utc)
-    async with http_session.get(domain.domain) as response:
-        end_time = datetime.datetime.now(datetime.timezone.utc)
-        status_code = response.status
-        examination_time = datetime.datetime.now()
-        response_time = end_time - time_now
-        examination = Examination(
-            status_code=status_code,
+    """
+    Probe a domain with its probe method. HEAD reads no body (and falls
+    back to GET when the server does not support it, or when the domain
+    has a content check); GET and range requests read at most
+    `body_limit` bytes and close the connection rather than drain a bigger
+    body. GET and range requests are conditional on the validators of the
+    previous response.
+
+    A probe that gets no response is returned as an examination with
+    status 0 and its error_kind. Connection errors are retried up to
+    `retries` times, after a jittered `backoff` that doubles up to
+    `max_backoff`; only the last attempt is returned.
+    """
+    attempt = 0
+    while True:
+        examination = await _probe(domain, http_session, validators, body_limit)
+        if examination.error_kind not in RETRYABLE_ERRORS or attempt >= retries:
+            return examination
+        delay = min(backoff * 2**attempt, max_backoff)
+        await asyncio.sleep(random.uniform(delay / 2, delay))
+        attempt += 1
+
+
+probe_registry.register("http", get_service_status)
+
+
+async def probe_domain(domain: Domain, http_session: ClientSession) -> Examination:
+    """Probe a domain with the plugin registered for its probe type."""
+    probe = probe_registry.get(domain.probe_type)
+    return await probe(domain, http_session)
+
+
+async def _probe(
+    domain: Domain,
+    http_session: ClientSession,
+    validators: ResponseValidators,
+    body_limit: int,
+) -> Examination:
+    examination_time = utcnow()
+    timings = ProbeTimings(start=time.perf_counter_ns())
+    content_check = domain.expect_keyword or domain.expect_hash
+    head = domain.probe_method == "head" and not content_check
+    content_match = None
+    token = current_probe_timings.set(timings)
+    try:
+        if head:
+            async with http_session.head(
+                domain.domain, trace_request_ctx=timings
+            ) as response:
+                status_code = response.status
+                timings.end = time.perf_counter_ns()
+            head = status_code not in (405, 501)
+        if not head:
+            headers = validators.headers(domain.id)
+            if domain.probe_method == "range":
+                headers["Range"] = f"bytes=0-{body_limit - 1}"
+            async with http_session.get(
+                domain.domain, headers=headers, trace_request_ctx=timings
+            ) as response:
+                status_code = response.status
+                body, complete = await read_capped(response, body_limit)
+                timings.end = time.perf_counter_ns()
+                if not complete:
+                    response.close()
+            if status_code == 304:
+                content_match = validators.content_match(domain.id)
+            else:
+                content_match = check_content(domain, body)
+                if 200 <= status_code < 300:
+                    validators.update(domain.id, response.headers, content_match)
+    except Exception as exc:
+        error_kind = classify_probe_error(exc)
+        if error_kind is None:
+            raise
+        logger.debug("Probe of %s failed (%s): %r", domain.domain, error_kind, exc)
+        timings.end = time.perf_counter_ns()
+        return Examination(
+            status_code=0,
             examination_time=examination_time,
-            response_time=response_time,
             domain_id=domain.id,
+            error_kind=error_kind,
+            **timings.durations(),
+        )
+    finally:
+        current_probe_timings.reset(token)
+    return Examination(
+        status_code=status_code,
+        examination_time=examination_time,
+        domain_id=domain.id,
+        content_match=content_match,
+        **timings.durations(),
+    )
+
+
+class DomainStatusCache:
+    """
+    In-memory source of GET /domains. The domain list is reloaded from the
+    database after `ttl` seconds or an explicit invalidation (domain
+    writes); the latest examination of each domain is pushed in by the
+    probe pipeline, so polling the overview costs no query at all. A new
+    examination only replaces its domain's entry; the response is rendered
+    again (and gets a new version for the ETag of GET /domains) at most
+    every `min_render_interval` seconds, so that a busy probe pipeline does
+    not turn each poll into a full render. With sharded probing, where
+    other replicas probe most domains, run_reload_latest reads their
+    latest examinations in the background.
+    """
+
+    def __init__(self, ttl: float, min_render_interval: float = 1.0):
+        self.ttl = ttl
+        self.min_render_interval = min_render_interval
+        self._domains: list[Domain] | None = None
+        self._loaded_at = 0.0
+        self._latest: dict[int, dict] = {}
+        self._latest_loaded = False
+        self._statuses: list[DomainWithStatus] | None = None
+        self._positions: dict[int, int] = {}
+        self._rendered: bytes | None = None
+        self._rendered_at = -math.inf
+        self._dirty = False
+        self._version = 0
+
+    def invalidate(self) -> None:
+        self._domains = None
+        self._changed()
+
+    def clear(self) -> None:
+        self._latest.clear()
+        self._latest_loaded = False
+        self.invalidate()
+
+    def record(self, examination: Examination) -> None:
+        self._latest[examination.domain_id] = {
+            "status_code": examination.status_code,
+            "examination_time": examination.examination_time,
+            "response_time": examination.response_time,
+        }
+        self._update_status(examination.domain_id)
+
+    def forget(self, domain_id: int) -> None:
+        self._latest.pop(domain_id, None)
+        self.invalidate()
+
+    def latest(self, domain_id: int) -> dict | None:
+        return self._latest.get(domain_id)
+
+    async def load_latest(self, session: AsyncSession) -> None:
+        if not self._latest_loaded:
+            await self.reload_latest(session)
+            self._latest_loaded = True
+
+    async def reload_latest(self, session: AsyncSession) -> None:
+        for row in await get_latest_examinations_from_db(session=session):
+            domain_id = row.pop("domain_id")
+            known = self._latest.get(domain_id)
+            # one recorded here may not have been written yet
+            if known is None or known["examination_time"] < row["examination_time"]:
+                self._latest[domain_id] = row
+                self._update_status(domain_id)
+
+    async def run_reload_latest(self, session_factory) -> None:
+        """Reload the latest examinations every `ttl` seconds, until cancelled."""
+        while True:
+            await asyncio.sleep(self.ttl)
+            try:
+                async with session_factory() as session:
+                    await self.reload_latest(session)
+            except Exception:
+                logger.exception("Failed to reload the latest examinations")
+
+    def _changed(self) -> None:
+        self._statuses = None
+        self._rendered = None
+
+    def _status(self, domain: Domain) -> DomainWithStatus:
+        return DomainWithStatus.model_validate(
+            {**domain.model_dump(), **self._latest.get(domain.id, {})}
         )
-        await add_examination_to_database(session=db_session, examination=examination)
+
+    def _update_status(self, domain_id: int) -> None:
+        position = self._positions.get(domain_id)
+        if self._statuses is None or position is None:
+            return
+        self._statuses[position] = self._status(self._domains[position])
+        self._dirty = True
+
+    def _render_due(self) -> bool:
+        if self._rendered is None:
+            return True
+        return (
+            self._dirty
+            and time.monotonic() - self._rendered_at >= self.min_render_interval
+        )
+
+    def etag(self) -> str | None:
+        """Tag of what render() returns now; None if that needs a reload."""
+        expired = time.monotonic() - self._loaded_at > self.ttl
+        if (
+            self._domains is None
+            or expired
+            or not self._latest_loaded
+            or self._render_due()
+        ):
+            return None
+        return weak_etag("domains", self._version)
+
+    async def _refresh(self, session: AsyncSession) -> None:
+        await self.load_latest(session)
+        expired = time.monotonic() - self._loaded_at > self.ttl
+        if self._domains is None or expired:
+            domains = await get_all_domains_from_db(session=session)
+            self._domains = [
+                _domain_schema(domain).model_copy(update={"domain": domain.host})
+                for domain in domains
+            ]
+            self._loaded_at = time.monotonic()
+            self._changed()
+
+    async def statuses(self, session: AsyncSession) -> list[DomainWithStatus]:
+        await self._refresh(session)
+        if self._statuses is None:
+            self._statuses = [self._status(domain) for domain in self._domains]
+            self._positions = {
+                domain.id: position for position, domain in enumerate(self._domains)
+            }
+        return self._statuses
+
+    async def render(self, session: AsyncSession) -> bytes:
+        statuses = await self.statuses(session)
+        if self._render_due():
+            self._rendered = domains_with_status_adapter.dump_json(statuses)
+            self._rendered_at = time.monotonic()
+            self._dirty = False
+            self._version += 1
+        return self._rendered
+
+
+domain_status_cache = DomainStatusCache(
+    ttl=settings.DOMAINS_CACHE_TTL,
+    min_render_interval=settings.DOMAINS_MIN_RENDER_INTERVAL,
+)
+
+
+def _domain_schema(domain) -> Domain:
+    return Domain.model_validate(
+        {
+            "id": int(domain.id),
+            "domain": domain.domain,
+            "check_interval": domain.check_interval,
+            "probe_type": domain.probe_type,
+            "probe_method": domain.probe_method,
+            "expect_keyword": domain.expect_keyword,
+            "expect_hash": domain.expect_hash,
+        }
+    )
+
+
+PROBE_PHASES = {
+    "total": "response_time",
+    "dns": "dns_time",
+    "connect": "connect_time",
+    "tls": "tls_time",
+    "ttfb": "ttfb_time",
+    "body": "body_time",
+}
+
+
+def _record_probe_metrics(examination: Examination) -> None:
+    for phase, field in PROBE_PHASES.items():
+        duration = getattr(examination, field)
+        if duration is not None:
+            probe_phase_seconds.labels(phase=phase).observe(duration.total_seconds())
+    probes.labels(
+        status=examination.error_kind or f"{examination.status_code // 100}xx"
+    ).inc()
+
+
+async def _handle_examination(
+    examination: Examination, domain: str, writer: ExaminationWriter
+) -> None:
+    """Pass a new examination on to the writer, caches, stream and incidents."""
+    _record_probe_metrics(examination)
+    await writer.put(examination)
+    domain_status_cache.record(examination)
+    status_broadcaster.publish(examination)
+    incident_tracker.observe(examination, domain=domain)
+
+
+def _probe_with(https_session: ClientSession, writer: ExaminationWriter):
+    async def process(domain: Domain) -> Examination:
+        examination = await probe_domain(domain, https_session)
+        await _handle_examination(examination, domain.domain, writer)
         return examination
 
+    return process
 
-async def get_status_for_all_domains(https_session: ClientSession, db_session_factory):
+
+async def get_status_for_all_domains(
+    https_session: ClientSession,
+    db_session_factory,
+    scheduler: ProbeScheduler = probe_scheduler,
+    spread: float = 0.0,
+):
+    """Probe every domain once and wait until all results are written."""
     async with db_session_factory() as db_session:
         domains = await get_all_domains_from_db(session=db_session)
-    print(domains)
     if not domains:
         print("Domains database is empty")
         return
-    domain_schemas = [
-        Domain.model_validate({"id": int(domain.id), "domain": domain.domain})
-        for domain in domains
-    ]
+    domain_schemas = [_domain_schema(domain) for domain in domains]
+
+    writer = ExaminationWriter(session_factory=db_session_factory)
+    writer.start()
+    try:
+        await scheduler.run_cycle(
+            domain_schemas,
+            probe=_probe_with(https_session, writer),
+            spread=spread,
+        )
+    finally:
+        await writer.close()
+
+
+async def run_probe_scheduler(
+    https_session: ClientSession,
+    db_session_factory,
+    scheduler: ProbeScheduler = probe_scheduler,
+    writer: ExaminationWriter = examination_writer,
+):
+    """
+    Load the domain list once and probe each domain whenever it is due.
+    Later changes reach the scheduler through add_domain / delete_domain.
+    """
+    async with db_session_factory() as db_session:
+        domains = await get_all_domains_from_db(session=db_session)
+    for domain in domains:
+        scheduler.schedule(_domain_schema(domain))
+
+    await scheduler.run(probe=_probe_with(https_session, writer))
+
+
+async def sync_scheduler_with_shards(
+    scheduler: ProbeScheduler,
+    coordinator: ShardCoordinator,
+    db_session_factory,
+    tracker: IncidentTracker = incident_tracker,
+) -> None:
+    """
+    Make the scheduler hold exactly the domains of the shards this replica
+    owns. Also picks up domains added or removed through other replicas.
+    The health of domains changing hands is dropped by the old owner and
+    read from the open incidents by the new one.
+    """
+    async with db_session_factory() as db_session:
+        domains = await get_domains_in_shards_from_db(
+            shards=coordinator.owned,
+            shard_count=coordinator.shards,
+            session=db_session,
+        )
+    wanted = {domain.id: domain for domain in domains}
+    for domain_id in scheduler:
+        if domain_id not in wanted:
+            scheduler.unschedule(domain_id)
+            tracker.forget(domain_id)
+    adopted = [domain_id for domain_id in wanted if domain_id not in scheduler]
+    await tracker.adopt(adopted)
+    for domain_id in adopted:
+        scheduler.schedule(_domain_schema(wanted[domain_id]))
 
-    async def process(domain):
 
-        async with db_session_factory() as db_sess:
-            return await get_service_status(
-                domain=domain, http_session=https_session, db_session=db_sess
+async def run_sharded_probe_scheduler(
+    https_session: ClientSession,
+    db_session_factory,
+    coordinator: ShardCoordinator = shard_coordinator,
+    scheduler: ProbeScheduler = probe_scheduler,
+    writer: ExaminationWriter = examination_writer,
+):
+    """
+    Like run_probe_scheduler, but only for the domains in the shards this
+    replica holds a lease on. The schedule follows the shard assignment
+    after every lease heartbeat; leases are given back on shutdown.
+    """
+    probes = asyncio.create_task(
+        scheduler.run(probe=_probe_with(https_session, writer))
+    )
+    try:
+        await coordinator.run(
+            on_heartbeat=lambda: sync_scheduler_with_shards(
+                scheduler, coordinator, db_session_factory
             )
+        )
+    finally:
+        probes.cancel()
+        with suppress(asyncio.CancelledError):
+            await probes
+        await coordinator.release()
 
-    await asyncio.gather(*[process(domain=domain) for domain in domain_schemas])
 
+async def add_domain(
+    domain: str,
+    session: AsyncSession,
+    check_interval: int | None = None,
+    probe_method: str | None = None,
+    expect_keyword: str | None = None,
+    expect_hash: str | None = None,
+    probe_type: str | None = None,
+    scheduler: ProbeScheduler = probe_scheduler,
+    coordinator: ShardCoordinator = shard_coordinator,
+) -> Domain:
+    new_domain = await add_domain_to_database(
+        domain=domain,
+        session=session,
+        check_interval=check_interval or settings.PROBE_INTERVAL,
+        probe_type=probe_type,
+        probe_method=probe_method,
+        expect_keyword=expect_keyword,
+        expect_hash=expect_hash,
+    )
+    domain_schema = _domain_schema(new_domain)
+    # in another replica's shard, it is picked up on that replica's next
+    # lease heartbeat
+    if coordinator.owns(domain_schema.id):
+        scheduler.schedule(domain_schema)
+    domain_status_cache.invalidate()
+    return domain_schema
 
-async def add_domain(domain: str, session: AsyncSession) -> Domain:
-    new_domain = await add_domain_to_database(domain=domain, session=session)
-    return Domain.model_validate({"id": new_domain.id, "domain": new_domain.domain})
+
+async def delete_domain(
+    domain_id: int,
+    session: AsyncSession,
+    scheduler: ProbeScheduler = probe_scheduler,
+):
+    await delete_domain_from_database(domain_id=domain_id, session=session)
+    scheduler.unschedule(domain_id)
+    domain_status_cache.forget(domain_id)
+    examination_versions.forget(domain_id)
+    response_validators.forget(domain_id)
+    incident_tracker.forget(domain_id)
 
 
 async def get_domain_with_examinations(
-    domain: str, session: AsyncSession
-) -> DomainWithExaminations:
-    domain = await get_domain_and_examination_from_db(domain=domain, session=session)
-    domain_with_exams = DomainWithExaminations.model_validate(
-        {
-            "id": domain.id,
-            "domain": domain.domain,
-            "examinations": [
-                ExaminationDB.model_validate(
-                    (
-                        {
-                            "id": examination.id,
-                            "examination_time": examination.examination_time,
-                            "response_time": examination.response_time,
-                            "domain_id": examination.domain_id,
-                            "status_code": examination.status_code,
-                        }
-                    )
-                )
-                for examination in domain.examinations
-            ],
-        }
+    domain: str,
+    session: AsyncSession,
+    limit: int = 1000,
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+    cursor: str | None = None,
+    resolution: str = "auto",
+) -> ExaminationsPage | RollupsPage:
+    """
+    One page of a domain's history. With resolution="auto", long windows
+    are served from the coarsest-needed rollup table instead of raw rows.
+    """
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise InvalidCursorError
+    domain = await get_domain_by_name_from_db(domain=domain, session=session)
+    start = to_db_time(start) if start else None
+    end = to_db_time(end) if end else None
+    if resolution == "auto":
+        now = utcnow()
+        resolution = pick_resolution(
+            start=start,
+            end=end or now,
+            check_interval=domain.check_interval,
+            max_points=settings.ROLLUP_MAX_POINTS,
+            now=now,
+            retention=retention_policy(),
+        )
+
+    # one extra row tells whether there is a next page
+    if resolution == "raw":
+        rows = await get_examinations_page_from_db(
+            domain_id=domain.id,
+            session=session,
+            limit=limit + 1,
+            start=start,
+            end=end,
+            after=after,
+        )
+        time_key, rows_key = "examination_time", "examinations"
+    else:
+        rows = await get_rollups_page_from_db(
+            domain_id=domain.id,
+            resolution=resolution,
+            session=session,
+            limit=limit + 1,
+            start=start,
+            end=end,
+            after=after,
+        )
+        time_key, rows_key = "bucket_start", "rollups"
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][time_key], rows[-1]["id"])
+
+    return {
+        "id": domain.id,
+        "domain": domain.domain,
+        "resolution": resolution,
+        rows_key: rows,
+        "next_cursor": next_cursor,
+    }
+
+
+async def stream_domain_examinations(
+    domain: str,
+    session: AsyncSession,
+    file_format: Literal["json", "ndjson"] = "ndjson",
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+    batch_size: int = settings.EXPORT_BATCH_SIZE,
+):
+    """
+    The whole raw history of a domain (within from/to) as NDJSON, one
+    examination per line, or as a JSON document shaped like a history page
+    without a next cursor. The domain is looked up here, so a missing one
+    raises before anything is sent; rows are then read through a
+    server-side cursor and encoded one batch at a time, so memory does not
+    grow with the history.
+    """
+    domain = await get_domain_by_name_from_db(domain=domain, session=session)
+    rows = stream_examinations_from_db(
+        domain_id=domain.id,
+        session=session,
+        batch_size=batch_size,
+        start=to_db_time(start) if start else None,
+        end=to_db_time(end) if end else None,
     )
+    if file_format == "ndjson":
+        return _examinations_ndjson(rows)
+    return _examinations_json(domain, rows)
+
+
+async def _examinations_ndjson(rows):
+    async for batch in rows:
+        yield b"".join(examination_row_adapter.dump_json(row) + b"\n" for row in batch)
+
+
+async def _examinations_json(domain, rows):
+    head = json.dumps({"id": domain.id, "domain": domain.domain, "resolution": "raw"})
+    yield head[:-1].encode() + b', "examinations": ['
+    separator = b""
+    async for batch in rows:
+        if batch:
+            # the encoded list without its brackets
+            yield separator + examination_rows_adapter.dump_json(batch)[1:-1]
+            separator = b","
+    yield b'], "next_cursor": null}'
+
+
+async def get_stats(
+    session: AsyncSession,
+    domain: str | None = None,
+    domain_ids: list[int] | None = None,
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+    slo: float = settings.SLO_TARGET,
+) -> StatsReport:
+    """
+    Uptime and latency stats of one domain (by name), of `domain_ids`, or
+    of every domain, over [start, end) widened to whole rollup buckets.
+    Totals and percentiles come from grouped queries over the rollups, so
+    the cost depends on the number of buckets, not of examinations; the
+    outages (and MTTR) from the raw status changes, which are only kept for
+    RETENTION_RAW_DAYS.
+    """
+    now = utcnow()
+    end = to_db_time(end) if end else now
+    start = (
+        to_db_time(start)
+        if start
+        else end - datetime.timedelta(seconds=settings.STATS_DEFAULT_WINDOW)
+    )
+    if domain is not None:
+        domains = [await get_domain_by_name_from_db(domain=domain, session=session)]
+        domain_ids = [domains[0].id]
+    else:
+        domains = await get_all_domains_from_db(session=session)
+        if domain_ids is not None:
+            wanted = set(domain_ids)
+            domains = [row for row in domains if row.id in wanted]
+
+    resolution = stats_resolution(
+        start,
+        end,
+        now=now,
+        retention=retention_policy(),
+        max_buckets=settings.ROLLUP_MAX_POINTS,
+    )
+    start, end = align_window(start, end, resolution)
+    window = {"start": start, "end": end, "domain_ids": domain_ids}
+    totals = await get_rollup_totals_from_db(resolution, session=session, **window)
+    histograms = await get_rollup_histograms_from_db(
+        resolution, session=session, **window
+    )
+    changes = await get_status_changes_from_db(session=session, **window)
+
+    return {
+        "start": start,
+        "end": end,
+        "resolution": resolution,
+        "slo": slo,
+        "domains": [
+            domain_stats(
+                domain_id=row.id,
+                domain=row.host,
+                totals=totals.get(row.id),
+                histogram=histograms.get(row.id),
+                changes=changes.get(row.id),
+                slo=slo,
+            )
+            for row in domains
+        ],
+    }
+
+
+async def get_incidents(
+    session: AsyncSession,
+    limit: int = 100,
+    domain_id: int | None = None,
+    open_only: bool = False,
+) -> list[IncidentRow]:
+    return await get_incidents_from_db(
+        session=session, limit=limit, domain_id=domain_id, open_only=open_only
+    )
+
 
-    return domain_with_exams
+async def get_all_domains(session: AsyncSession) -> list[DomainWithStatus]:
+    return await domain_status_cache.statuses(session)
 
 
-async def get_all_domains(session: AsyncSession):
-    domains = await get_all_domains_from_db(session=session)
-    domain_schemas = [
-        Domain.model_validate(
-            {"id": int(domain.id), "domain": clean_url(domain.domain)}
+async def get_all_domains_json(session: AsyncSession) -> bytes:
+    return await domain_status_cache.render(session)
+
+
+async def search_domains(
+    query: str,
+    session: AsyncSession,
+    match: Literal["prefix", "substring"] = "prefix",
+    limit: int = 50,
+) -> bytes:
+    """Domains whose host matches `query`, with their latest status, as JSON."""
+    domains = await search_domains_in_db(
+        query, session=session, limit=limit, substring=match == "substring"
+    )
+    await domain_status_cache.load_latest(session)
+    statuses = [
+        DomainWithStatus.model_validate(
+            {
+                **_domain_schema(domain).model_dump(),
+                "domain": domain.host,
+                **(domain_status_cache.latest(domain.id) or {}),
+            }
         )
         for domain in domains
     ]
-    return domain_schemas
+    return domains_with_status_adapter.dump_json(statuses)
+
+
+IMPORT_COLUMNS = (
+    "domain",
+    "check_interval",
+    "probe_method",
+    "expect_keyword",
+    "expect_hash",
+    "probe_type",
+)
+PROBE_METHODS = ("get", "head", "range")
+
+
+class _LineFeed:
+    """
+    The lines handed to one csv.reader as they arrive; the reader stops
+    when they are used up and continues once more are added.
+    """
+
+    def __init__(self):
+        self.lines = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+async def _parse_import(chunks, file_format: str, max_length: int):
+    """
+    Yield (line number, fields or error) for each non-empty row of a CSV
+    or NDJSON upload. A CSV file may start with a header row containing
+    "domain" (other columns than IMPORT_COLUMNS are ignored, so exports
+    can be imported again); without one the columns are IMPORT_COLUMNS in
+    that order. A CSV row continues over the next lines while a quoted
+    field is open, and is numbered by its first line.
+    """
+    columns = None
+    feed = _LineFeed()
+    reader = csv.reader(feed)
+    row: list[str] = []
+    row_start = row_length = quotes = 0
+    line_number = 0
+    async for line, error in iter_lines(chunks, max_length):
+        line_number += 1
+        if error is not None:
+            # the rest of a row with an open quoted field is dropped with it
+            yield (row_start if row else line_number), error
+            row.clear()
+            row_length = quotes = 0
+            continue
+        if not row and not line.strip():
+            continue
+        if file_format == "ndjson":
+            try:
+                fields = json.loads(line)
+            except ValueError:
+                yield line_number, "Invalid JSON"
+                continue
+            if not isinstance(fields, dict):
+                yield line_number, "Expected a JSON object"
+                continue
+            yield line_number, fields
+            continue
+
+        if not row:
+            row_start = line_number
+        row.append(line + "\n")
+        row_length += len(line) + 1
+        quotes += line.count('"')
+        if row_length > max_length:
+            yield row_start, f"Row longer than {max_length} characters"
+        elif quotes % 2:
+            continue
+        else:
+            feed.lines.extend(row)
+        row.clear()
+        row_length = quotes = 0
+        try:
+            records = list(reader)
+        except csv.Error:
+            feed.lines.clear()
+            yield row_start, "Invalid CSV"
+            continue
+
+        for record in records:
+            values = [value.strip() for value in record]
+            if columns is None:
+                if "domain" in values:
+                    columns = values
+                    continue
+                columns = IMPORT_COLUMNS
+            if len(values) > len(columns):
+                yield row_start, "Too many columns"
+                continue
+            yield row_start, {
+                column: value
+                for column, value in zip(columns, values)
+                if value != "" and column in IMPORT_COLUMNS
+            }
+    if row:
+        yield row_start, "Unterminated quoted field"
+
+
+def _validate_import_row(fields: dict) -> tuple[dict | None, str | None]:
+    domain = fields.get("domain")
+    if not isinstance(domain, str) or not validate_url(domain):
+        return None, "Wrong URL"
+    try:
+        check_interval = int(fields.get("check_interval") or settings.PROBE_INTERVAL)
+    except (TypeError, ValueError):
+        return None, "check_interval must be an integer"
+    if not 10 <= check_interval <= 86400:
+        return None, "check_interval must be between 10 and 86400"
+    probe_method = fields.get("probe_method") or "get"
+    if probe_method not in PROBE_METHODS:
+        return None, "probe_method must be one of get, head, range"
+    expect_keyword = fields.get("expect_keyword") or None
+    if expect_keyword is not None and (
+        not isinstance(expect_keyword, str) or len(expect_keyword) > 200
+    ):
+        return None, "expect_keyword must be a string of at most 200 characters"
+    expect_hash = fields.get("expect_hash") or None
+    if expect_hash is not None and (
+        not isinstance(expect_hash, str) or not SHA256_PATTERN.match(expect_hash)
+    ):
+        return None, "expect_hash must be a hex sha256"
+    probe_type = fields.get("probe_type") or "http"
+    if probe_type not in probe_registry:
+        return None, "probe_type must be one of " + ", ".join(probe_registry)
+    return {
+        "domain": domain,
+        "check_interval": check_interval,
+        "probe_type": probe_type,
+        "probe_method": probe_method,
+        "expect_keyword": expect_keyword,
+        "expect_hash": expect_hash,
+    }, None
+
+
+async def import_domains(
+    chunks,
+    file_format: str,
+    session: AsyncSession,
+    chunk_size: int = settings.IMPORT_CHUNK_SIZE,
+    max_rows: int = settings.IMPORT_MAX_ROWS,
+    max_line_length: int = settings.IMPORT_MAX_LINE_LENGTH,
+    scheduler: ProbeScheduler = probe_scheduler,
+    coordinator: ShardCoordinator = shard_coordinator,
+) -> DomainImportReport:
+    """
+    Add domains from a streamed CSV / NDJSON upload. Valid rows are
+    inserted `chunk_size` at a time, existing domains are skipped by the
+    database; the report has one result per row.
+    """
+    results: list[DomainImportRow] = []
+    pending: list[tuple[DomainImportRow, dict]] = []
+    counts = {"created": 0, "exists": 0, "invalid": 0}
+
+    async def flush() -> None:
+        created = await add_domains_to_database(
+            [row for _, row in pending], session=session
+        )
+        for result, row in pending:
+            # pop: a domain listed twice is only created by its first row
+            domain_id = created.pop(row["domain"], None)
+            if domain_id is None:
+                result["status"] = "exists"
+            else:
+                result["status"] = "created"
+                result["id"] = domain_id
+                domain = Domain.model_validate({"id": domain_id, **row})
+                if coordinator.owns(domain_id):
+                    scheduler.schedule(domain)
+            counts[result["status"]] += 1
+        pending.clear()
+
+    async for line_number, fields in _parse_import(
+        chunks, file_format, max_line_length
+    ):
+        result: DomainImportRow = {
+            "line": line_number,
+            "domain": None,
+            "status": "invalid",
+            "id": None,
+            "error": None,
+        }
+        results.append(result)
+        if len(results) > max_rows:
+            result["error"] = f"Imports are limited to {max_rows} rows"
+            counts["invalid"] += 1
+            break
+        if isinstance(fields, str):
+            result["error"] = fields
+            counts["invalid"] += 1
+            continue
+        if isinstance(fields.get("domain"), str):
+            result["domain"] = fields["domain"]
+        row, error = _validate_import_row(fields)
+        if error is not None:
+            result["error"] = error
+            counts["invalid"] += 1
+            continue
+        pending.append((result, row))
+        if len(pending) >= chunk_size:
+            await flush()
+    if pending:
+        await flush()
+
+    if counts["created"]:
+        domain_status_cache.invalidate()
+    return {
+        "created": counts["created"],
+        "existing": counts["exists"],
+        "invalid": counts["invalid"],
+        "results": results,
+    }
+
+
+EXPORT_CSV_COLUMNS = (
+    "id",
+    "domain",
+    "check_interval",
+    "probe_type",
+    "probe_method",
+    "expect_keyword",
+    "expect_hash",
+    "status_code",
+    "examination_time",
+    "response_ms",
+)
+
+
+async def export_domains(
+    session: AsyncSession,
+    file_format: str,
+    batch_size: int = settings.EXPORT_BATCH_SIZE,
+):
+    """
+    Stream every domain with its latest status as NDJSON or CSV, one
+    chunk per batch of rows. The CSV columns are importable as they are.
+    """
+    await domain_status_cache.load_latest(session)
+    if file_format == "csv":
+        yield (",".join(EXPORT_CSV_COLUMNS) + "\n").encode()
+
+    async for domains in stream_domains_from_db(session, batch_size=batch_size):
+        rows: list[DomainExportRow] = []
+        for domain in domains:
+            latest = domain_status_cache.latest(domain.id) or {}
+            rows.append(
+                {
+                    "id": domain.id,
+                    "domain": domain.domain,
+                    "check_interval": domain.check_interval,
+                    "probe_type": domain.probe_type,
+                    "probe_method": domain.probe_method,
+                    "expect_keyword": domain.expect_keyword,
+                    "expect_hash": domain.expect_hash,
+                    "status_code": latest.get("status_code"),
+                    "examination_time": latest.get("examination_time"),
+                    "response_time": latest.get("response_time"),
+                }
+            )
+        if file_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer, lineterminator="\n")
+            for row in rows:
+                response_time = row["response_time"]
+                examination_time = row["examination_time"]
+                writer.writerow(
+                    [
+                        *(row[column] for column in EXPORT_CSV_COLUMNS[:8]),
+                        examination_time.isoformat() if examination_time else None,
+                        (
+                            response_time.total_seconds() * 1000
+                            if response_time is not None
+                            else None
+                        ),
+                    ]
+                )
+            yield buffer.getvalue().encode()
+        else:
+            yield b"".join(
+                domain_export_row_adapter.dump_json(row) + b"\n" for row in rows
+            )
@@ -0,0 +1,201 @@
+import asyncio
+import datetime
+import logging
+import math
+import os
+import socket
+import time
+from typing import Awaitable, Callable
+
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from backend.config.settings import settings
+from backend.db.database import async_session
+from backend.db.models import ProbeLease, ProbeWorker
+from backend.utils import utcnow
+
+logger = logging.getLogger(__name__)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class ShardCoordinator:
+    """
+    Splits the domain set between backend replicas. Domains are hashed
+    into `shards` shards by id; each shard has a lease row that one replica
+    holds at a time and renews every `renew_interval` seconds. Every
+    replica aims at an equal share of the shards: it gives shards back
+    when more replicas show up and takes over expired leases when one
+    stops renewing them. With `shards` set to 0 coordination is off and
+    this replica owns every domain.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        shards: int,
+        worker_id: str,
+        lease_ttl: float = 30.0,
+        renew_interval: float = 10.0,
+    ):
+        self.session_factory = session_factory
+        self.shards = shards
+        self.worker_id = worker_id
+        self.lease_ttl = lease_ttl
+        self.renew_interval = renew_interval
+        self.owned: set[int] = set()
+        self._renewed_at = -math.inf
+        self._shards_created = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.shards > 0
+
+    def shard_of(self, domain_id: int) -> int:
+        return domain_id % self.shards
+
+    def owns(self, domain_id: int) -> bool:
+        return not self.enabled or self.shard_of(domain_id) in self.owned
+
+    async def _create_shards(self, session) -> None:
+        existing = set(
+            (await session.execute(select(ProbeLease.shard))).scalars().all()
+        )
+        missing = [shard for shard in range(self.shards) if shard not in existing]
+        if not missing:
+            return
+        session.add_all(ProbeLease(shard=shard) for shard in missing)
+        try:
+            await session.commit()
+        except IntegrityError:
+            # another replica created them at the same time
+            await session.rollback()
+
+    async def heartbeat(self, now: datetime.datetime | None = None) -> set[int]:
+        """
+        Renew this replica's leases, give back or claim shards to get to
+        an equal share, and return the shards now owned.
+        """
+        started = time.monotonic()
+        now = now or utcnow()
+        expires_at = now + datetime.timedelta(seconds=self.lease_ttl)
+        stale = now - datetime.timedelta(seconds=self.lease_ttl)
+        mine = ProbeLease.owner == self.worker_id
+        in_range = ProbeLease.shard < self.shards
+
+        async with self.session_factory() as session:
+            if not self._shards_created:
+                await self._create_shards(session)
+                self._shards_created = True
+
+            beat = await session.execute(
+                update(ProbeWorker)
+                .where(ProbeWorker.id == self.worker_id)
+                .values(heartbeat_at=now)
+            )
+            if not beat.rowcount:
+                session.add(ProbeWorker(id=self.worker_id, heartbeat_at=now))
+            await session.execute(
+                delete(ProbeWorker).where(ProbeWorker.heartbeat_at < stale)
+            )
+            await session.execute(
+                update(ProbeLease).where(mine).values(expires_at=expires_at)
+            )
+
+            workers = (
+                await session.execute(select(func.count()).select_from(ProbeWorker))
+            ).scalar()
+            share = math.ceil(self.shards / max(workers, 1))
+            owned = set(
+                (await session.execute(select(ProbeLease.shard).where(mine, in_range)))
+                .scalars()
+                .all()
+            )
+
+            if len(owned) > share:
+                extra = sorted(owned)[share:]
+                await session.execute(
+                    update(ProbeLease)
+                    .where(mine, ProbeLease.shard.in_(extra))
+                    .values(owner=None, expires_at=None)
+                )
+                owned.difference_update(extra)
+            elif len(owned) < share:
+                claimable = or_(ProbeLease.owner.is_(None), ProbeLease.expires_at < now)
+                free = (
+                    await session.execute(
+                        select(ProbeLease.shard)
+                        .where(claimable, in_range)
+                        .order_by(ProbeLease.shard)
+                    )
+                ).scalars()
+                for shard in free.all():
+                    # compare-and-set: only one replica can win a free shard
+                    claimed = await session.execute(
+                        update(ProbeLease)
+                        .where(ProbeLease.shard == shard, claimable)
+                        .values(owner=self.worker_id, expires_at=expires_at)
+                    )
+                    if claimed.rowcount:
+                        owned.add(shard)
+                        if len(owned) >= share:
+                            break
+            await session.commit()
+
+        if owned != self.owned:
+            logger.info(
+                "Worker %s owns %d of %d shards (%d workers)",
+                self.worker_id,
+                len(owned),
+                self.shards,
+                workers,
+            )
+        self.owned = owned
+        self._renewed_at = started
+        return owned
+
+    async def release(self) -> None:
+        """Give all shards back so the other replicas take over right away."""
+        self.owned = set()
+        async with self.session_factory() as session:
+            await session.execute(
+                update(ProbeLease)
+                .where(ProbeLease.owner == self.worker_id)
+                .values(owner=None, expires_at=None)
+            )
+            await session.execute(
+                delete(ProbeWorker).where(ProbeWorker.id == self.worker_id)
+            )
+            await session.commit()
+
+    async def run(self, on_heartbeat: Callable[[], Awaitable[None]]) -> None:
+        """
+        Heartbeat until cancelled, calling `on_heartbeat` after each round.
+        If the leases cannot be renewed before they expire, the replica
+        stops owning them so it cannot probe alongside their new owner.
+        """
+        while True:
+            try:
+                await self.heartbeat()
+            except Exception:
+                logger.exception("Shard lease heartbeat failed")
+                if self.owned and time.monotonic() - self._renewed_at > self.lease_ttl:
+                    logger.warning("Shard leases expired, pausing probes")
+                    self.owned = set()
+            try:
+                await on_heartbeat()
+            except Exception:
+                logger.exception("Failed to apply shard assignment")
+            await asyncio.sleep(self.renew_interval)
+
+
+shard_coordinator = ShardCoordinator(
+    session_factory=async_session,
+    shards=settings.PROBE_SHARDS,
+    worker_id=settings.PROBE_WORKER_ID or default_worker_id(),
+    lease_ttl=settings.PROBE_LEASE_TTL,
+    renew_interval=settings.PROBE_LEASE_RENEW_INTERVAL,
+)
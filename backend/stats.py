@@ -0,0 +1,123 @@
+import datetime
+from typing import Iterable
+
+from backend.rollups import RESOLUTIONS, RollupBucket, bucket_start, retained
+from backend.schemas import DomainStats
+
+
+def stats_resolution(
+    start: datetime.datetime,
+    end: datetime.datetime,
+    now: datetime.datetime,
+    retention: dict[str, int],
+    max_buckets: int,
+) -> str:
+    """
+    The finest rollup that still reaches back to `start` (per its retention
+    in days, 0 meaning forever) and covers the window in at most
+    `max_buckets` buckets per domain.
+    """
+    span = (end - start).total_seconds()
+    for resolution, width in RESOLUTIONS.items():
+        fits = span / width.total_seconds() <= max_buckets
+        if fits and retained(resolution, start, now, retention):
+            return resolution
+    return "1d"
+
+
+def align_window(
+    start: datetime.datetime, end: datetime.datetime, resolution: str
+) -> tuple[datetime.datetime, datetime.datetime]:
+    """Widen [start, end) to whole buckets of `resolution`."""
+    aligned_end = bucket_start(end, resolution)
+    if aligned_end < end:
+        aligned_end += RESOLUTIONS[resolution]
+    return bucket_start(start, resolution), aligned_end
+
+
+def outages(
+    changes: Iterable[tuple[datetime.datetime, bool]],
+) -> tuple[int, list[datetime.timedelta]]:
+    """
+    From a domain's status changes, the number of outages and the
+    durations of those that recovered: from the first failing examination
+    to the first passing one after it. An outage already going on when the
+    window starts is counted from the window's first examination.
+    """
+    count = 0
+    durations = []
+    down_since = None
+    for time, down in changes:
+        if down and down_since is None:
+            count += 1
+            down_since = time
+        elif not down and down_since is not None:
+            durations.append(time - down_since)
+            down_since = None
+    return count, durations
+
+
+def domain_stats(
+    domain_id: int,
+    domain: str,
+    totals: dict | None,
+    histogram: dict[str, int] | None,
+    changes: list[tuple[datetime.datetime, bool]] | None,
+    slo: float,
+) -> DomainStats:
+    """
+    Availability, error budget and latency of one domain from its rollup
+    totals and merged histogram, and outages from its status changes.
+    `slo` is the availability objective in percent; an error budget burn
+    of 1.0 means the failures allowed by it are used up.
+    """
+    count = totals["count"] if totals else 0
+    errors = totals["error_count"] if totals else 0
+    outage_count, durations = outages(changes or [])
+    stats: DomainStats = {
+        "domain_id": domain_id,
+        "domain": domain,
+        "checks": count,
+        "failed_checks": errors,
+        "availability": None,
+        "error_budget_burn": None,
+        "outages": outage_count,
+        "mttr": (
+            sum(durations, datetime.timedelta()) / len(durations) if durations else None
+        ),
+        "avg_response_ms": None,
+        "min_response_ms": None,
+        "max_response_ms": None,
+        "p50_response_ms": None,
+        "p95_response_ms": None,
+        "p99_response_ms": None,
+    }
+    if not count:
+        return stats
+    stats.update(
+        availability=100 * (count - errors) / count,
+        error_budget_burn=errors / (count * (1 - slo / 100)),
+    )
+    # latency only of the checks that got a response
+    timed = totals["latency_count"]
+    if not timed:
+        return stats
+
+    bucket = RollupBucket(
+        count=count,
+        error_count=errors,
+        latency_count=timed,
+        min_response_ms=totals["min_response_ms"],
+        max_response_ms=totals["max_response_ms"],
+        sum_response_ms=totals["sum_response_ms"],
+        histogram=histogram or {},
+    )
+    stats.update(
+        avg_response_ms=bucket.sum_response_ms / timed,
+        min_response_ms=bucket.min_response_ms,
+        max_response_ms=bucket.max_response_ms,
+        p50_response_ms=bucket.percentile(0.50),
+        p95_response_ms=bucket.percentile(0.95),
+        p99_response_ms=bucket.percentile(0.99),
+    )
+    return stats
@@ -10,6 +10,8 @@ from sqlalchemy.pool import StaticPool
 from sqlalchemy import text
 from backend.db import get_db_connection
 from backend.db import Base, add_domain_to_database
+from backend.etags import examination_versions
+from backend.service import domain_status_cache
 
 
 client = TestClient(app)
@@ -69,6 +71,8 @@ async def db_session():
         await session.commit()
 
     await session.close()
+    domain_status_cache.clear()
+    examination_versions.clear()
 
 
 @pytest.fixture(scope="function")
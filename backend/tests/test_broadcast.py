@@ -0,0 +1,51 @@
+import datetime
+
+from backend.broadcast import StatusBroadcaster
+from backend.schemas import Examination
+
+
+def make_examination(domain_id: int) -> Examination:
+    return Examination(
+        status_code=200,
+        examination_time=datetime.datetime(2025, 1, 1),
+        response_time=datetime.timedelta(milliseconds=5),
+        domain_id=domain_id,
+    )
+
+
+async def test_publish_fans_out_to_subscribers():
+    broadcaster = StatusBroadcaster()
+    everything = broadcaster.subscribe()
+    only_two = broadcaster.subscribe(domain_id=2)
+
+    broadcaster.publish(make_examination(1))
+    broadcaster.publish(make_examination(2))
+
+    assert everything.queue.qsize() == 2
+    assert only_two.queue.qsize() == 1
+    message = only_two.queue.get_nowait()
+    assert message.startswith(b"event: examination\ndata: {")
+    assert b'"domain_id":2' in message
+
+
+async def test_slow_subscriber_is_dropped():
+    broadcaster = StatusBroadcaster(queue_size=2)
+    slow = broadcaster.subscribe()
+
+    for _ in range(3):
+        broadcaster.publish(make_examination(1))
+
+    assert slow.dropped
+    assert len(broadcaster) == 0
+
+
+async def test_stream_yields_events_and_unsubscribes():
+    broadcaster = StatusBroadcaster(heartbeat=0.01)
+    stream = broadcaster.stream()
+
+    assert await anext(stream) == b": keep-alive\n\n"
+    broadcaster.publish(make_examination(1))
+    assert (await anext(stream)).startswith(b"event: examination")
+
+    await stream.aclose()
+    assert len(broadcaster) == 0
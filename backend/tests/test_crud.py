@@ -4,7 +4,12 @@ from backend.db import (
     add_domain_to_database,
     get_all_domains_from_db,
     add_examination_to_database,
+    add_examinations_to_database,
+    add_domains_to_database,
     get_domain_and_examination_from_db,
+    get_domain_by_name_from_db,
+    get_latest_examinations_from_db,
+    search_domains_in_db,
 )
 from backend.schemas import Examination
 
@@ -34,3 +39,100 @@ async def test_add_examination(db_session, create_domain):
     )
     assert len(domain_with_examination.examinations) == 1
     assert domain_with_examination.examinations[0].domain_id == create_domain.id
+
+
+async def test_add_examinations_in_bulk(db_session, create_domain):
+    await add_examinations_to_database(
+        [
+            Examination(
+                status_code=status_code,
+                examination_time=datetime.datetime.now(),
+                response_time=datetime.timedelta(milliseconds=10),
+                domain_id=create_domain.id,
+            )
+            for status_code in (200, 500, 200)
+        ],
+        db_session,
+    )
+
+    domain_with_examination = await get_domain_and_examination_from_db(
+        domain="google.com", session=db_session
+    )
+    assert sorted(e.status_code for e in domain_with_examination.examinations) == [
+        200,
+        200,
+        500,
+    ]
+
+
+async def test_host_is_normalized_on_every_insert_path(db_session):
+    await add_domain_to_database("https://www.Google.com/", db_session)
+    await add_domains_to_database(
+        [{"domain": "http://example.org"}, {"domain": "https://www.Example.net/x/"}],
+        db_session,
+    )
+
+    hosts = sorted(domain.host for domain in await get_all_domains_from_db(db_session))
+    assert hosts == ["example.net/x", "example.org", "google.com"]
+
+    for spelling in ("google.com", "GOOGLE.com", "https://www.google.com/"):
+        domain = await get_domain_by_name_from_db(spelling, db_session)
+        assert domain.domain == "https://www.Google.com/"
+
+
+async def test_search_domains_by_prefix_and_substring(db_session):
+    await add_domains_to_database(
+        [
+            {"domain": f"https://www.{name}/"}
+            for name in ("shop.example.com", "shopify.com", "myshop.io", "sh_op.net")
+        ],
+        db_session,
+    )
+
+    prefix = await search_domains_in_db("https://SHOP", db_session, limit=10)
+    assert [domain.host for domain in prefix] == ["shop.example.com", "shopify.com"]
+
+    substring = await search_domains_in_db("shop", db_session, limit=10, substring=True)
+    assert [domain.host for domain in substring] == [
+        "myshop.io",
+        "shop.example.com",
+        "shopify.com",
+    ]
+
+    # LIKE wildcards in the query are matched literally
+    assert [
+        domain.host
+        for domain in await search_domains_in_db("h_o", db_session, 10, substring=True)
+    ] == ["sh_op.net"]
+    assert len(await search_domains_in_db("shop", db_session, limit=1)) == 1
+
+
+async def test_get_latest_examinations(db_session):
+    first = await add_domain_to_database("https://www.google.com/", db_session)
+    second = await add_domain_to_database("https://www.bing.com/", db_session)
+    await add_domain_to_database("https://www.yandex.ru/", db_session)
+    start = datetime.datetime(2025, 1, 1)
+    await add_examinations_to_database(
+        [
+            Examination(
+                status_code=status_code,
+                examination_time=start + datetime.timedelta(minutes=minute),
+                response_time=datetime.timedelta(milliseconds=10),
+                domain_id=domain.id,
+            )
+            # the newest of a domain is not always the last one inserted
+            for domain, minute, status_code in [
+                (first, 2, 503),
+                (first, 1, 200),
+                (second, 0, 200),
+            ]
+        ],
+        db_session,
+    )
+
+    latest = await get_latest_examinations_from_db(db_session)
+
+    assert sorted((row["domain_id"], row["status_code"]) for row in latest) == [
+        (first.id, 503),
+        (second.id, 200),
+    ]
@@ -1,5 +1,12 @@
+import datetime
+import json
+
 from .conftest import client
 from backend.db import add_domain_to_database
+from backend.etags import examination_versions
+from backend.schemas import Examination
+from backend.service import domain_status_cache
+from backend.utils import utcnow
 
 
 async def test_get_domains_empty(db_session):
@@ -50,6 +57,23 @@ async def test_get_domains_nonempty(db_session):
     assert body[0]["domain"] == "google.com"
 
 
+async def test_search_domains(db_session):
+    """
+    GET /domains/search → domains by host prefix or substring
+    """
+    for url in ("https://www.google.com/", "https://www.goodreads.com/", "bing.com"):
+        await add_domain_to_database(url, db_session)
+
+    res = client.get("/domains/search", params={"q": "goo"})
+    assert res.status_code == 200
+    assert [row["domain"] for row in res.json()] == ["goodreads.com", "google.com"]
+
+    res = client.get("/domains/search", params={"q": "ing", "match": "substring"})
+    assert [row["domain"] for row in res.json()] == ["bing.com"]
+
+    assert client.get("/domains/search", params={"q": ""}).status_code == 422
+
+
 async def test_get_examinations_not_found(db_session):
     """
     GET /examinations/{domain} → domain does not exist
@@ -90,3 +114,294 @@ async def test_get_examinations_success(db_session):
     assert body["domain"] == "https://www.google.com/" or "google.com"
     assert len(body["examinations"]) == 1
     assert body["examinations"][0]["status_code"] == 200
+
+
+async def test_post_domain_with_check_interval(db_session):
+    """
+    POST /add_domain → stores a per-domain check interval
+    """
+    res = client.post(
+        "/add_domain",
+        json={"domain": "https://www.google.com/", "check_interval": 60},
+    )
+
+    assert res.status_code == 201
+    assert res.json()["check_interval"] == 60
+
+
+async def test_delete_domain(db_session):
+    """
+    DELETE /domains/{id} → removes the domain
+    """
+    domain = await add_domain_to_database("https://www.google.com/", db_session)
+
+    res = client.delete(f"/domains/{domain.id}")
+    assert res.status_code == 204
+
+    res = client.delete(f"/domains/{domain.id}")
+    assert res.status_code == 404
+
+
+async def test_get_examinations_paginated(db_session):
+    """
+    GET /examinations/{domain}?limit= → keyset pages cover the history once
+    """
+    from backend.db import Examination as ExamModel
+    import datetime
+
+    domain = await add_domain_to_database("https://www.google.com/", db_session)
+    start = datetime.datetime(2025, 1, 1)
+    db_session.add_all(
+        ExamModel(
+            status_code=200,
+            examination_time=start + datetime.timedelta(minutes=i),
+            response_time=datetime.timedelta(milliseconds=10),
+            domain_id=domain.id,
+        )
+        for i in range(5)
+    )
+    await db_session.commit()
+
+    seen = []
+    cursor = None
+    for _ in range(3):
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        body = client.get("/examinations/google.com", params=params).json()
+        seen += [exam["examination_time"] for exam in body["examinations"]]
+        cursor = body["next_cursor"]
+
+    assert cursor is None
+    assert len(seen) == 5
+    assert seen == sorted(seen)
+    assert body["examinations"][0]["response_time"] == "PT0.01S"
+
+
+async def test_get_examinations_time_window(db_session):
+    """
+    GET /examinations/{domain}?from=&to= → only rows inside the window
+    """
+    from backend.db import Examination as ExamModel
+    import datetime
+
+    domain = await add_domain_to_database("https://www.google.com/", db_session)
+    # recent enough for the raw rows to be within retention
+    start = utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start -= datetime.timedelta(days=1)
+    db_session.add_all(
+        ExamModel(
+            status_code=200,
+            examination_time=start + datetime.timedelta(hours=i),
+            response_time=datetime.timedelta(milliseconds=10),
+            domain_id=domain.id,
+        )
+        for i in range(5)
+    )
+    await db_session.commit()
+
+    res = client.get(
+        "/examinations/google.com",
+        params={
+            "from": (start + datetime.timedelta(hours=1)).isoformat(),
+            "to": (start + datetime.timedelta(hours=3)).isoformat(),
+        },
+    )
+
+    assert res.status_code == 200
+    assert len(res.json()["examinations"]) == 2
+
+    res = client.get("/examinations/google.com", params={"cursor": "garbage"})
+    assert res.status_code == 400
+
+
+async def test_export_examinations(db_session):
+    """
+    GET /examinations/{domain}/export → the whole history, streamed
+    """
+    from backend.db import Examination as ExamModel
+    import datetime
+
+    domain = await add_domain_to_database("https://www.google.com/", db_session)
+    start = datetime.datetime(2025, 1, 1)
+    db_session.add_all(
+        ExamModel(
+            status_code=200 if i % 2 else 503,
+            examination_time=start + datetime.timedelta(hours=i),
+            response_time=datetime.timedelta(milliseconds=10),
+            domain_id=domain.id,
+        )
+        for i in range(5)
+    )
+    await db_session.commit()
+
+    res = client.get("/examinations/google.com/export")
+    assert res.status_code == 200
+    assert res.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in res.text.splitlines()]
+    assert [line["status_code"] for line in lines] == [503, 200, 503, 200, 503]
+
+    res = client.get(
+        "/examinations/google.com/export",
+        params={"format": "json", "from": "2025-01-01T01:00:00"},
+    )
+    body = res.json()
+    assert body["id"] == domain.id
+    assert body["next_cursor"] is None
+    assert len(body["examinations"]) == 4
+
+    res = client.get("/examinations/missing.com/export")
+    assert res.status_code == 404
+
+
+async def test_import_domains_csv(db_session):
+    await add_domain_to_database("https://www.google.com/", db_session)
+    upload = (
+        "domain,check_interval,probe_method\n"
+        "https://www.google.com/,60,get\n"
+        "https://www.example.com/,120,head\n"
+        "not a url,60,get\n"
+        "https://www.example.com/,60,get\n"
+        "https://www.python.org/,5,get\n"
+    )
+
+    res = client.post(
+        "/domains/import", content=upload, headers={"Content-Type": "text/csv"}
+    )
+
+    assert res.status_code == 200
+    body = res.json()
+    assert (body["created"], body["existing"], body["invalid"]) == (1, 2, 2)
+    assert [row["status"] for row in body["results"]] == [
+        "exists",
+        "created",
+        "invalid",
+        "exists",
+        "invalid",
+    ]
+    assert body["results"][1]["line"] == 3
+    assert body["results"][4]["error"].startswith("check_interval")
+
+
+async def test_import_domains_csv_rows(db_session):
+    upload = (
+        b'https://www.example.com/,60,get,"multi\nline keyword"\n'
+        b"https://www.\xff.com/,60\n"
+        + b"https://www.python.org/"
+        + b"a" * 70_000
+        + b",60\n"
+        b"https://www.google.com/,60\n"
+        b'https://www.github.com/,60,get,"open\n'
+    )
+
+    res = client.post("/domains/import?format=csv", content=upload)
+
+    assert res.status_code == 200
+    results = res.json()["results"]
+    assert [(row["line"], row["status"], row["error"]) for row in results] == [
+        (1, "created", None),
+        (3, "invalid", "Invalid UTF-8"),
+        (4, "invalid", "Line longer than 65536 bytes"),
+        (5, "created", None),
+        (6, "invalid", "Unterminated quoted field"),
+    ]
+    domains = client.get("/domains").json()
+    assert domains[0]["expect_keyword"] == "multi\nline keyword"
+
+
+async def test_import_domains_ndjson(db_session):
+    upload = (
+        '{"domain": "https://www.example.com/", "expect_keyword": "Example"}\n'
+        "{broken\n"
+    )
+
+    res = client.post("/domains/import?format=ndjson", content=upload)
+
+    body = res.json()
+    assert body["created"] == 1
+    assert body["results"][1]["error"] == "Invalid JSON"
+
+
+async def test_export_domains(db_session):
+    client.post(
+        "/domains/import?format=csv",
+        content="https://www.example.com/,60\nhttps://www.google.com/,120\n",
+    )
+
+    ndjson = client.get("/domains/export")
+    csv_export = client.get("/domains/export?format=csv")
+
+    rows = [json.loads(line) for line in ndjson.text.splitlines()]
+    assert [row["domain"] for row in rows] == [
+        "https://www.example.com/",
+        "https://www.google.com/",
+    ]
+    assert rows[1]["check_interval"] == 120
+    assert rows[0]["status_code"] is None
+    lines = csv_export.text.splitlines()
+    assert lines[0].startswith("id,domain,check_interval")
+    assert len(lines) == 3
+
+    # an export can be imported again
+    reimport = client.post("/domains/import?format=csv", content=csv_export.text)
+    assert reimport.json()["existing"] == 2
+
+
+async def test_get_domains_etag(db_session, monkeypatch):
+    """
+    GET /domains → 304 for the current ETag, until a probe result comes in
+    and the render interval is over
+    """
+    monkeypatch.setattr(domain_status_cache, "min_render_interval", 60)
+    domain = await add_domain_to_database("https://www.google.com/", db_session)
+    res = client.get("/domains")
+    etag = res.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    res = client.get("/domains", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.content == b""
+    assert res.headers["ETag"] == etag
+
+    domain_status_cache.record(
+        Examination(
+            status_code=503,
+            examination_time=utcnow(),
+            response_time=datetime.timedelta(milliseconds=10),
+            domain_id=domain.id,
+        )
+    )
+    res = client.get("/domains", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+
+    monkeypatch.setattr(domain_status_cache, "min_render_interval", 0)
+    res = client.get("/domains", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.json()[0]["status_code"] == 503
+    assert res.headers["ETag"] != etag
+
+
+async def test_get_examinations_etag(db_session):
+    """
+    GET /examinations/{domain} → 304 until examinations of the domain are written
+    """
+    domain = await add_domain_to_database("https://www.google.com/", db_session)
+    other = await add_domain_to_database("https://www.example.com/", db_session)
+    etag = client.get("/examinations/google.com").headers["ETag"]
+
+    res = client.get("/examinations/google.com", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    examination_versions.touch([other.id])
+    res = client.get("/examinations/google.com", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+
+    examination_versions.touch([domain.id])
+    res = client.get("/examinations/google.com", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.headers["ETag"] != etag
+
+    # a deleted domain is looked up again (and not found)
+    etag = res.headers["ETag"]
+    client.delete(f"/domains/{domain.id}")
+    res = client.get("/examinations/google.com", headers={"If-None-Match": etag})
+    assert res.status_code == 404
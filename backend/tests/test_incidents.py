@@ -0,0 +1,193 @@
+import asyncio
+import datetime
+
+from aiohttp import web
+
+from backend.alerts import AlertDispatcher, WebhookSink
+from backend.db import add_domain_to_database
+from backend.incidents import DomainHealth, HealthPolicy, IncidentTracker
+from backend.schemas import Examination
+from .conftest import async_session_test, client
+
+START = datetime.datetime(2025, 1, 1)
+
+
+def make_examination(domain_id, minute, status_code):
+    return Examination(
+        status_code=status_code,
+        examination_time=START + datetime.timedelta(minutes=minute),
+        response_time=datetime.timedelta(milliseconds=10),
+        domain_id=domain_id,
+    )
+
+
+class RecordingSink:
+    name = "recording"
+
+    def __init__(self):
+        self.digests = []
+
+    async def send(self, digest):
+        self.digests.append(digest)
+
+
+def test_health_policy_needs_n_of_m_failures():
+    policy = HealthPolicy(window=5, down_after=3, recover_after=2)
+    health = DomainHealth()
+    failures = [True, False, True] + [False] * 5 + [True, True, True]
+    states = [policy.update(health, failed) for failed in failures]
+
+    # two failures in the window: degraded only, until they slide out of it
+    assert states[:8] == ["degraded"] * 7 + ["up"]
+    assert states[8:] == ["degraded", "degraded", "down"]
+
+    states = [policy.update(health, failed) for failed in (False, True, False, False)]
+    # a failure in between restarts the recovery count
+    assert states == ["down", "down", "down", "up"]
+    assert health.failures == 0
+
+
+async def test_tracker_persists_incidents(db_session):
+    domain = await add_domain_to_database("https://www.google.com/", db_session)
+    dispatcher = AlertDispatcher(sinks=[])
+    tracker = IncidentTracker(
+        session_factory=async_session_test,
+        dispatcher=dispatcher,
+        policy=HealthPolicy(window=3, down_after=2, recover_after=1),
+    )
+    await tracker.start()
+    events = [
+        tracker.observe(make_examination(domain.id, minute, status), "google.com")
+        for minute, status in enumerate([200, 503, 503, 503, 200])
+    ]
+    await tracker.close()
+
+    opened, resolved = [event for event in events if event]
+    assert opened["event"] == "opened"
+    assert opened["started_at"] == START + datetime.timedelta(minutes=2)
+    assert resolved["event"] == "resolved"
+    assert resolved["resolved_at"] == START + datetime.timedelta(minutes=4)
+    assert opened["incident_id"] == resolved["incident_id"] is not None
+    assert dispatcher.pending == 2
+
+    (incident,) = client.get("/incidents").json()
+    assert incident["domain"] == "google.com"
+    assert incident["status_code"] == 503
+    assert incident["resolved_at"] == "2025-01-01T00:04:00"
+    assert client.get("/incidents", params={"open": True}).json() == []
+
+
+async def test_tracker_resumes_open_incidents(db_session):
+    domain = await add_domain_to_database("https://www.google.com/", db_session)
+    policy = HealthPolicy(window=2, down_after=2, recover_after=1)
+    tracker = IncidentTracker(async_session_test, AlertDispatcher(sinks=[]), policy)
+    await tracker.start()
+    for minute in range(2):
+        tracker.observe(make_examination(domain.id, minute, 500), "google.com")
+    await tracker.close()
+
+    # after a restart the outage goes on instead of opening a second incident
+    restarted = IncidentTracker(async_session_test, AlertDispatcher(sinks=[]), policy)
+    await restarted.start()
+    assert restarted.state(domain.id) == "down"
+    assert restarted.observe(make_examination(domain.id, 2, 500), "google.com") is None
+    event = restarted.observe(make_examination(domain.id, 3, 200), "google.com")
+    await restarted.close()
+
+    assert event["started_at"] == START + datetime.timedelta(minutes=1)
+    (incident,) = client.get("/incidents").json()
+    assert incident["id"] == event["incident_id"]
+    assert incident["resolved_at"] is not None
+
+
+async def test_tracker_does_not_open_incident_twice(db_session):
+    """An outage already open (e.g. from another replica) is continued."""
+    domain = await add_domain_to_database("https://www.google.com/", db_session)
+    policy = HealthPolicy(window=2, down_after=2, recover_after=1)
+    trackers = [
+        IncidentTracker(async_session_test, AlertDispatcher(sinks=[]), policy)
+        for _ in range(2)
+    ]
+    for tracker in trackers:
+        await tracker.start()
+    events = []
+    for tracker in trackers:
+        for minute in range(2):
+            events.append(
+                tracker.observe(make_examination(domain.id, minute, 500), "google.com")
+            )
+        await tracker.close()
+
+    first, second = [event for event in events if event]
+    assert first["incident_id"] == second["incident_id"] is not None
+    assert len(client.get("/incidents").json()) == 1
+
+
+async def test_dispatcher_sends_digests_at_a_limited_rate():
+    sink = RecordingSink()
+    dispatcher = AlertDispatcher(sinks=[sink], delay=0.05, min_interval=0.3)
+    dispatcher.start()
+    event = {
+        "event": "opened",
+        "incident_id": None,
+        "domain": "example.com",
+        "started_at": START,
+        "resolved_at": None,
+        "status_code": 503,
+    }
+
+    for domain_id in range(5000):
+        dispatcher.publish([{**event, "domain_id": domain_id}])
+    await asyncio.sleep(0.15)
+    assert len(sink.digests) == 1
+    assert sink.digests[0]["opened"] == 5000
+
+    # held back until min_interval has passed, then merged into one digest
+    dispatcher.publish([{**event, "domain_id": 1, "event": "resolved"}])
+    dispatcher.publish([{**event, "domain_id": 2, "event": "resolved"}])
+    await asyncio.sleep(0.1)
+    assert len(sink.digests) == 1
+    await asyncio.sleep(0.3)
+    assert len(sink.digests) == 2
+    assert sink.digests[1]["resolved"] == 2
+
+    dispatcher.publish([{**event, "domain_id": 3}])
+    await dispatcher.close()
+    assert len(sink.digests) == 3
+
+
+async def test_webhook_sink_posts_the_digest():
+    received = []
+
+    async def hook(request):
+        received.append(await request.json())
+        return web.Response(status=204)
+
+    app = web.Application()
+    app.router.add_post("/hook", hook)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    sink = WebhookSink(f"http://127.0.0.1:{port}/hook")
+    dispatcher = AlertDispatcher(sinks=[sink])
+    dispatcher.publish(
+        [
+            {
+                "event": "opened",
+                "incident_id": 7,
+                "domain_id": 1,
+                "domain": "example.com",
+                "started_at": START,
+                "resolved_at": None,
+                "status_code": 503,
+            }
+        ]
+    )
+    await dispatcher.close()
+    await runner.cleanup()
+
+    assert received[0]["opened"] == 1
+    assert received[0]["events"][0]["incident_id"] == 7
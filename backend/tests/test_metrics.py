@@ -0,0 +1,47 @@
+from backend.metrics import Registry
+
+from .conftest import client
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 2):
+        histogram.observe(value)
+
+    lines = registry.render().decode().splitlines()
+
+    assert 'latency_seconds_bucket{le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{le="1"} 3' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in lines
+    assert "latency_seconds_count 4" in lines
+    assert "latency_seconds_sum 2.65" in lines
+
+
+def test_labelled_counter_and_gauge():
+    registry = Registry()
+    counter = registry.counter("probes", "Probes.", labelnames=("status",))
+    registry.gauge("in_flight", "In flight.", function=lambda: 3)
+    counter.labels(status="2xx").inc()
+    counter.labels(status="2xx").inc()
+    counter.labels(status="5xx").inc()
+
+    lines = registry.render().decode().splitlines()
+
+    assert 'probes_total{status="2xx"} 2' in lines
+    assert 'probes_total{status="5xx"} 1' in lines
+    assert "in_flight 3" in lines
+
+
+def test_metrics_endpoint_reports_route_latency(db_session):
+    client.get("/domains")
+    client.get("/examinations/unknown.com")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'route="/domains",status="200"' in response.text
+    assert 'route="/examinations/{domain}",status="404"' in response.text
+    assert "servicemonitor_db_query_seconds_count" in response.text
+    assert "servicemonitor_probes_per_second " in response.text
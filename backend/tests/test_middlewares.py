@@ -0,0 +1,156 @@
+import json
+import logging
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from starlette.middleware.gzip import IdentityResponder
+
+from backend.logs import configure_logging
+from backend.middlewares import (
+    CompressionMiddleware,
+    RequestLoggingMiddleware,
+    accepted_encodings,
+)
+
+logger = logging.getLogger("tests.requests")
+
+
+def make_client(sample_rates=None) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/ok")
+    async def ok():
+        return {"ok": True}
+
+    @app.get("/noisy/ok")
+    async def noisy():
+        return {"ok": True}
+
+    @app.get("/noisy/fail")
+    async def fail():
+        raise RuntimeError("boom")
+
+    app.add_middleware(
+        RequestLoggingMiddleware, logger=logger, sample_rates=sample_rates
+    )
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def test_logs_one_structured_record(caplog):
+    client = make_client()
+    with caplog.at_level(logging.INFO, logger=logger.name):
+        client.get("/ok")
+
+    (record,) = [r for r in caplog.records if r.name == logger.name]
+    assert record.method == "GET"
+    assert record.path == "/ok"
+    assert record.status_code == 200
+    assert record.duration_ms >= 0
+    assert record.getMessage().startswith("GET /ok 200 ")
+
+
+def test_log_file_has_request_fields(tmp_path):
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    listener = configure_logging(str(tmp_path / "app.log"), logging.INFO)
+    try:
+        make_client().get("/ok")
+    finally:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+        root.handlers[:] = handlers
+        root.setLevel(level)
+
+    lines = (tmp_path / "app.log").read_text().splitlines()
+    (entry,) = [e for e in map(json.loads, lines) if e["logger"] == logger.name]
+    assert entry["level"] == "INFO"
+    assert entry["message"].startswith("GET /ok 200 ")
+    assert (entry["method"], entry["path"], entry["status_code"]) == (
+        "GET",
+        "/ok",
+        200,
+    )
+    assert entry["duration_ms"] >= 0
+    assert entry["client_ip"] == "testclient"
+
+
+def test_sampled_routes(caplog):
+    client = make_client(sample_rates={"/noisy": 0.0})
+    with caplog.at_level(logging.INFO, logger=logger.name):
+        client.get("/noisy/ok")
+        client.get("/ok")
+        client.get("/noisy/fail")
+
+    # sampled out, logged, and errors are always logged
+    records = [r for r in caplog.records if r.name == logger.name]
+    assert [(r.path, r.status_code) for r in records] == [
+        ("/ok", 200),
+        ("/noisy/fail", 500),
+    ]
+
+
+def test_accepted_encodings():
+    assert accepted_encodings("gzip, deflate, br") == {"gzip", "deflate", "br"}
+    assert accepted_encodings("br;q=0, gzip;q=0.5") == {"gzip"}
+    assert accepted_encodings("") == {""}
+
+
+def test_compresses_large_responses():
+    app = FastAPI()
+
+    @app.get("/big")
+    async def big():
+        return {"rows": ["x" * 10] * 500}
+
+    @app.get("/small")
+    async def small():
+        return {"ok": True}
+
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    client = TestClient(app)
+
+    res = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["Content-Encoding"] == "gzip"
+    assert res.headers["Vary"] == "Accept-Encoding"
+    assert int(res.headers["Content-Length"]) < 1024
+    assert len(res.json()["rows"]) == 500
+
+    res = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in res.headers
+    res = client.get("/big", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in res.headers
+
+
+def test_starlette_compression_hook():
+    """
+    BrotliResponder relies on starlette's responders calling
+    apply_compression for every body chunk; fail loudly if that changes.
+    """
+    calls = []
+
+    class TaggingResponder(IdentityResponder):
+        content_encoding = "tagged"
+
+        def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+            calls.append((body, more_body))
+            return b"<" + body + b">"
+
+    chunks = [b"a" * 600, b"b" * 600]
+
+    async def app(scope, receive, send):
+        async def body():
+            for chunk in chunks:
+                yield chunk
+
+        response = StreamingResponse(body(), media_type="text/plain")
+        await response(scope, receive, send)
+
+    async def tagged(scope, receive, send):
+        await TaggingResponder(app, minimum_size=500)(scope, receive, send)
+
+    res = TestClient(tagged).get("/")
+    assert res.headers["Content-Encoding"] == "tagged"
+    assert res.content == b"<" + chunks[0] + b"><" + chunks[1] + b"><>"
+    assert calls == [(chunks[0], True), (chunks[1], True), (b"", False)]
@@ -0,0 +1,65 @@
+import datetime
+
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from backend.db import Base, add_examination_to_database, get_all_domains_from_db
+from backend.db.migrations import upgrade_schema
+from backend.schemas import Examination
+
+# the tables as the first release created them
+OLD_SCHEMA = [
+    "CREATE TABLE domains (id INTEGER PRIMARY KEY, domain VARCHAR(60) UNIQUE)",
+    "CREATE TABLE examinations (id INTEGER PRIMARY KEY, status_code INTEGER, "
+    "examination_time DATETIME, response_time DATETIME, "
+    "domain_id INTEGER NOT NULL REFERENCES domains (id))",
+    "INSERT INTO domains (id, domain) VALUES (1, 'https://www.Example.com/')",
+    "INSERT INTO examinations VALUES "
+    "(1, 200, '2025-01-01 00:00:00.000000', '1970-01-01 00:00:00.010000', 1)",
+]
+
+
+async def test_upgrade_schema_adds_columns_to_old_tables(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/old.db")
+    async with engine.begin() as connection:
+        for statement in OLD_SCHEMA:
+            await connection.execute(text(statement))
+
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        upgraded = await connection.run_sync(upgrade_schema)
+        indexes = await connection.run_sync(
+            lambda sync: {
+                index["name"] for index in inspect(sync).get_indexes("domains")
+            }
+        )
+    # a second start finds nothing left to do
+    async with engine.begin() as connection:
+        assert await connection.run_sync(upgrade_schema) == {}
+
+    assert {"host", "check_interval", "probe_type"} <= set(upgraded["domains"])
+    assert {"dns_time", "error_kind", "cert_expires_at"} <= set(
+        upgraded["examinations"]
+    )
+    assert "ix_domains_host" in indexes
+
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_factory() as session:
+        (domain,) = await get_all_domains_from_db(session=session)
+        assert domain.host == "example.com"
+        assert domain.check_interval == 300
+        assert domain.probe_type == "http"
+        assert domain.probe_method == "get"
+        await add_examination_to_database(
+            Examination(
+                status_code=200,
+                examination_time=datetime.datetime(2025, 1, 1, 0, 5),
+                response_time=datetime.timedelta(milliseconds=10),
+                error_kind=None,
+                domain_id=domain.id,
+            ),
+            session=session,
+        )
+        rows = await session.execute(text("SELECT COUNT(*) FROM examinations"))
+        assert rows.scalar() == 2
+    await engine.dispose()
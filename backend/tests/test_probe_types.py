@@ -0,0 +1,81 @@
+import asyncio
+import datetime
+import socket
+import ssl
+
+import pytest
+
+from backend.benchmarks.origin import make_certificate
+from backend.probe_types import dns_probe, probe_registry, tcp_probe, tls_probe
+from backend.schemas import Domain
+from backend.service import probe_domain
+from backend.utils import utcnow
+
+
+async def start_server(ssl_context=None):
+    async def handle(reader, writer):
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0, ssl=ssl_context)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_registry_knows_every_probe_type():
+    assert set(probe_registry) == {"http", "tcp", "dns", "tls"}
+    with pytest.raises(ValueError):
+        probe_registry.get("icmp")
+
+
+async def test_tcp_probe():
+    server, port = await start_server()
+    async with server:
+        domain = Domain(id=1, domain=f"http://127.0.0.1:{port}/", probe_type="tcp")
+        examination = await probe_domain(domain, http_session=None)
+    assert examination.status_code == 200
+    assert examination.error_kind is None
+    assert examination.connect_time is not None
+    assert examination.tls_time is None
+
+    closed = Domain(id=1, domain=f"http://127.0.0.1:{free_port()}/")
+    examination = await tcp_probe(closed)
+    assert examination.status_code == 0
+    assert examination.error_kind == "connect"
+
+
+async def test_dns_probe():
+    examination = await dns_probe(Domain(id=1, domain="http://localhost/"))
+    assert examination.status_code == 200
+    assert examination.dns_time is not None
+
+    examination = await dns_probe(Domain(id=1, domain="https://www.missing.invalid/"))
+    assert examination.status_code == 0
+    assert examination.error_kind == "dns"
+
+
+async def test_tls_probe_reads_certificate_expiry(tmp_path):
+    certfile, keyfile = make_certificate(str(tmp_path))
+    server_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    server_context.load_cert_chain(certfile, keyfile)
+    trusting = ssl.create_default_context(cafile=certfile)
+
+    server, port = await start_server(server_context)
+    async with server:
+        domain = Domain(id=1, domain=f"https://127.0.0.1:{port}/")
+        examination = await tls_probe(domain, context=trusting)
+        # a self-signed certificate nobody trusts fails the handshake
+        untrusted = await tls_probe(domain, context=ssl.create_default_context())
+
+    assert examination.status_code == 200
+    assert examination.connect_time is not None
+    assert examination.tls_time is not None
+    expires_in = examination.cert_expires_at - utcnow()
+    assert datetime.timedelta(hours=23) < expires_in <= datetime.timedelta(days=1)
+    assert untrusted.status_code == 0
+    assert untrusted.error_kind == "tls"
+    assert untrusted.cert_expires_at is None
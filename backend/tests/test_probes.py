@@ -0,0 +1,243 @@
+import asyncio
+import socket
+import time
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from backend.probes import (
+    RETRYABLE_ERRORS,
+    ProbeEngine,
+    ResponseValidators,
+    TimedTCPConnector,
+    interval_keepalive_timeout,
+    probe_engine,
+)
+from backend.config.settings import settings
+from backend.schemas import Domain
+from backend.service import get_service_status
+
+
+@pytest.fixture
+async def origin():
+    """Local HTTP server recording the client port of every request."""
+    peers = []
+
+    async def ok(request):
+        peers.append(request.transport.get_extra_info("peername")[1])
+        return web.Response(text="ok")
+
+    async def hang(request):
+        await asyncio.sleep(0.5)
+        return web.Response(text="late")
+
+    async def big(request):
+        peers.append(request.transport.get_extra_info("peername")[1])
+        return web.Response(body=b"welcome" + b"x" * 1_000_000)
+
+    async def cached(request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.Response(text="welcome", headers={"ETag": '"v1"'})
+
+    app = web.Application()
+    app.router.add_get("/", ok)
+    app.router.add_get("/hang", hang)
+    app.router.add_get("/big", big)
+    app.router.add_get("/cached", cached)
+    app.router.add_get("/no-head", ok, allow_head=False)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}", peers
+    await runner.cleanup()
+
+
+def make_engine(**overrides) -> ProbeEngine:
+    options = dict(
+        limit=10,
+        limit_per_host=2,
+        dns_ttl=300,
+        keepalive_timeout=60,
+        connect_timeout=1,
+        read_timeout=1,
+        total_timeout=2,
+    )
+    options.update(overrides)
+    return ProbeEngine(**options)
+
+
+async def test_engine_reuses_connections(origin):
+    url, peers = origin
+    async with make_engine() as engine:
+        for _ in range(3):
+            async with engine.session.get(url + "/") as response:
+                await response.read()
+
+    assert len(peers) == 3
+    assert len(set(peers)) == 1
+
+
+async def test_engine_times_out_hanging_origin(origin):
+    url, _ = origin
+    async with make_engine(read_timeout=0.1) as engine:
+        with pytest.raises(asyncio.TimeoutError):
+            async with engine.session.get(url + "/hang"):
+                pass
+
+
+def test_keepalive_outlasts_probe_interval():
+    assert interval_keepalive_timeout(300, 0.1) == pytest.approx(330)
+    assert interval_keepalive_timeout(300, 0.1, max_factor=4) == pytest.approx(1320)
+    # by default a host's connection is still open for its next probe
+    assert probe_engine.keepalive_timeout >= settings.PROBE_INTERVAL * (
+        1 + settings.PROBE_JITTER
+    )
+
+
+async def test_engine_requires_start():
+    engine = make_engine()
+    with pytest.raises(RuntimeError):
+        engine.session
+
+
+async def test_split_tls_timing_only_on_known_aiohttp(monkeypatch, caplog):
+    connector = TimedTCPConnector()
+    assert connector.split_tls_timing
+    await connector.close()
+
+    # an unknown release is connected by aiohttp itself, timed as one step
+    monkeypatch.setattr(aiohttp, "__version__", "4.0.0")
+    connector = TimedTCPConnector()
+    assert not connector.split_tls_timing
+    assert "aiohttp 4.0.0 is not known" in caplog.text
+    await connector.close()
+
+
+async def test_probe_records_phase_timings(origin):
+    url, _ = origin
+    domain = Domain(id=1, domain=url.replace("127.0.0.1", "localhost") + "/")
+    async with make_engine() as engine:
+        first = await get_service_status(domain=domain, http_session=engine.session)
+        second = await get_service_status(domain=domain, http_session=engine.session)
+
+    assert first.status_code == 200
+    assert first.examination_time.tzinfo is None
+    assert first.dns_time is not None
+    assert first.connect_time is not None
+    assert first.tls_time is None  # plain HTTP
+    assert first.ttfb_time is not None and first.body_time is not None
+    assert first.response_time >= first.ttfb_time + first.body_time
+
+    # DNS is cached and the connection is reused
+    assert second.dns_time is None
+    assert second.connect_time is None
+
+
+async def test_capped_get_closes_connection_on_big_body(origin):
+    url, peers = origin
+    domain = Domain(id=1, domain=url + "/big", expect_keyword="welcome")
+    async with make_engine() as engine:
+        first = await get_service_status(
+            domain=domain, http_session=engine.session, body_limit=1024
+        )
+        await get_service_status(
+            domain=domain, http_session=engine.session, body_limit=1024
+        )
+
+    assert first.status_code == 200
+    assert first.content_match is True
+    # the rest of the body was not drained, so the connection was dropped
+    assert len(set(peers)) == 2
+
+
+async def test_conditional_probe_gets_not_modified(origin):
+    url, _ = origin
+    validators = ResponseValidators()
+    domain = Domain(id=1, domain=url + "/cached", expect_keyword="welcome")
+    async with make_engine() as engine:
+        first = await get_service_status(
+            domain=domain, http_session=engine.session, validators=validators
+        )
+        second = await get_service_status(
+            domain=domain, http_session=engine.session, validators=validators
+        )
+
+    assert first.status_code == 200
+    assert second.status_code == 304
+    assert second.content_match is True
+
+
+async def test_head_probe_falls_back_to_get(origin):
+    url, _ = origin
+    async with make_engine() as engine:
+        head = await get_service_status(
+            domain=Domain(id=1, domain=url + "/", probe_method="head"),
+            http_session=engine.session,
+        )
+        fallback = await get_service_status(
+            domain=Domain(id=2, domain=url + "/no-head", probe_method="head"),
+            http_session=engine.session,
+        )
+
+    assert head.status_code == 200
+    assert fallback.status_code == 200
+
+
+async def test_probe_errors_become_examinations(origin):
+    url, _ = origin
+    # a port nothing listens on
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        closed_port = sock.getsockname()[1]
+    cases = {
+        "timeout": url + "/hang",
+        "connect": f"http://127.0.0.1:{closed_port}/",
+        "tls": url.replace("http://", "https://") + "/",
+        "dns": "http://servicemonitor.invalid/",
+    }
+
+    async with make_engine(read_timeout=0.1) as engine:
+        for kind, domain_url in cases.items():
+            examination = await get_service_status(
+                domain=Domain(id=1, domain=domain_url),
+                http_session=engine.session,
+                retries=0,
+            )
+            assert examination.error_kind == kind, domain_url
+            assert examination.status_code == 0
+            assert examination.response_time is not None
+
+
+async def test_dropped_connections_are_retried_with_backoff():
+    connections = 0
+
+    async def drop(reader, writer):
+        nonlocal connections
+        connections += 1
+        writer.close()
+
+    server = await asyncio.start_server(drop, "127.0.0.1", 0)
+    domain = Domain(
+        id=1, domain=f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/"
+    )
+    async with make_engine() as engine:
+        # aiohttp itself may reconnect once on a dropped idempotent request
+        await get_service_status(domain, engine.session, retries=0)
+        per_attempt, connections = connections, 0
+
+        started = time.monotonic()
+        examination = await get_service_status(
+            domain, engine.session, retries=2, backoff=0.1, max_backoff=0.1
+        )
+        elapsed = time.monotonic() - started
+    server.close()
+    await server.wait_closed()
+
+    assert examination.error_kind in RETRYABLE_ERRORS
+    assert connections == 3 * per_attempt
+    # two capped, jittered waits of 0.05-0.1s
+    assert 0.1 <= elapsed < 1
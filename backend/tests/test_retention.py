@@ -0,0 +1,149 @@
+import datetime
+
+import pytest
+from sqlalchemy import text
+
+from backend.db import Examination as ExamModel, ExaminationRollup
+from backend import retention
+from backend.config.settings import settings
+from backend.retention import apply_retention, delete_in_batches, ensure_partitions
+from .conftest import async_session_test
+
+NOW = datetime.datetime(2025, 6, 1)
+
+
+def make_examination(domain_id, days_ago):
+    return ExamModel(
+        status_code=200,
+        examination_time=NOW - datetime.timedelta(days=days_ago),
+        response_time=datetime.timedelta(milliseconds=10),
+        domain_id=domain_id,
+    )
+
+
+def make_rollup(domain_id, resolution, days_ago):
+    return ExaminationRollup(
+        domain_id=domain_id,
+        resolution=resolution,
+        bucket_start=NOW - datetime.timedelta(days=days_ago),
+        count=1,
+        error_count=0,
+        min_response_ms=10,
+        max_response_ms=10,
+        sum_response_ms=10,
+        p50_response_ms=10,
+        p95_response_ms=10,
+        p99_response_ms=10,
+        histogram={"25": 1},
+    )
+
+
+@pytest.fixture
+def policy(monkeypatch):
+    """Retention is off by default; these tests configure every tier."""
+    monkeypatch.setattr(settings, "RETENTION_RAW_DAYS", 30)
+    monkeypatch.setattr(settings, "RETENTION_1M_DAYS", 14)
+    monkeypatch.setattr(settings, "RETENTION_1H_DAYS", 400)
+    monkeypatch.setattr(settings, "RETENTION_1D_DAYS", 0)
+
+
+async def count(db_session, table):
+    return (await db_session.execute(text(f"SELECT COUNT(*) FROM {table}"))).scalar()
+
+
+async def test_delete_in_batches(db_session, create_domain):
+    db_session.add_all(make_examination(create_domain.id, 100) for _ in range(7))
+    await db_session.commit()
+
+    deleted = await delete_in_batches(
+        async_session_test,
+        ExamModel,
+        ExamModel.examination_time < NOW,
+        batch_size=3,
+        pause=0,
+    )
+
+    assert deleted == 7
+    assert await count(db_session, "examinations") == 0
+
+
+async def test_retention_keeps_everything_by_default(db_session, create_domain):
+    db_session.add_all(
+        [
+            make_examination(create_domain.id, 3000),
+            make_rollup(create_domain.id, "1m", 3000),
+        ]
+    )
+    await db_session.commit()
+
+    report = await apply_retention(async_session_test, now=NOW)
+
+    assert report.rows == {}
+    assert await count(db_session, "examinations") == 1
+    assert await count(db_session, "examination_rollups") == 1
+
+
+async def test_apply_retention(db_session, create_domain, policy):
+    db_session.add_all(
+        [
+            make_examination(create_domain.id, 1),
+            make_examination(create_domain.id, 60),
+            make_rollup(create_domain.id, "1m", 1),
+            make_rollup(create_domain.id, "1m", 60),
+            make_rollup(create_domain.id, "1h", 60),
+            make_rollup(create_domain.id, "1d", 3000),
+        ]
+    )
+    await db_session.commit()
+
+    report = await apply_retention(async_session_test, now=NOW)
+
+    assert report.rows == {"raw": 1, "1m": 1, "1h": 0}
+    assert await count(db_session, "examinations") == 1
+    # 1h rollups are kept for longer, 1d ones forever
+    assert await count(db_session, "examination_rollups") == 3
+
+
+class FailingSession:
+    """Fails the CREATE of the second partition, as when rows for that day
+    already sit in the default partition."""
+
+    def __init__(self):
+        self.statements = []
+        self.rollbacks = 0
+
+    async def execute(self, statement):
+        self.statements.append(str(statement))
+        if len(self.statements) == 2:
+            raise RuntimeError("updated partition constraint would be violated")
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+
+async def test_ensure_partitions_goes_on_after_a_failed_day():
+    session = FailingSession()
+
+    failed = await ensure_partitions(session, "examinations", days_ahead=3)
+
+    assert failed == 1
+    assert session.rollbacks == 1
+    assert len(session.statements) == 4
+
+
+async def test_retention_deletes_when_partitioning_fails(
+    db_session, create_domain, monkeypatch, policy
+):
+    async def broken(session_factory):
+        raise RuntimeError("no partitions today")
+
+    monkeypatch.setattr(retention, "prepare_partitions", broken)
+    db_session.add(make_examination(create_domain.id, 60))
+    await db_session.commit()
+
+    report = await apply_retention(async_session_test, now=NOW)
+
+    assert report.rows["raw"] == 1
@@ -0,0 +1,144 @@
+import datetime
+
+from sqlalchemy import select
+
+from backend.config.settings import settings
+from backend.db import ExaminationRollup, update_rollups_in_database
+from backend.rollups import RollupBucket, aggregate_examinations, pick_resolution
+from backend.schemas import Examination
+from .conftest import client
+
+
+def make_examination(domain_id, minute, status_code=200, ms=100):
+    return Examination(
+        status_code=status_code,
+        examination_time=datetime.datetime(2025, 1, 1, 12, minute, 30),
+        response_time=datetime.timedelta(milliseconds=ms),
+        domain_id=domain_id,
+    )
+
+
+def test_bucket_percentiles():
+    bucket = RollupBucket()
+    for ms in range(1, 101):
+        bucket.add(200, ms)
+    bucket.add(500, 1000)
+
+    assert bucket.count == 101
+    assert bucket.error_count == 1
+    assert bucket.min_response_ms == 1
+    assert bucket.max_response_ms == 1000
+    # histogram bins are ~10% wide
+    assert 45 <= bucket.percentile(0.50) <= 56
+    assert 90 <= bucket.percentile(0.95) <= 106
+    assert bucket.percentile(1.0) == 1000
+
+
+def test_failed_probes_are_left_out_of_latency():
+    bucket = RollupBucket()
+    bucket.add(200, 100)
+    # a timeout: no response, 30s spent waiting for one
+    bucket.add(0, 30_000)
+
+    assert bucket.count == 2
+    assert bucket.error_count == 1
+    assert bucket.latency_count == 1
+    assert bucket.max_response_ms == 100
+    assert bucket.percentile(0.99) == 100
+
+
+def test_aggregate_examinations():
+    buckets = aggregate_examinations(
+        [make_examination(1, 0), make_examination(1, 1), make_examination(2, 0)]
+    )
+
+    hour = datetime.datetime(2025, 1, 1, 12)
+    assert buckets[("1m", 1, hour)].count == 1
+    assert buckets[("1h", 1, hour)].count == 2
+    assert buckets[("1d", 1, datetime.datetime(2025, 1, 1))].count == 2
+    assert buckets[("1h", 2, hour)].count == 1
+
+
+def test_pick_resolution():
+    now = datetime.datetime(2025, 4, 1)
+
+    assert pick_resolution(None, now, 300, 2500) == "raw"
+    day = now - datetime.timedelta(days=1)
+    assert pick_resolution(day, now, 300, 2500) == "raw"
+    quarter = now - datetime.timedelta(days=90)
+    assert pick_resolution(quarter, now, 300, 2500) == "1h"
+    decade = now - datetime.timedelta(days=3650)
+    assert pick_resolution(decade, now, 300, 2500) == "1d"
+
+    # raw rows and 1m rollups of two months ago are deleted already
+    retention = {"raw": 30, "1m": 14, "1h": 400, "1d": 0}
+    old_day = now - datetime.timedelta(days=60)
+    end = old_day + datetime.timedelta(hours=1)
+    assert pick_resolution(old_day, end, 300, 2500) == "raw"
+    assert pick_resolution(old_day, end, 300, 2500, now, retention) == "1h"
+
+
+async def test_rollups_update_incrementally(db_session, create_domain):
+    await update_rollups_in_database(
+        [make_examination(create_domain.id, 0, ms=100)], db_session
+    )
+    await update_rollups_in_database(
+        [make_examination(create_domain.id, 5, status_code=503, ms=300)],
+        db_session,
+    )
+
+    result = await db_session.execute(
+        select(ExaminationRollup).where(ExaminationRollup.resolution == "1h")
+    )
+    (rollup,) = result.scalars().all()
+    assert rollup.count == 2
+    assert rollup.error_count == 1
+    assert rollup.min_response_ms == 100
+    assert rollup.max_response_ms == 300
+
+    await update_rollups_in_database(
+        [make_examination(create_domain.id, 7, status_code=0, ms=10_000)],
+        db_session,
+    )
+    await db_session.refresh(rollup)
+    assert (rollup.count, rollup.error_count, rollup.latency_count) == (3, 2, 2)
+    assert rollup.max_response_ms == 300
+
+
+async def test_rollups_of_failed_probes_only(db_session, create_domain):
+    await update_rollups_in_database(
+        [make_examination(create_domain.id, minute, 0, 5000) for minute in range(2)],
+        db_session,
+    )
+
+    res = client.get(
+        "/examinations/google.com",
+        params={"from": "2024-10-01T00:00:00", "to": "2025-01-01T23:00:00"},
+    )
+    (rollup,) = res.json()["rollups"]
+    assert rollup["count"] == rollup["error_count"] == 2
+    assert rollup["avg_response_ms"] is None
+    assert rollup["p99_response_ms"] is None
+
+
+async def test_examinations_endpoint_uses_rollups(
+    db_session, create_domain, monkeypatch
+):
+    # keep the 2025 rollups within retention, whenever the test runs
+    monkeypatch.setattr(settings, "RETENTION_1H_DAYS", 0)
+    await update_rollups_in_database(
+        [make_examination(create_domain.id, minute) for minute in range(3)],
+        db_session,
+    )
+
+    res = client.get(
+        "/examinations/google.com",
+        params={"from": "2024-10-01T00:00:00", "to": "2025-01-01T23:00:00"},
+    )
+
+    assert res.status_code == 200
+    body = res.json()
+    assert body["resolution"] == "1h"
+    assert len(body["rollups"]) == 1
+    assert body["rollups"][0]["count"] == 3
+    assert body["rollups"][0]["avg_response_ms"] == 100
@@ -0,0 +1,252 @@
+import asyncio
+import datetime
+import time
+
+from backend.scheduler import (
+    AdaptiveIntervals,
+    ProbeRateMeter,
+    ProbeScheduler,
+    ScheduledProbe,
+)
+from backend.schemas import Domain, Examination
+
+
+async def test_run_cycle_respects_global_limit():
+    """At most `concurrency` probes run at the same time."""
+    scheduler = ProbeScheduler(concurrency=3, per_host_limit=10)
+    running = 0
+    peak = 0
+
+    async def probe(domain):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return domain.id
+
+    domains = [Domain(id=i, domain=f"https://www.site{i}.com/") for i in range(10)]
+    results = await scheduler.run_cycle(domains, probe=probe)
+
+    assert sorted(results) == list(range(10))
+    assert peak == 3
+    assert scheduler.meter.total == 10
+
+
+async def test_run_cycle_respects_per_host_limit():
+    """Probes against the same host are capped separately."""
+    scheduler = ProbeScheduler(concurrency=10, per_host_limit=1)
+    running = 0
+    peak = 0
+
+    async def probe(domain):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    domains = [Domain(id=i, domain=f"https://www.same.com/{i}") for i in range(4)]
+    await scheduler.run_cycle(domains, probe=probe)
+
+    assert peak == 1
+    assert scheduler.limiter._hosts == {}
+
+
+async def test_run_cycle_spreads_start_times():
+    """Start times are spaced over the spread window."""
+    scheduler = ProbeScheduler(concurrency=10, per_host_limit=10)
+    started = []
+
+    async def probe(domain):
+        started.append(time.monotonic())
+
+    domains = [Domain(id=i, domain=f"https://www.site{i}.com/") for i in range(4)]
+    await scheduler.run_cycle(domains, probe=probe, spread=0.2)
+
+    assert started[-1] - started[0] >= 0.14
+
+
+async def test_slow_host_does_not_hold_global_slots():
+    """Probes queued behind one host's limit leave the global slots to others."""
+    scheduler = ProbeScheduler(concurrency=2, per_host_limit=1)
+    started = {}
+
+    async def probe(domain):
+        started[domain.id] = time.monotonic()
+        if "slow" in domain.domain:
+            await asyncio.sleep(0.1)
+
+    domains = [Domain(id=i, domain=f"https://www.slow.com/{i}") for i in range(4)]
+    domains.append(Domain(id=9, domain="https://www.fast.com/"))
+    begin = time.monotonic()
+    await scheduler.run_cycle(domains, probe=probe)
+
+    assert started[9] - begin < 0.05
+
+
+async def test_run_skips_domain_still_in_flight():
+    """A domain is not probed again while its previous probe is running."""
+    scheduler = ProbeScheduler(concurrency=10, per_host_limit=10, jitter=0)
+    running = 0
+    peak = 0
+    probed = 0
+
+    async def probe(domain):
+        nonlocal running, peak, probed
+        running += 1
+        probed += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.1)
+        running -= 1
+
+    # due every 10ms, but each probe takes 100ms
+    scheduler.schedule(
+        Domain(id=1, domain="https://www.a.com/", check_interval=1), delay=0
+    )
+    scheduler._entries[1].interval = 0.01
+    runner = asyncio.create_task(scheduler.run(probe=probe))
+    await asyncio.sleep(0.25)
+    runner.cancel()
+
+    assert peak == 1
+    assert 2 <= probed <= 3
+
+
+def test_rate_meter():
+    meter = ProbeRateMeter(window=10)
+    for _ in range(20):
+        meter.mark()
+
+    assert meter.rate() == 2.0
+
+
+async def test_run_probes_domains_when_due():
+    """The heap loop only probes a domain once its due time has passed."""
+    scheduler = ProbeScheduler(concurrency=10, per_host_limit=10, jitter=0)
+    probed = []
+
+    async def probe(domain):
+        probed.append(domain.id)
+
+    scheduler.schedule(
+        Domain(id=1, domain="https://www.a.com/", check_interval=60), delay=30
+    )
+    scheduler.schedule(
+        Domain(id=2, domain="https://www.b.com/", check_interval=60), delay=0
+    )
+    runner = asyncio.create_task(scheduler.run(probe=probe))
+    await asyncio.sleep(0.05)
+
+    assert probed == [2]
+
+    # a newly added domain wakes the loop up immediately
+    scheduler.schedule(
+        Domain(id=3, domain="https://www.c.com/", check_interval=60), delay=0
+    )
+    await asyncio.sleep(0.05)
+    runner.cancel()
+
+    assert probed == [2, 3]
+
+
+async def test_unschedule_drops_pending_probe():
+    scheduler = ProbeScheduler(concurrency=10, per_host_limit=10)
+    probed = []
+
+    async def probe(domain):
+        probed.append(domain.id)
+
+    scheduler.schedule(Domain(id=1, domain="https://www.a.com/"), delay=0.02)
+    scheduler.unschedule(1)
+    runner = asyncio.create_task(scheduler.run(probe=probe))
+    await asyncio.sleep(0.05)
+    runner.cancel()
+
+    assert probed == []
+    assert 1 not in scheduler
+
+
+def make_entry(interval: float = 60) -> ScheduledProbe:
+    return ScheduledProbe(
+        domain=Domain(id=1, domain="https://www.a.com/"),
+        interval=interval,
+        due=0,
+        seq=0,
+        base_interval=interval,
+    )
+
+
+def test_adaptive_backs_off_healthy_domain_up_to_cap():
+    adaptive = AdaptiveIntervals(backoff=2, max_factor=4, stable_after=2)
+    entry = make_entry()
+    intervals = []
+    for _ in range(6):
+        entry.interval = adaptive.next_interval(entry, 200, 0.1)
+        intervals.append(entry.interval)
+
+    assert intervals == [60, 60, 120, 240, 240, 240]
+
+
+def test_adaptive_rechecks_on_error_and_status_change():
+    adaptive = AdaptiveIntervals(stable_after=1, recheck_factor=0.25)
+    entry = make_entry()
+    intervals = []
+    for status_code in (200, 200, 500, 500, 200, 200, 200):
+        entry.interval = adaptive.next_interval(entry, status_code, 0.1)
+        intervals.append(entry.interval)
+
+    # a recovery is a changed status code, so it is re-confirmed quickly too
+    assert intervals == [60, 90, 15, 15, 15, 60, 90]
+
+
+def test_adaptive_rechecks_on_latency_jump():
+    adaptive = AdaptiveIntervals(stable_after=0, recheck_factor=0.5)
+    entry = make_entry()
+    for _ in range(3):
+        adaptive.next_interval(entry, 200, 0.1)
+
+    assert adaptive.next_interval(entry, 200, 1.0) == 30
+    # small absolute changes are noise, not a jump
+    assert adaptive.next_interval(entry, 200, 0.15) != 30
+
+
+async def test_run_applies_adaptive_interval():
+    adaptive = AdaptiveIntervals(min_interval=0, recheck_factor=0.01)
+    scheduler = ProbeScheduler(
+        concurrency=10, per_host_limit=10, jitter=0, adaptive=adaptive
+    )
+    probed = []
+
+    async def probe(domain):
+        probed.append(domain.id)
+        return Examination(
+            status_code=503,
+            examination_time=datetime.datetime.now(),
+            response_time=datetime.timedelta(milliseconds=5),
+            domain_id=domain.id,
+        )
+
+    scheduler.schedule(
+        Domain(id=1, domain="https://www.a.com/", check_interval=5), delay=0
+    )
+    runner = asyncio.create_task(scheduler.run(probe=probe))
+    await asyncio.sleep(0.2)
+    runner.cancel()
+
+    # errors are re-checked every 0.05s instead of every 5s
+    assert len(probed) >= 3
+
+
+async def test_run_cycle_isolates_failing_probes():
+    scheduler = ProbeScheduler(concurrency=3, per_host_limit=10)
+
+    async def probe(domain):
+        if domain.id == 2:
+            raise RuntimeError("broken probe")
+        return domain.id
+
+    domains = [Domain(id=i, domain=f"https://www.site{i}.com/") for i in range(5)]
+    results = await scheduler.run_cycle(domains, probe=probe)
+
+    assert sorted(results) == [0, 1, 3, 4]
@@ -1,15 +1,21 @@
 import datetime
+import hashlib
+import json
 
 from backend.service import (
+    DomainStatusCache,
     add_domain,
+    domain_status_cache,
     get_all_domains,
+    get_all_domains_json,
     get_domain_with_examinations,
     get_service_status,
     get_status_for_all_domains,
+    stream_domain_examinations,
 )
 from backend.db import Domain as DomainModel
-from backend.db import add_domain_to_database
-from backend.schemas import Domain
+from backend.db import add_domain_to_database, add_examinations_to_database
+from backend.schemas import Domain, Examination
 from backend.utils import FakeAiohttpSession
 from sqlalchemy import text
 from .conftest import async_session_test
@@ -61,9 +67,10 @@ async def test_get_domain_with_examinations(db_session):
     # Service call
     result = await get_domain_with_examinations("google.com", db_session)
 
-    assert result.id == domain.id
-    assert len(result.examinations) == 1
-    assert result.examinations[0].status_code == 200
+    assert result["id"] == domain.id
+    assert len(result["examinations"]) == 1
+    assert result["examinations"][0]["status_code"] == 200
+    assert result["next_cursor"] is None
 
 
 async def test_get_service_status(db_session):
@@ -72,17 +79,14 @@ async def test_get_service_status(db_session):
     fake_session = FakeAiohttpSession(status=200)
     domain = Domain(id=1, domain="https://example.com/")
 
-    result = await get_service_status(
-        domain=domain,
-        http_session=fake_session,
-        db_session=db_session,
-    )
+    result = await get_service_status(domain=domain, http_session=fake_session)
 
     assert result.status_code == 200
+    assert result.domain_id == 1
 
-    # Make sure DB insert happened
+    # Writing is left to the examination writer
     rows = await db_session.execute(text("SELECT COUNT(*) FROM examinations"))
-    assert rows.scalar() == 1
+    assert rows.scalar() == 0
 
 
 async def test_get_status_for_all_domains(db_session):
@@ -104,3 +108,184 @@ async def test_get_status_for_all_domains(db_session):
     count = rows.scalar()
 
     assert count == 2
+
+
+async def test_domain_list_is_cached(db_session):
+    """GET /domains data is served from memory until a domain write."""
+    await add_domain_to_database("https://www.google.com/", db_session)
+    assert len(await get_all_domains(db_session)) == 1
+
+    # written behind the cache's back: not visible yet
+    await add_domain_to_database("https://www.yandex.ru/", db_session)
+    assert len(await get_all_domains(db_session)) == 1
+
+    # written through the service: cache invalidated
+    await add_domain("https://www.bing.com/", db_session)
+    assert len(await get_all_domains(db_session)) == 3
+
+
+async def test_domain_list_has_latest_status(db_session):
+    """New examinations update the cached latest status per domain."""
+    domain = await add_domain_to_database("https://www.google.com/", db_session)
+    before = await get_all_domains(db_session)
+    assert before[0].status_code is None
+
+    domain_status_cache.record(
+        Examination(
+            status_code=503,
+            examination_time=datetime.datetime(2025, 1, 1),
+            response_time=datetime.timedelta(milliseconds=10),
+            domain_id=domain.id,
+        )
+    )
+
+    after = await get_all_domains(db_session)
+    assert after[0].status_code == 503
+    assert json.loads(await get_all_domains_json(db_session))[0]["status_code"] == 503
+
+
+async def test_domain_list_reloads_latest_status(db_session):
+    """Statuses written by other replicas show up after a reload."""
+    domain = await add_domain_to_database("https://www.google.com/", db_session)
+    cache = DomainStatusCache(ttl=30, min_render_interval=0)
+    await cache.render(db_session)
+    assert (await cache.statuses(db_session))[0].status_code is None
+    etag = cache.etag()
+
+    await add_examinations_to_database(
+        [
+            Examination(
+                status_code=503,
+                examination_time=datetime.datetime(2025, 1, 1),
+                response_time=datetime.timedelta(milliseconds=10),
+                domain_id=domain.id,
+            )
+        ],
+        session=db_session,
+    )
+    await cache.reload_latest(db_session)
+    assert cache.etag() != etag
+    assert json.loads(await cache.render(db_session))[0]["status_code"] == 503
+    etag = cache.etag()
+    await cache.reload_latest(db_session)
+    assert cache.etag() == etag
+
+    # one recorded here but not written yet is newer than the database's
+    cache.record(
+        Examination(
+            status_code=200,
+            examination_time=datetime.datetime(2025, 1, 1, 0, 1),
+            response_time=datetime.timedelta(milliseconds=10),
+            domain_id=domain.id,
+        )
+    )
+    await cache.reload_latest(db_session)
+    assert (await cache.statuses(db_session))[0].status_code == 200
+
+
+async def test_domain_list_renders_at_most_once_per_interval(db_session):
+    domains = [
+        await add_domain_to_database(f"https://www.site{i}.com/", db_session)
+        for i in range(3)
+    ]
+    cache = DomainStatusCache(ttl=30, min_render_interval=60)
+    rendered = await cache.render(db_session)
+    etag = cache.etag()
+    untouched = (await cache.statuses(db_session))[1]
+
+    cache.record(
+        Examination(
+            status_code=503,
+            examination_time=datetime.datetime(2025, 1, 1),
+            response_time=datetime.timedelta(milliseconds=10),
+            domain_id=domains[0].id,
+        )
+    )
+
+    statuses = await cache.statuses(db_session)
+    # only the examined domain's entry is replaced
+    assert statuses[0].status_code == 503
+    assert statuses[1] is untouched
+    # the response and its tag stay as they are until the interval is over
+    assert await cache.render(db_session) == rendered
+    assert cache.etag() == etag
+
+    cache.min_render_interval = 0
+    assert cache.etag() is None
+    assert json.loads(await cache.render(db_session))[0]["status_code"] == 503
+    assert cache.etag() not in (None, etag)
+
+
+async def test_get_service_status_checks_keyword_and_hash():
+    body = b"<html>Welcome back</html>"
+    fake_session = FakeAiohttpSession(status=200, body=body)
+
+    matched = await get_service_status(
+        domain=Domain(
+            id=1,
+            domain="https://www.a.com/",
+            expect_keyword="Welcome",
+            expect_hash=hashlib.sha256(body).hexdigest(),
+        ),
+        http_session=fake_session,
+    )
+    missing = await get_service_status(
+        domain=Domain(id=1, domain="https://www.a.com/", expect_keyword="Goodbye"),
+        http_session=fake_session,
+    )
+    unchecked = await get_service_status(
+        domain=Domain(id=1, domain="https://www.a.com/"), http_session=fake_session
+    )
+
+    assert matched.content_match is True
+    assert missing.content_match is False
+    assert unchecked.content_match is None
+
+
+async def test_get_service_status_range_request():
+    fake_session = FakeAiohttpSession(status=206, body=b"abc")
+
+    await get_service_status(
+        domain=Domain(id=1, domain="https://www.a.com/", probe_method="range"),
+        http_session=fake_session,
+        body_limit=1024,
+    )
+
+    method, _, headers = fake_session.requests[0]
+    assert method == "GET"
+    assert headers["Range"] == "bytes=0-1023"
+
+
+async def test_stream_domain_examinations_in_batches(db_session):
+    from backend.db import Examination as ExamModel
+
+    domain = await add_domain_to_database("https://www.google.com/", db_session)
+    start = datetime.datetime(2025, 1, 1)
+    db_session.add_all(
+        ExamModel(
+            status_code=200,
+            examination_time=start + datetime.timedelta(minutes=i),
+            response_time=datetime.timedelta(milliseconds=i),
+            domain_id=domain.id,
+        )
+        for i in range(7)
+    )
+    await db_session.commit()
+
+    chunks = [
+        chunk
+        async for chunk in await stream_domain_examinations(
+            "google.com", db_session, file_format="json", batch_size=3
+        )
+    ]
+    # opening, three batches, closing
+    assert len(chunks) == 5
+    body = json.loads(b"".join(chunks))
+    assert [row["response_time"] for row in body["examinations"]] == [
+        f"PT0.00{i}S" if i else "PT0S" for i in range(7)
+    ]
+
+    empty = await stream_domain_examinations(
+        "google.com", db_session, file_format="json", start=start.replace(year=2030)
+    )
+    assert json.loads(b"".join([chunk async for chunk in empty]))["examinations"] == []
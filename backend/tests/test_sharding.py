@@ -0,0 +1,136 @@
+import datetime
+
+from backend.alerts import AlertDispatcher
+from backend.db import add_domain_to_database
+from backend.incidents import HealthPolicy, IncidentTracker
+from backend.scheduler import ProbeScheduler
+from backend.service import sync_scheduler_with_shards
+from backend.sharding import ShardCoordinator
+from backend.schemas import Examination
+from backend.utils import utcnow
+from .conftest import async_session_test
+
+
+def make_tracker() -> IncidentTracker:
+    return IncidentTracker(
+        async_session_test,
+        AlertDispatcher(sinks=[]),
+        HealthPolicy(window=2, down_after=2, recover_after=1),
+    )
+
+
+def make_coordinator(worker_id: str, shards: int = 8) -> ShardCoordinator:
+    return ShardCoordinator(
+        session_factory=async_session_test,
+        shards=shards,
+        worker_id=worker_id,
+        lease_ttl=30,
+    )
+
+
+async def test_single_worker_owns_every_shard(db_session):
+    coordinator = make_coordinator("a")
+
+    assert await coordinator.heartbeat() == set(range(8))
+    assert coordinator.owns(5)
+
+
+async def test_workers_split_shards(db_session):
+    """A joining worker gets an equal share, no shard is owned twice."""
+    first = make_coordinator("a")
+    second = make_coordinator("b")
+    await first.heartbeat()
+
+    await second.heartbeat()  # registers, nothing free yet
+    await first.heartbeat()  # gives half back
+    await second.heartbeat()  # claims it
+
+    assert len(first.owned) == len(second.owned) == 4
+    assert first.owned | second.owned == set(range(8))
+
+
+async def test_dead_worker_shards_are_taken_over(db_session):
+    first = make_coordinator("a")
+    second = make_coordinator("b")
+    now = utcnow()
+    for _ in range(2):
+        await first.heartbeat(now=now)
+        await second.heartbeat(now=now)
+
+    # "a" stops renewing; once its lease has expired "b" takes everything
+    later = now + datetime.timedelta(seconds=31)
+    assert await second.heartbeat(now=later) == set(range(8))
+
+
+async def test_release_hands_shards_over(db_session):
+    first = make_coordinator("a")
+    second = make_coordinator("b")
+    await first.heartbeat()
+    await second.heartbeat()
+
+    await first.release()
+
+    assert await second.heartbeat() == set(range(8))
+
+
+async def test_scheduler_follows_owned_shards(db_session):
+    domains = [
+        await add_domain_to_database(f"https://www.site{i}.com/", db_session)
+        for i in range(6)
+    ]
+    coordinator = make_coordinator("a", shards=2)
+    coordinator.owned = {0}
+    scheduler = ProbeScheduler(concurrency=10, per_host_limit=10)
+    tracker = make_tracker()
+
+    await sync_scheduler_with_shards(
+        scheduler, coordinator, async_session_test, tracker=tracker
+    )
+    assert set(scheduler) == {d.id for d in domains if d.id % 2 == 0}
+
+    coordinator.owned = {1}
+    await sync_scheduler_with_shards(
+        scheduler, coordinator, async_session_test, tracker=tracker
+    )
+    assert set(scheduler) == {d.id for d in domains if d.id % 2 == 1}
+
+
+async def test_handover_keeps_open_incident(db_session):
+    """The new owner of a shard resumes its domains' open incidents."""
+    domain = await add_domain_to_database("https://www.site.com/", db_session)
+    old_tracker, new_tracker = make_tracker(), make_tracker()
+    await new_tracker.start()
+    await old_tracker.start()
+    for minute in range(2):
+        old_tracker.observe(
+            Examination(
+                status_code=500,
+                examination_time=utcnow() + datetime.timedelta(minutes=minute),
+                response_time=datetime.timedelta(milliseconds=10),
+                domain_id=domain.id,
+            ),
+            "site.com",
+        )
+    await old_tracker.close()
+    await new_tracker.close()
+
+    coordinator = make_coordinator("a", shards=1)
+    scheduler = ProbeScheduler(concurrency=10, per_host_limit=10)
+    coordinator.owned = {0}
+    await sync_scheduler_with_shards(
+        scheduler, coordinator, async_session_test, tracker=old_tracker
+    )
+    coordinator.owned = set()
+    await sync_scheduler_with_shards(
+        scheduler, coordinator, async_session_test, tracker=old_tracker
+    )
+    assert old_tracker.state(domain.id) == "up"
+
+    coordinator.owned = {0}
+    await sync_scheduler_with_shards(
+        ProbeScheduler(concurrency=10, per_host_limit=10),
+        coordinator,
+        async_session_test,
+        tracker=new_tracker,
+    )
+    assert new_tracker.state(domain.id) == "down"
@@ -0,0 +1,96 @@
+import datetime
+
+from backend.db import (
+    add_domain_to_database,
+    add_examinations_to_database,
+    update_rollups_in_database,
+)
+from backend.schemas import Examination
+from backend.stats import align_window, outages, stats_resolution
+from .conftest import client
+
+RETENTION = {"1m": 14, "1h": 400, "1d": 0}
+
+
+def test_stats_resolution():
+    now = datetime.datetime(2025, 4, 1)
+    day = datetime.timedelta(days=1)
+
+    assert stats_resolution(now - day, now, now, RETENTION, 2500) == "1m"
+    assert stats_resolution(now - 30 * day, now, now, RETENTION, 2500) == "1h"
+    # the 1m rollups of a month ago are gone already
+    month_ago = now - 30 * day
+    assert stats_resolution(month_ago - day, month_ago, now, RETENTION, 2500) == "1h"
+    assert stats_resolution(now - 3650 * day, now, now, RETENTION, 2500) == "1d"
+
+
+def test_align_window():
+    start, end = align_window(
+        datetime.datetime(2025, 1, 1, 10, 30),
+        datetime.datetime(2025, 1, 1, 12, 5),
+        "1h",
+    )
+    assert start == datetime.datetime(2025, 1, 1, 10)
+    assert end == datetime.datetime(2025, 1, 1, 13)
+
+
+def test_outages():
+    minute = datetime.datetime(2025, 1, 1)
+    at = lambda m: minute + datetime.timedelta(minutes=m)  # noqa: E731
+
+    count, durations = outages([(at(0), False), (at(2), True), (at(5), False)])
+    assert count == 1
+    assert durations == [datetime.timedelta(minutes=3)]
+
+    # still down at the end of the window: counted, but not recovered
+    count, durations = outages([(at(0), True), (at(1), False), (at(4), True)])
+    assert count == 2
+    assert durations == [datetime.timedelta(minutes=1)]
+
+
+async def test_stats_endpoints(db_session):
+    google = await add_domain_to_database("https://www.google.com/", db_session)
+    idle = await add_domain_to_database("https://www.example.com/", db_session)
+    statuses = [200, 200, 503, 503, 200, 200, 200, 200, 200, 200]
+    examinations = [
+        Examination(
+            status_code=status_code,
+            examination_time=datetime.datetime(2025, 1, 1, 12, minute),
+            response_time=datetime.timedelta(milliseconds=100 + 10 * minute),
+            domain_id=google.id,
+            # a failed content check is an outage too
+            content_match=False if minute == 7 else None,
+        )
+        for minute, status_code in enumerate(statuses)
+    ]
+    await add_examinations_to_database(examinations, db_session)
+    await update_rollups_in_database(examinations, db_session)
+    window = {"from": "2025-01-01T00:00:00", "to": "2025-01-02T00:00:00"}
+
+    res = client.get("/stats/google.com", params={**window, "slo": 99})
+    assert res.status_code == 200
+    body = res.json()
+    assert body["slo"] == 99
+    (stats,) = body["domains"]
+    assert stats["checks"] == 10
+    assert stats["failed_checks"] == 3
+    assert stats["availability"] == 70
+    assert round(stats["error_budget_burn"], 6) == 30
+    assert stats["outages"] == 2
+    # down for 2 minutes, then for 1
+    assert stats["mttr"] == "PT1M30S"
+    assert stats["min_response_ms"] == 100
+    assert stats["max_response_ms"] == 190
+    assert stats["avg_response_ms"] == 145
+    assert 130 <= stats["p50_response_ms"] <= 150
+
+    res = client.get("/stats", params=window)
+    by_id = {stats["domain_id"]: stats for stats in res.json()["domains"]}
+    assert by_id[google.id]["checks"] == 10
+    assert by_id[idle.id]["checks"] == 0
+    assert by_id[idle.id]["availability"] is None
+
+    res = client.get("/stats", params={**window, "domain_id": idle.id})
+    assert [stats["domain"] for stats in res.json()["domains"]] == ["example.com"]
+
+    assert client.get("/stats/missing.com").status_code == 404
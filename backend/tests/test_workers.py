@@ -0,0 +1,122 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from backend.db import Base, ExaminationWriter, add_domain_to_database
+from backend.metrics import probes_in_flight
+from backend.scheduler import ProbeScheduler
+from backend.schemas import Domain
+from backend.service import _domain_schema
+from backend.workers import partition_domains, run_probe_scheduler_in_processes
+
+
+@pytest.fixture
+async def origin():
+    async def ok(request):
+        if request.path.startswith("/slow"):
+            await asyncio.sleep(2)
+        return web.Response(text="ok")
+
+    app = web.Application()
+    app.router.add_get("/{path:.*}", ok)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    yield site._server.sockets[0].getsockname()[1]
+    await runner.cleanup()
+
+
+def test_partition_keeps_hosts_together():
+    domains = [
+        Domain(id=i, domain=f"https://www.site{i % 5}.com/{i}") for i in range(50)
+    ]
+    partitions = partition_domains(domains, 3)
+
+    assert sum(len(partition) for partition in partitions) == 50
+    hosts = [{d.domain.split("/")[2] for d in partition} for partition in partitions]
+    assert sum(len(partition_hosts) for partition_hosts in hosts) == 5
+
+
+@pytest.fixture
+async def session_factory(tmp_path):
+    """
+    A database of its own: the shared in-memory one has a single
+    connection, which the writer and the test would use at the same time.
+    """
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/workers.db")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def probed_all(session_factory, ids: set[int]) -> bool:
+    async with session_factory() as session:
+        rows = await session.execute(
+            text("SELECT DISTINCT domain_id FROM examinations")
+        )
+        return ids <= set(rows.scalars())
+
+
+async def wait_for(condition, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not await condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.1)
+
+
+async def add_domain(session_factory, url: str):
+    async with session_factory() as session:
+        return await add_domain_to_database(url, session, check_interval=1)
+
+
+async def test_scheduler_in_processes_follows_domain_list(session_factory, origin):
+    domains = [
+        await add_domain(session_factory, f"http://{host}:{origin}/")
+        for host in ("127.0.0.1", "localhost")
+    ]
+    scheduler = ProbeScheduler(concurrency=10, per_host_limit=10)
+    writer = ExaminationWriter(session_factory=session_factory, flush_interval=0.05)
+    writer.start()
+    task = asyncio.create_task(
+        run_probe_scheduler_in_processes(
+            db_session_factory=session_factory,
+            workers=2,
+            scheduler=scheduler,
+            writer=writer,
+            flush_interval=0.05,
+            sync_interval=0.1,
+        )
+    )
+    try:
+        ids = {domain.id for domain in domains}
+        await wait_for(lambda: probed_all(session_factory, ids))
+
+        # added and removed while running, as add_domain / delete_domain do
+        added = await add_domain(session_factory, f"http://127.0.0.1:{origin}/added")
+        scheduler.schedule(_domain_schema(added))
+        scheduler.unschedule(domains[0].id)
+        await wait_for(lambda: probed_all(session_factory, {added.id}))
+
+        slow = await add_domain(session_factory, f"http://localhost:{origin}/slow")
+        scheduler.schedule(_domain_schema(slow))
+
+        async def slow_probe_running() -> bool:
+            return probes_in_flight.function() >= 1
+
+        # reported by the worker, the limiter here stays idle
+        await wait_for(slow_probe_running)
+        assert scheduler.limiter.in_flight == 0
+    finally:
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await writer.close()
+
+    # probes counted here, for the probes/s of the whole process pool
+    assert scheduler.meter.total >= 3
@@ -0,0 +1,147 @@
+import asyncio
+import datetime
+
+from sqlalchemy import text
+
+from backend.db import ExaminationWriter
+from backend.metrics import examinations_dropped
+from backend.schemas import Examination
+from .conftest import async_session_test
+
+
+def make_examination(domain_id: int) -> Examination:
+    return Examination(
+        status_code=200,
+        examination_time=datetime.datetime.now(),
+        response_time=datetime.timedelta(milliseconds=5),
+        domain_id=domain_id,
+    )
+
+
+async def count_examinations(db_session) -> int:
+    rows = await db_session.execute(text("SELECT COUNT(*) FROM examinations"))
+    return rows.scalar()
+
+
+async def test_writer_flushes_full_batch(db_session, create_domain):
+    """A full batch is written without waiting for the flush interval."""
+    writer = ExaminationWriter(
+        session_factory=async_session_test, batch_size=3, flush_interval=60
+    )
+    writer.start()
+    for _ in range(3):
+        await writer.put(make_examination(create_domain.id))
+    await asyncio.sleep(0.05)
+
+    assert await count_examinations(db_session) == 3
+    await writer.close()
+
+
+async def test_writer_flushes_after_interval(db_session, create_domain):
+    """A partial batch is written once the flush interval has passed."""
+    writer = ExaminationWriter(
+        session_factory=async_session_test, batch_size=100, flush_interval=0.05
+    )
+    writer.start()
+    await writer.put(make_examination(create_domain.id))
+
+    assert await count_examinations(db_session) == 0
+    await asyncio.sleep(0.15)
+    assert await count_examinations(db_session) == 1
+    await writer.close()
+
+
+async def test_writer_close_drains_queue(db_session, create_domain):
+    writer = ExaminationWriter(
+        session_factory=async_session_test, batch_size=2, flush_interval=60
+    )
+    writer.start()
+    for _ in range(5):
+        await writer.put(make_examination(create_domain.id))
+    await writer.close()
+
+    assert await count_examinations(db_session) == 5
+
+
+async def test_writer_applies_backpressure(create_domain):
+    """put() blocks once max_pending examinations are waiting."""
+    writer = ExaminationWriter(
+        session_factory=async_session_test, batch_size=1, max_pending=1
+    )
+    release = asyncio.Event()
+    flushed = []
+
+    async def slow_flush(batch):
+        await release.wait()
+        flushed.extend(batch)
+
+    writer._flush = slow_flush
+    writer.start()
+    await writer.put(make_examination(create_domain.id))
+    await asyncio.sleep(0.01)  # picked up, stuck in flush
+    await writer.put(make_examination(create_domain.id))  # fills the queue
+
+    blocked = asyncio.create_task(writer.put(make_examination(create_domain.id)))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+
+    release.set()
+    await blocked
+    await writer.close()
+    assert len(flushed) == 3
+
+
+class FlakySessionFactory:
+    """Session factory whose first `failures` sessions fail on commit."""
+
+    def __init__(self, failures: int):
+        self.failures = failures
+
+    def __call__(self):
+        session = async_session_test()
+        if self.failures:
+            self.failures -= 1
+
+            async def commit():
+                raise ConnectionError("database went away")
+
+            session.commit = commit
+        return session
+
+
+async def test_writer_retries_failed_batch(db_session, create_domain):
+    """A failed write leaves nothing behind and is retried as a whole."""
+    writer = ExaminationWriter(
+        session_factory=FlakySessionFactory(failures=2),
+        batch_size=2,
+        flush_interval=60,
+        retry_backoff=0.01,
+    )
+    writer.start()
+    for _ in range(2):
+        await writer.put(make_examination(create_domain.id))
+    await writer.close()
+
+    assert await count_examinations(db_session) == 2
+    rollups = await db_session.execute(
+        text("SELECT SUM(count) FROM examination_rollups WHERE resolution = '1m'")
+    )
+    assert rollups.scalar() == 2
+
+
+async def test_writer_counts_dropped_batch(db_session, create_domain):
+    dropped = examinations_dropped.value
+    writer = ExaminationWriter(
+        session_factory=FlakySessionFactory(failures=3),
+        batch_size=2,
+        flush_interval=60,
+        attempts=3,
+        retry_backoff=0.01,
+    )
+    writer.start()
+    for _ in range(2):
+        await writer.put(make_examination(create_domain.id))
+    await writer.close()
+
+    assert await count_examinations(db_session) == 0
+    assert examinations_dropped.value == dropped + 2
@@ -1,4 +1,13 @@
+import base64
+import codecs
+import datetime
 import re
+from typing import AsyncIterable, AsyncIterator
+from urllib.parse import urlsplit
+
+
+def get_host(url: str) -> str:
+    return (urlsplit(url).hostname or url).lower()
 
 
 def clean_url(url: str) -> str:
@@ -6,21 +15,122 @@ def clean_url(url: str) -> str:
     return url.rstrip("/")
 
 
+def normalize_host(url: str) -> str:
+    """
+    The name a domain is shown and looked up by: its URL without scheme,
+    "www." and trailing slash, lower-cased ("https://www.Example.com/" and
+    "example.com" both give "example.com").
+    """
+    return clean_url(url.strip()).lower()
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+URL_PATTERN = re.compile(r"^(https?:\/\/)(www\.)[\w-]+(\.[\w-]+)+(\/[\w\-./?%&=]*)?$")
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
 def validate_url(url: str) -> bool:
     """
     Validate a URL in the format:
     http://www.example.com or https://www.example.com
     """
-    pattern = r"^(https?:\/\/)(www\.)[\w-]+(\.[\w-]+)+(\/[\w\-./?%&=]*)?$"
-    return re.match(pattern, url) is not None
+    return URL_PATTERN.match(url) is not None
+
+
+async def iter_lines(
+    chunks: AsyncIterable[bytes], max_length: int
+) -> AsyncIterator[tuple[str | None, str | None]]:
+    """
+    Decode a byte stream into (line, error) pairs without reading it all
+    into memory. A line longer than `max_length` bytes is skipped (and not
+    buffered) and one that is not UTF-8 is not decoded; both are yielded
+    with an error instead, so the lines after them are still read.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="strict")
+    buffer = bytearray()
+    too_long = False
+
+    def decode() -> tuple[str | None, str | None]:
+        if too_long:
+            return None, f"Line longer than {max_length} bytes"
+        try:
+            return decoder.decode(buffer, final=True).rstrip("\r"), None
+        except UnicodeDecodeError:
+            return None, "Invalid UTF-8"
+
+    async for chunk in chunks:
+        # only the new chunk is split, the buffer holds one partial line
+        *lines, rest = chunk.split(b"\n")
+        for line in lines:
+            if not too_long:
+                buffer += line
+                too_long = len(buffer) > max_length
+            yield decode()
+            buffer.clear()
+            too_long = False
+        if not too_long:
+            buffer += rest
+            too_long = len(buffer) > max_length
+            if too_long:
+                buffer.clear()
+    if buffer or too_long:
+        yield decode()
+
+
+def encode_cursor(examination_time: datetime.datetime, examination_id: int) -> str:
+    raw = f"{examination_time.isoformat()}|{examination_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime, int]:
+    """Raises ValueError for anything encode_cursor did not produce."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        examination_time, examination_id = raw.split("|")
+        return datetime.datetime.fromisoformat(examination_time), int(examination_id)
+    except (UnicodeError, ValueError, TypeError) as error:
+        raise ValueError("Invalid cursor") from error
+
+
+def utcnow() -> datetime.datetime:
+    """Examination times are stored as naive UTC."""
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def to_db_time(value: datetime.datetime) -> datetime.datetime:
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class FakeStreamReader:
+    def __init__(self, body: bytes):
+        self._body = body
+
+    async def read(self, n: int = -1) -> bytes:
+        if n < 0:
+            n = len(self._body)
+        chunk, self._body = self._body[:n], self._body[n:]
+        return chunk
+
+    def at_eof(self) -> bool:
+        return not self._body
 
 
 class FakeAiohttpResponse:
-    def __init__(self, status=200):
+    def __init__(self, status=200, body=b"", headers=None):
         self.status = status
+        self.content = FakeStreamReader(body)
+        self.headers = headers or {}
 
     async def read(self):
-        return b""
+        return await self.content.read()
+
+    def close(self):
+        pass
 
 
 class FakeAiohttpContextManager:
@@ -35,9 +145,22 @@ class FakeAiohttpContextManager:
 
 
 class FakeAiohttpSession:
-    def __init__(self, status=200):
-        self.response = FakeAiohttpResponse(status=status)
+    def __init__(self, status=200, body=b"", headers=None):
+        self.status = status
+        self.body = body
+        self.headers = headers
+        self.requests: list[tuple[str, str, dict]] = []
 
-    def get(self, url: str):
+    def _request(self, method: str, url: str, **kwargs):
+        self.requests.append((method, url, kwargs.get("headers") or {}))
+        response = FakeAiohttpResponse(
+            status=self.status, body=self.body, headers=self.headers
+        )
         # aiohttp.ClientSession.get MUST return an async context manager
-        return FakeAiohttpContextManager(self.response)
+        return FakeAiohttpContextManager(response)
+
+    def get(self, url: str, **kwargs):
+        return self._request("GET", url, **kwargs)
+
+    def head(self, url: str, **kwargs):
+        return self._request("HEAD", url, **kwargs)
@@ -0,0 +1,249 @@
+import asyncio
+import logging
+import multiprocessing
+import queue
+import time
+import zlib
+
+from backend.db import ExaminationWriter, examination_writer, get_all_domains_from_db
+from backend.metrics import probes_in_flight
+from backend.probes import probe_engine
+from backend.scheduler import ProbeScheduler, probe_scheduler
+from backend.schemas import Domain, Examination
+from backend.service import _domain_schema, _handle_examination, probe_domain
+from backend.utils import get_host
+
+logger = logging.getLogger(__name__)
+
+_DONE = None
+# commands from the parent to a scheduling worker; _DONE stops it
+_SCHEDULE = "schedule"
+_UNSCHEDULE = "unschedule"
+
+
+def worker_of(domain: Domain, workers: int) -> int:
+    return zlib.crc32(get_host(domain.domain).encode()) % workers
+
+
+def partition_domains(domains: list[Domain], workers: int) -> list[list[Domain]]:
+    """
+    Split domains between `workers` processes by host, so that all probes
+    of one host go through the same per-host limit.
+    """
+    partitions: list[list[Domain]] = [[] for _ in range(workers)]
+    for domain in domains:
+        partitions[worker_of(domain, workers)].append(domain)
+    return partitions
+
+
+async def _schedule_partition(
+    index: int,
+    domains: list[Domain],
+    results,
+    commands,
+    chunk_size: int,
+    flush_interval: float,
+) -> None:
+    chunk: list[Examination] = []
+
+    def flush() -> None:
+        # sent with the number of probes running, also without examinations
+        results.put((index, probe_scheduler.limiter.in_flight, chunk.copy()))
+        chunk.clear()
+
+    async def probe(domain: Domain) -> Examination:
+        examination = await probe_domain(domain, probe_engine.session)
+        chunk.append(examination)
+        if len(chunk) >= chunk_size:
+            flush()
+        # returned for the scheduler's adaptive intervals
+        return examination
+
+    async def flush_periodically() -> None:
+        while True:
+            await asyncio.sleep(flush_interval)
+            flush()
+
+    loop = asyncio.get_running_loop()
+    for domain in domains:
+        probe_scheduler.schedule(domain)
+    async with probe_engine:
+        tasks = [
+            asyncio.create_task(probe_scheduler.run(probe=probe)),
+            asyncio.create_task(flush_periodically()),
+        ]
+        try:
+            while True:
+                try:
+                    command = await loop.run_in_executor(None, commands.get, True, 0.5)
+                except queue.Empty:
+                    continue
+                if command is _DONE:
+                    break
+                action, value = command
+                if action == _SCHEDULE:
+                    probe_scheduler.schedule(value)
+                else:
+                    probe_scheduler.unschedule(value)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    flush()
+
+
+def _scheduler_worker(
+    index: int,
+    domains: list[Domain],
+    results,
+    commands,
+    chunk_size: int,
+    flush_interval: float,
+) -> None:
+    """
+    Process entry point of run_probe_scheduler_in_processes. The worker
+    keeps probing its domains whenever they are due, with the scheduler,
+    adaptive intervals and response validators of this process, until the
+    parent sends _DONE. Examinations go back in chunks of `chunk_size`, or
+    whatever was collected after `flush_interval` seconds, together with
+    the worker's number of probes in flight.
+    """
+    try:
+        asyncio.run(
+            _schedule_partition(
+                index, domains, results, commands, chunk_size, flush_interval
+            )
+        )
+    finally:
+        results.put(_DONE)
+
+
+async def run_probe_scheduler_in_processes(
+    db_session_factory,
+    workers: int,
+    scheduler: ProbeScheduler = probe_scheduler,
+    writer: ExaminationWriter = examination_writer,
+    chunk_size: int = 100,
+    flush_interval: float = 0.5,
+    sync_interval: float = 1.0,
+    drain_timeout: float = 5.0,
+):
+    """
+    Like run_probe_scheduler, with the probing done by `workers` long-lived
+    processes, each scheduling the domains of its hosts (see
+    partition_domains). `scheduler` is not run here: it holds the domain
+    list, which add_domain / delete_domain keep changing, and its changes
+    are passed on to the workers every `sync_interval` seconds. Results
+    are handled in this process as if probed here, and the in-flight gauge
+    adds up the workers' counts; a worker that dies is started again. Runs until cancelled, then stops the workers and takes
+    what they still send for up to `drain_timeout` seconds.
+    """
+    async with db_session_factory() as db_session:
+        domains = await get_all_domains_from_db(session=db_session)
+    for domain in domains:
+        scheduler.schedule(_domain_schema(domain))
+
+    # fork would copy the parent's running event loop and open connections
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    commands = [context.Queue() for _ in range(workers)]
+    processes: list[multiprocessing.Process | None] = [None] * workers
+    # what each worker has been told to probe
+    assigned: dict[int, Domain] = {}
+    in_flight = [0] * workers
+
+    def start(index: int) -> None:
+        partition = partition_domains(list(assigned.values()), workers)[index]
+        process = context.Process(
+            target=_scheduler_worker,
+            args=(
+                index,
+                partition,
+                results,
+                commands[index],
+                chunk_size,
+                flush_interval,
+            ),
+            daemon=True,
+        )
+        process.start()
+        processes[index] = process
+
+    def sync() -> None:
+        for domain_id in list(assigned):
+            if domain_id not in scheduler:
+                domain = assigned.pop(domain_id)
+                commands[worker_of(domain, workers)].put((_UNSCHEDULE, domain_id))
+        for domain_id in scheduler:
+            domain = scheduler.domain(domain_id)
+            if domain_id not in assigned and domain is not None:
+                assigned[domain_id] = domain
+                commands[worker_of(domain, workers)].put((_SCHEDULE, domain))
+
+    async def handle(report: tuple[int, int, list[Examination]]) -> None:
+        index, running_probes, chunk = report
+        in_flight[index] = running_probes
+        for examination in chunk:
+            domain = assigned.get(examination.domain_id)
+            if domain is None:
+                continue  # deleted while it was being probed
+            scheduler.meter.mark()
+            await _handle_examination(examination, domain.domain, writer)
+
+    loop = asyncio.get_running_loop()
+    receiving: asyncio.Future | None = None
+
+    async def receive():
+        # a read cancelled with this task still takes an item off the queue;
+        # it is kept for the next call instead of being lost
+        nonlocal receiving
+        if receiving is None:
+            receiving = loop.run_in_executor(None, results.get, True, 0.5)
+        try:
+            return await asyncio.shield(receiving)
+        finally:
+            if receiving.done():
+                receiving = None
+
+    for domain_id in scheduler:
+        assigned[domain_id] = scheduler.domain(domain_id)
+    for index in range(workers):
+        start(index)
+    # the limiter of this process's scheduler is not used
+    probes_in_flight.function = lambda: sum(in_flight)
+
+    synced_at = time.monotonic()
+    try:
+        while True:
+            try:
+                report = await receive()
+            except queue.Empty:
+                report = None
+            if report is not None:
+                await handle(report)
+            if time.monotonic() - synced_at >= sync_interval:
+                synced_at = time.monotonic()
+                sync()
+                for index, process in enumerate(processes):
+                    if not process.is_alive():
+                        logger.error("Probe worker %d exited, restarting it", index)
+                        start(index)
+    finally:
+        for worker_commands in commands:
+            worker_commands.put(_DONE)
+        running = sum(process.is_alive() for process in processes)
+        deadline = time.monotonic() + drain_timeout
+        while running and time.monotonic() < deadline:
+            try:
+                report = await receive()
+            except queue.Empty:
+                continue
+            if report is _DONE:
+                running -= 1
+            else:
+                await handle(report)
+        for process in processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+        probes_in_flight.function = lambda: scheduler.limiter.in_flight
@@ -1,13 +1,27 @@
 import { useState, useEffect } from 'react';
 import { useParams } from 'react-router';
 
+// Examinations kept on the page: the initial 24h fetch and the ones pushed since
+const MAX_HISTORY = 10000;
+
+// The API returns naive UTC timestamps
+function parseTimestamp(timestamp) {
+  const hasZone = /(Z|[+-]\d{2}:\d{2})$/.test(timestamp);
+  return new Date(hasZone ? timestamp : `${timestamp}Z`);
+}
+
+// 304 (conditional probe) and 206 (range probe) count as up, like on the backend
+function isUp(item) {
+  return item.status_code >= 200 && item.status_code < 400 && item.content_match !== false;
+}
+
 function calculateUptime24h(records) {
   const now = new Date();
   const cutoff = new Date(now.getTime() - 24 * 60 * 60 * 1000);
 
   // 1. Filter only last-24h records
   const last24h = records.filter((item) => {
-    const t = new Date(item.examination_time);
+    const t = parseTimestamp(item.examination_time);
     return t >= cutoff;
   });
 
@@ -16,7 +30,7 @@ function calculateUptime24h(records) {
   }
 
   // 2. Count UP records
-  const upCount = last24h.filter((item) => item.status_code === 200).length;
+  const upCount = last24h.filter(isUp).length;
 
   // 3. Calculate percentage
   const uptimePercent = (upCount / last24h.length) * 100;
@@ -30,7 +44,7 @@ function isoSecondsToMs(isoString) {
 }
 
 function formatTimestamp(timestamp) {
-  const date = new Date(timestamp);
+  const date = parseTimestamp(timestamp);
 
   const pad = (n) => String(n).padStart(2, '0');
 
@@ -53,26 +67,24 @@ export default function DomainMonitor() {
   const [lastChecked, setLastChecked] = useState(null);
   const [history, setHistory] = useState([]);
   const [isLoading, setIsLoading] = useState(true);
+  const [domainId, setDomainId] = useState(null);
 
   useEffect(() => {
     const fetchData = async () => {
       try {
         setIsLoading(true);
+        const from = new Date(
+          Date.now() - 24 * 60 * 60 * 1000
+        ).toISOString();
+        // raw examinations; the default may answer long windows with rollups
         const response = await fetch(
-          `http://localhost/api/examinations/${domain}`
+          `http://localhost/api/examinations/${domain}?from=${from}&limit=${MAX_HISTORY}&resolution=raw`
         );
         const data = await response.json();
 
         if (data) {
-          setStatus(data.examinations.at(-1).status_code);
-          setResponseTime(
-            isoSecondsToMs(data.examinations.at(-1).response_time)
-          );
-          setUptime(calculateUptime24h(data.examinations));
-          setLastChecked(
-            formatTimestamp(data.examinations.at(-1).examination_time)
-          );
-          setHistory(data.examinations);
+          setHistory(data.examinations ?? []);
+          setDomainId(data.id ?? null);
         }
       } catch (error) {
         console.error('Error fetching data:', error);
@@ -84,6 +96,34 @@ export default function DomainMonitor() {
     fetchData();
   }, []);
 
+  // New examinations are pushed by the server instead of re-fetching
+  useEffect(() => {
+    if (domainId === null || typeof EventSource === 'undefined') {
+      return undefined;
+    }
+    const source = new EventSource(
+      `http://localhost/api/stream?domain_id=${domainId}`
+    );
+    source.addEventListener('examination', (event) => {
+      const examination = JSON.parse(event.data);
+      setHistory((previous) =>
+        [...previous, examination].slice(-MAX_HISTORY)
+      );
+    });
+    return () => source.close();
+  }, [domainId]);
+
+  useEffect(() => {
+    if (history.length === 0) {
+      return;
+    }
+    const latest = history.at(-1);
+    setStatus(latest.status_code);
+    setResponseTime(isoSecondsToMs(latest.response_time));
+    setUptime(calculateUptime24h(history));
+    setLastChecked(formatTimestamp(latest.examination_time));
+  }, [history]);
+
   if (isLoading) {
     return <div>Loading...</div>;
   }
@@ -112,7 +152,7 @@ export default function DomainMonitor() {
             {history.map((item, index) => (
               <div
                 key={index}
-                className={`history-item ${item.status_code === 200 ? 'green' : item.status_code === 500 ? 'red' : 'gray'}`}
+                className={`history-item ${isUp(item) ? 'green' : item.status_code >= 500 ? 'red' : 'gray'}`}
                 role="dot"
               />
             ))}
@@ -61,6 +61,7 @@ describe('DomainMonitor', () => {
 
     // Wait for fetch to complete
     await waitFor(() => expect(fetch).toHaveBeenCalledTimes(1));
+    expect(fetch.mock.calls[0][0]).toContain('resolution=raw');
 
     // -------- Assertions --------
 